@@ -0,0 +1,148 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.environ.get("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+
+class UserSnapshot:
+    """
+    The subset of a User that request handlers and templates need. Cached
+    instead of the ORM object so it never touches a session.
+    """
+
+    __slots__ = ("id", "username", "is_admin", "is_active", "is_approved")
+
+    def __init__(self, id, username, is_admin, is_active, is_approved):
+        self.id = id
+        self.username = username
+        self.is_admin = is_admin
+        self.is_active = is_active
+        self.is_approved = is_approved
+
+    @classmethod
+    def from_user(cls, user) -> "UserSnapshot":
+        return cls(user.id, user.username, user.is_admin, user.is_active, user.is_approved)
+
+    def __repr__(self):
+        return f"<UserSnapshot {self.username}>"
+
+
+class TTLCache:
+    """
+    Bounded LRU whose entries expire individually. `on_evict(key, value)` is
+    called for every entry that leaves the cache, however it leaves, so
+    indexes kept alongside it can drop the entry too.
+    """
+
+    def __init__(self, max_entries: int = AUTH_CACHE_MAX_ENTRIES, on_evict: Optional[Callable[[Any, Any], None]] = None):
+        self.max_entries = max_entries
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+
+    def _evicted(self, key, entry):
+        if self.on_evict is not None:
+            self.on_evict(key, entry[1])
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+                self._evicted(key, entry)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value, ttl: float):
+        old = self._entries.get(key)
+        if old is not None:
+            self._evicted(key, old)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._evicted(*self._entries.popitem(last=False))
+
+    def pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._evicted(key, entry)
+
+    def clear(self):
+        entries, self._entries = self._entries, OrderedDict()
+        for key, entry in entries.items():
+            self._evicted(key, entry)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# user id -> username, so changes made by id can be invalidated; holds only ids in _user_cache
+_user_ids: Dict[Any, str] = {}
+
+
+def _forget_user_id(username: str, snapshot: UserSnapshot):
+    if _user_ids.get(snapshot.id) == username:
+        del _user_ids[snapshot.id]
+
+
+# token -> verified JWT payload, so signatures are checked once per token
+_token_cache = TTLCache()
+# username -> UserSnapshot
+_user_cache = TTLCache(on_evict=_forget_user_id)
+
+
+def decode_token(token: str, decode: Callable[[str], dict]) -> dict:
+    """Returns the payload for a token, calling `decode` (which verifies it) only on a miss."""
+    payload = _token_cache.get(token)
+    if payload is None:
+        payload = decode(token)
+        ttl = AUTH_CACHE_TTL
+        exp = payload.get("exp")
+        if exp is not None:
+            ttl = min(ttl, exp - time.time())
+        if ttl > 0:
+            _token_cache.set(token, payload, ttl)
+    else:
+        # Cached payloads still expire with their token
+        exp = payload.get("exp")
+        if exp is not None and exp < time.time():
+            _token_cache.pop(token)
+            return decode(token)
+    return payload
+
+
+def get_user(username: str) -> Optional[UserSnapshot]:
+    return _user_cache.get(username)
+
+
+def put_user(user) -> UserSnapshot:
+    snapshot = UserSnapshot.from_user(user)
+    _user_cache.set(snapshot.username, snapshot, AUTH_CACHE_TTL)
+    _user_ids[snapshot.id] = snapshot.username
+    return snapshot
+
+
+def invalidate_user(user_id):
+    """Drop a user's cached snapshot; called whenever their flags change."""
+    username = _user_ids.get(user_id)
+    if username is not None:
+        _user_cache.pop(username)
+
+
+def stats() -> dict:
+    return {
+        "tokens": len(_token_cache),
+        "token_hits": _token_cache.hits,
+        "token_misses": _token_cache.misses,
+        "users": len(_user_cache),
+        "user_ids": len(_user_ids),
+        "user_hits": _user_cache.hits,
+        "user_misses": _user_cache.misses,
+    }
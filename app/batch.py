@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Sequence
+from app.quota import QuotaExceeded
+from app.llm_service.bulkhead import BulkheadFull
+
+logger = logging.getLogger(__name__)
+
+# Jobs of one batch running at once; a request may ask for fewer
+CHAT_BATCH_CONCURRENCY = int(os.environ.get("CHAT_BATCH_CONCURRENCY", "8"))
+# Batch jobs running at once across all batches on this worker
+CHAT_BATCH_GLOBAL_CONCURRENCY = int(os.environ.get("CHAT_BATCH_GLOBAL_CONCURRENCY", "32"))
+# Attempts per job, including the first
+CHAT_BATCH_MAX_ATTEMPTS = int(os.environ.get("CHAT_BATCH_MAX_ATTEMPTS", "3"))
+# Exponential backoff between attempts: base * 2^(attempt-1), capped, with jitter
+CHAT_BATCH_BACKOFF_BASE = float(os.environ.get("CHAT_BATCH_BACKOFF_BASE", "0.5"))
+CHAT_BATCH_BACKOFF_MAX = float(os.environ.get("CHAT_BATCH_BACKOFF_MAX", "8"))
+# A job told to retry later than this (quota or bulkhead Retry-After) fails instead
+CHAT_BATCH_MAX_RETRY_WAIT = float(os.environ.get("CHAT_BATCH_MAX_RETRY_WAIT", "30"))
+# Total seconds one job may spend waiting on quota and bulkhead rejections
+CHAT_BATCH_MAX_PACING_WAIT = float(os.environ.get("CHAT_BATCH_MAX_PACING_WAIT", "300"))
+
+# Rejected before the job reached the provider: waited out without using an attempt
+_ADMISSION_ERRORS = (QuotaExceeded, BulkheadFull)
+
+# 4xx statuses that are transient and worth retrying; any other 4xx is permanent
+_RETRYABLE_STATUS = {408, 409, 429}
+
+
+def retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """Seconds to wait before the next attempt, or None if the error is not worth retrying."""
+    if isinstance(error, (ValueError, TypeError)):
+        return None
+    # Provider SDK errors carry the status themselves, httpx errors on their response
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int) and 400 <= status < 500 and status not in _RETRYABLE_STATUS:
+        return None
+    backoff = min(CHAT_BATCH_BACKOFF_MAX, CHAT_BATCH_BACKOFF_BASE * 2 ** (attempt - 1))
+    delay = backoff * random.uniform(0.5, 1.0)
+    # Errors that say when a retry can succeed, e.g. a provider's own rate limit
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        if retry_after > CHAT_BATCH_MAX_RETRY_WAIT:
+            return None
+        delay = max(delay, retry_after)
+    return delay
+
+
+def pacing_delay(error: Exception, paced: float) -> Optional[float]:
+    """Seconds to wait before trying a job rejected at admission again, or None to fail it."""
+    retry_after = error.retry_after
+    if retry_after > CHAT_BATCH_MAX_RETRY_WAIT:
+        return None
+    # Jittered, so the jobs of a batch held back by the same bucket do not all come back at once
+    delay = max(0.01, retry_after) * random.uniform(1.0, 1.25)
+    if paced + delay > CHAT_BATCH_MAX_PACING_WAIT:
+        return None
+    return delay
+
+
+def _line(data: dict) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+class BatchRunner:
+    """
+    Runs the jobs of a batch concurrently and streams one NDJSON line per job
+    as it finishes, tagged with the job's index, then a summary line. At most
+    `concurrency` jobs of a batch are started at a time, so results are never
+    collected for the whole batch, and a worker-wide semaphore caps batch
+    jobs across all batches. Failed jobs are retried with backoff; quota and
+    bulkhead rejections are waited out without counting as an attempt.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = CHAT_BATCH_CONCURRENCY,
+        global_concurrency: int = CHAT_BATCH_GLOBAL_CONCURRENCY,
+        max_attempts: int = CHAT_BATCH_MAX_ATTEMPTS,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.global_concurrency = max(1, global_concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self._slots = asyncio.Semaphore(self.global_concurrency)
+        self.batches = 0
+        self.active_batches = 0
+        self.running = 0
+        self.waiting = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retries = 0
+        self.paced = 0
+        self.pacing_seconds = 0.0
+
+    async def stream(
+        self,
+        jobs: Sequence[Any],
+        run: Callable[[Any], Awaitable[dict]],
+        concurrency: Optional[int] = None,
+    ) -> AsyncIterator[str]:
+        concurrency = min(concurrency or self.concurrency, self.concurrency)
+        self.batches += 1
+        self.active_batches += 1
+        started = time.monotonic()
+        succeeded = 0
+        pending = set()
+        next_index = 0
+        try:
+            while next_index < len(jobs) or pending:
+                while next_index < len(jobs) and len(pending) < concurrency:
+                    pending.add(asyncio.ensure_future(self._run_job(next_index, jobs[next_index], run)))
+                    next_index += 1
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result["status"] == "ok":
+                        succeeded += 1
+                    yield _line(result)
+            yield _line({
+                "summary": {
+                    "jobs": len(jobs),
+                    "succeeded": succeeded,
+                    "failed": len(jobs) - succeeded,
+                    "total_ms": round((time.monotonic() - started) * 1000, 1),
+                }
+            })
+        finally:
+            self.active_batches -= 1
+            # Client gone or server stopping: abandon the jobs still running
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _run_job(self, index: int, job: Any, run: Callable[[Any], Awaitable[dict]]) -> dict:
+        started = time.monotonic()
+        # Attempts that got past admission; rejections before that only cost time
+        attempt = 0
+        paced = 0.0
+        while True:
+            try:
+                self.waiting += 1
+                try:
+                    await self._slots.acquire()
+                finally:
+                    self.waiting -= 1
+                self.running += 1
+                try:
+                    result = await run(job)
+                finally:
+                    self.running -= 1
+                    self._slots.release()
+            except Exception as e:
+                if isinstance(e, _ADMISSION_ERRORS):
+                    delay = pacing_delay(e, paced)
+                    if delay is not None:
+                        paced += delay
+                        self.paced += 1
+                        self.pacing_seconds += delay
+                        await asyncio.sleep(delay)
+                        continue
+                else:
+                    attempt += 1
+                    delay = retry_delay(e, attempt) if attempt < self.max_attempts else None
+                if delay is None:
+                    self.failed += 1
+                    return {
+                        "index": index,
+                        "status": "error",
+                        "error": str(e) or type(e).__name__,
+                        "attempts": attempt,
+                        "duration_ms": round((time.monotonic() - started) * 1000, 1),
+                    }
+                self.retries += 1
+                logger.info(f"Batch job {index} failed on attempt {attempt} ({e!r}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            attempt += 1
+            self.succeeded += 1
+            return {
+                "index": index,
+                "status": "ok",
+                **result,
+                "attempts": attempt,
+                "duration_ms": round((time.monotonic() - started) * 1000, 1),
+            }
+
+    def stats(self) -> dict:
+        return {
+            "concurrency_per_batch": self.concurrency,
+            "global_concurrency": self.global_concurrency,
+            "max_attempts": self.max_attempts,
+            "batches": self.batches,
+            "active_batches": self.active_batches,
+            "jobs_running": self.running,
+            "jobs_waiting": self.waiting,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retries": self.retries,
+            "paced": self.paced,
+            "pacing_seconds": round(self.pacing_seconds, 3),
+        }
+
+
+batch_runner = BatchRunner()
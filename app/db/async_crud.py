@@ -0,0 +1,366 @@
+from sqlalchemy import select, update, insert, tuple_, func, or_, text, any_, literal
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from app.auth_cache import invalidate_user as invalidate_cached_user
+from .crud import encode_cursor, decode_cursor
+from app.passwords import password_hasher
+from datetime import datetime, date
+import json
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+# Async counterparts of the functions in crud.py, for use by the request handlers
+
+async def get_user(db: AsyncSession, username: str):
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    return result.scalars().first()
+
+async def get_user_by_id(db: AsyncSession, user_id: uuid.UUID):
+    if isinstance(user_id, str):
+        user_id = uuid.UUID(user_id)
+    return await db.get(models.User, user_id)
+
+# Admin listing filters; each is served by a partial index on (created_at, id)
+USER_FILTERS = {
+    "pending": ~models.User.is_approved,
+    "suspended": ~models.User.is_active,
+    "admin": models.User.is_admin,
+}
+
+# Below this estimate an exact COUNT(*) is cheap enough
+EXACT_COUNT_THRESHOLD = 10000
+
+def _user_conditions(status: Optional[str] = None, search: Optional[str] = None) -> list:
+    conditions = []
+    if status:
+        if status not in USER_FILTERS:
+            raise ValueError(f"Unknown status filter '{status}'")
+        conditions.append(USER_FILTERS[status])
+    if search:
+        # Case-insensitive prefix match on username or email, with LIKE wildcards escaped
+        pattern = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        conditions.append(or_(
+            models.User.username.ilike(pattern, escape="\\"),
+            models.User.email.ilike(pattern, escape="\\"),
+        ))
+    return conditions
+
+async def list_users(
+    db: AsyncSession,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    search: Optional[str] = None,
+):
+    """Newest users first, keyset-paginated on (created_at, id)."""
+    query = select(models.User).where(*_user_conditions(status, search))
+    if cursor:
+        created_at, user_id = decode_cursor(cursor)
+        query = query.where(tuple_(models.User.created_at, models.User.id) < tuple_(created_at, user_id))
+    query = query.order_by(models.User.created_at.desc(), models.User.id.desc()).limit(limit + 1)
+    rows = (await db.execute(query)).scalars().all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+async def count_users(db: AsyncSession, status: Optional[str] = None, search: Optional[str] = None) -> Tuple[int, bool]:
+    """
+    Returns (count, is_estimate). On PostgreSQL large counts come from the
+    planner's row estimate instead of a full COUNT(*). Searches are always
+    counted exactly.
+    """
+    conditions = _user_conditions(status, search)
+    count_query = select(func.count()).select_from(models.User).where(*conditions)
+    if db.bind.dialect.name == "postgresql" and not search:
+        if conditions:
+            compiled = select(models.User.id).where(*conditions).compile(dialect=db.bind.dialect)
+            # Values stay bound parameters, in whatever style the driver takes them
+            params = compiled.params
+            if compiled.positional:
+                params = tuple(params[name] for name in compiled.positiontup)
+            conn = await db.connection()
+            plan = (await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params)).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = int(plan[0]["Plan"]["Plan Rows"])
+        else:
+            # reltuples is -1 until the table has been vacuumed or analyzed
+            estimate = int((await db.execute(
+                text("SELECT reltuples FROM pg_class WHERE oid = 'users'::regclass")
+            )).scalar() or -1)
+        if estimate >= EXACT_COUNT_THRESHOLD:
+            return estimate, True
+    return (await db.execute(count_query)).scalar_one(), False
+
+async def create_user(db: AsyncSession, username: str, password: str, email: str, is_admin: bool = False, is_approved: bool = False):
+    hashed_password = await password_hasher.hash(password)
+    db_user = models.User(
+        username=username,
+        hashed_password=hashed_password,
+        email=email,
+        is_admin=is_admin,
+        is_approved=is_approved
+    )
+    try:
+        db.add(db_user)
+        await db.commit()
+        await db.refresh(db_user)
+        return db_user
+    except IntegrityError:
+        await db.rollback()
+        return None
+
+async def _set_user_flag(db: AsyncSession, user_id: uuid.UUID, **values):
+    try:
+        user = await get_user_by_id(db, user_id)
+        if user:
+            for name, value in values.items():
+                setattr(user, name, value)
+            await db.commit()
+            await db.refresh(user)
+            invalidate_cached_user(user.id)
+            return user
+        return None
+    except Exception as e:
+        await db.rollback()
+        raise e
+
+async def approve_user(db: AsyncSession, user_id: uuid.UUID):
+    return await _set_user_flag(db, user_id, is_approved=True)
+
+async def suspend_user(db: AsyncSession, user_id: uuid.UUID):
+    return await _set_user_flag(db, user_id, is_active=False)
+
+async def activate_user(db: AsyncSession, user_id: uuid.UUID):
+    return await _set_user_flag(db, user_id, is_active=True)
+
+async def promote_to_admin(db: AsyncSession, user_id: uuid.UUID):
+    return await _set_user_flag(db, user_id, is_admin=True)
+
+# Bulk admin actions as (column, target value)
+BULK_ACTIONS = {
+    "approve": ("is_approved", True),
+    "suspend": ("is_active", False),
+    "activate": ("is_active", True),
+    "promote": ("is_admin", True),
+}
+
+def _id_in(db: AsyncSession, ids: List[uuid.UUID]):
+    if db.bind.dialect.name == "postgresql":
+        # id = ANY($1): one array parameter however many ids there are
+        return models.User.id == any_(literal(ids, ARRAY(UUID(as_uuid=True))))
+    return models.User.id.in_(ids)
+
+async def bulk_update_users(
+    db: AsyncSession,
+    action: str,
+    user_ids: Optional[List[uuid.UUID]] = None,
+    status: Optional[str] = None,
+    search: Optional[str] = None,
+    exclude_id: Optional[uuid.UUID] = None,
+) -> List[Tuple[uuid.UUID, str]]:
+    """
+    Applies an admin action to the given ids, or to every user matching the
+    list filters, with one UPDATE ... RETURNING in one transaction. Returns
+    (user_id, outcome) pairs: updated, unchanged, not_found or skipped
+    (exclude_id, the acting admin). Filters only report updated users.
+    """
+    if action not in BULK_ACTIONS:
+        raise ValueError(f"Unknown action '{action}'")
+    column_name, value = BULK_ACTIONS[action]
+    column = getattr(models.User, column_name)
+    if user_ids is not None:
+        ids = list(dict.fromkeys(user_ids))
+        if not ids:
+            return []
+        conditions = [_id_in(db, ids)]
+    else:
+        conditions = _user_conditions(status, search)
+        if not conditions:
+            raise ValueError("A filter needs a status or a search term")
+    # Rows already in the target state are left alone
+    conditions.append(or_(column.is_(None), column != value))
+    if exclude_id is not None:
+        conditions.append(models.User.id != exclude_id)
+
+    try:
+        statement = update(models.User).where(*conditions).values({column_name: value}).returning(models.User.id)
+        updated = (await db.execute(statement, execution_options={"synchronize_session": False})).scalars().all()
+        outcomes = {user_id: "updated" for user_id in updated}
+        if user_ids is not None:
+            rest = [user_id for user_id in ids if user_id not in outcomes]
+            if rest:
+                # Only needed to tell "already done" apart from unknown ids
+                existing = set((await db.execute(select(models.User.id).where(_id_in(db, rest)))).scalars().all())
+                for user_id in rest:
+                    if user_id not in existing:
+                        outcomes[user_id] = "not_found"
+                    else:
+                        outcomes[user_id] = "skipped" if user_id == exclude_id else "unchanged"
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    for user_id in updated:
+        invalidate_cached_user(user_id)
+    if user_ids is None:
+        return list(outcomes.items())
+    return [(user_id, outcomes[user_id]) for user_id in ids]
+
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[models.User]:
+    user = await get_user(db, username)
+    if not user:
+        return None
+    valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not valid:
+        return None
+    if new_hash:
+        # The configured bcrypt cost changed since this hash was made
+        user.hashed_password = new_hash
+        await db.commit()
+    return user
+
+async def create_conversation(db: AsyncSession, user_id: uuid.UUID, title: Optional[str] = None, model: Optional[str] = None):
+    conversation = models.Conversation(user_id=user_id, title=title, model=model)
+    db.add(conversation)
+    await db.commit()
+    await db.refresh(conversation)
+    return conversation
+
+async def get_conversation(db: AsyncSession, conversation_id: uuid.UUID, user_id: uuid.UUID):
+    if isinstance(conversation_id, str):
+        conversation_id = uuid.UUID(conversation_id)
+    result = await db.execute(
+        select(models.Conversation).where(
+            models.Conversation.id == conversation_id,
+            models.Conversation.user_id == user_id
+        )
+    )
+    return result.scalars().first()
+
+async def list_conversations(db: AsyncSession, user_id: uuid.UUID, limit: int = 20, cursor: Optional[str] = None):
+    query = select(models.Conversation).where(models.Conversation.user_id == user_id)
+    if cursor:
+        updated_at, conversation_id = decode_cursor(cursor)
+        query = query.where(
+            tuple_(models.Conversation.updated_at, models.Conversation.id) < tuple_(updated_at, conversation_id)
+        )
+    query = query.order_by(
+        models.Conversation.updated_at.desc(), models.Conversation.id.desc()
+    ).limit(limit + 1)
+    rows = (await db.execute(query)).scalars().all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].updated_at, rows[-1].id)
+    return rows, next_cursor
+
+async def delete_conversation(db: AsyncSession, conversation_id: uuid.UUID, user_id: uuid.UUID) -> bool:
+    conversation = await get_conversation(db, conversation_id, user_id)
+    if not conversation:
+        return False
+    await db.delete(conversation)
+    await db.commit()
+    return True
+
+async def get_messages(db: AsyncSession, conversation_id: uuid.UUID) -> List[models.Message]:
+    result = await db.execute(
+        select(models.Message).where(
+            models.Message.conversation_id == conversation_id
+        ).order_by(models.Message.created_at)
+    )
+    return result.scalars().all()
+
+async def add_message(db: AsyncSession, conversation_id: uuid.UUID, role: str, content: str, model: Optional[str] = None):
+    message = models.Message(conversation_id=conversation_id, role=role, content=content, model=model)
+    db.add(message)
+    await db.execute(
+        update(models.Conversation).where(models.Conversation.id == conversation_id).values(
+            updated_at=datetime.utcnow()
+        )
+    )
+    await db.commit()
+    await db.refresh(message)
+    return message
+
+async def write_usage_events(db: AsyncSession, events: List[dict]):
+    """
+    Inserts a batch of usage events with one multi-row INSERT and folds it
+    into the daily rollups with one upsert, in a single transaction.
+    """
+    if not events:
+        return
+    await db.execute(insert(models.UsageEvent).values(events))
+
+    rollups: Dict[tuple, dict] = {}
+    for event in events:
+        key = (event["created_at"].date(), event["user_id"], event["model"])
+        row = rollups.get(key)
+        if row is None:
+            row = rollups[key] = {
+                "day": key[0], "user_id": key[1], "model": key[2], "requests": 0,
+                "prompt_tokens": 0, "completion_tokens": 0,
+                "ttft_ms_total": 0.0, "ttft_count": 0, "duration_ms_total": 0.0,
+            }
+        row["requests"] += 1
+        row["prompt_tokens"] += event["prompt_tokens"]
+        row["completion_tokens"] += event["completion_tokens"]
+        row["duration_ms_total"] += event["duration_ms"]
+        if event["ttft_ms"] is not None:
+            row["ttft_ms_total"] += event["ttft_ms"]
+            row["ttft_count"] += 1
+
+    upsert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    # Sorted so concurrent workers lock rollup rows in the same order and cannot deadlock
+    statement = upsert(models.UsageDaily).values([rollups[key] for key in sorted(rollups, key=str)])
+    counters = ("requests", "prompt_tokens", "completion_tokens", "ttft_ms_total", "ttft_count", "duration_ms_total")
+    statement = statement.on_conflict_do_update(
+        index_elements=["day", "user_id", "model"],
+        set_={name: getattr(models.UsageDaily, name) + getattr(statement.excluded, name) for name in counters},
+    )
+    await db.execute(statement)
+    await db.commit()
+
+def _usage_totals(*group_by):
+    daily = models.UsageDaily
+    return select(
+        *group_by,
+        func.sum(daily.requests).label("requests"),
+        func.sum(daily.prompt_tokens).label("prompt_tokens"),
+        func.sum(daily.completion_tokens).label("completion_tokens"),
+        func.sum(daily.ttft_ms_total).label("ttft_ms_total"),
+        func.sum(daily.ttft_count).label("ttft_count"),
+        func.sum(daily.duration_ms_total).label("duration_ms_total"),
+    ).group_by(*group_by)
+
+async def usage_by_day_and_model(db: AsyncSession, since: date, user_id: Optional[uuid.UUID] = None):
+    """Rollup totals per (day, model) from `since`, oldest first. Never reads raw events."""
+    daily = models.UsageDaily
+    query = _usage_totals(daily.day, daily.model).where(daily.day >= since)
+    if user_id is not None:
+        query = query.where(daily.user_id == user_id)
+    return (await db.execute(query.order_by(daily.day, daily.model))).all()
+
+async def usage_by_user_and_model(
+    db: AsyncSession, since: date, limit: int = 20, user_id: Optional[uuid.UUID] = None
+):
+    """Rollup totals per (user, model) for the `limit` users with the most tokens since `since`."""
+    daily = models.UsageDaily
+    tokens = func.sum(daily.prompt_tokens + daily.completion_tokens)
+    top = select(daily.user_id).where(daily.day >= since)
+    if user_id is not None:
+        top = top.where(daily.user_id == user_id)
+    top = top.group_by(daily.user_id).order_by(tokens.desc()).limit(limit).subquery()
+    query = (
+        _usage_totals(daily.user_id, models.User.username, daily.model)
+        .join(top, top.c.user_id == daily.user_id)
+        .outerjoin(models.User, models.User.id == daily.user_id)
+        .where(daily.day >= since)
+    )
+    return (await db.execute(query)).all()
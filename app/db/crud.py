@@ -1,11 +1,13 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy import tuple_
 from . import models
-from passlib.context import CryptContext
+from app.auth_cache import invalidate_user as invalidate_cached_user
+from app.passwords import pwd_context
+from datetime import datetime
+import base64
 import uuid
-from typing import Optional
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from typing import List, Optional, Tuple
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -54,6 +56,7 @@ def approve_user(db: Session, user_id: uuid.UUID):
             user.is_approved = True
             db.commit()
             db.refresh(user)  # Refresh to ensure we get the latest state
+            invalidate_cached_user(user.id)
             return user
         return None
     except Exception as e:
@@ -65,6 +68,7 @@ def suspend_user(db: Session, user_id: uuid.UUID):
     if user:
         user.is_active = False
         db.commit()
+        invalidate_cached_user(user.id)
         return user
     return None
 
@@ -73,6 +77,7 @@ def activate_user(db: Session, user_id: uuid.UUID):
     if user:
         user.is_active = True
         db.commit()
+        invalidate_cached_user(user.id)
         return user
     return None
 
@@ -81,6 +86,7 @@ def promote_to_admin(db: Session, user_id: uuid.UUID):
     if user:
         user.is_admin = True
         db.commit()
+        invalidate_cached_user(user.id)
         return user
     return None
 
@@ -93,3 +99,75 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[mod
     # Remove the active check here, let the login handler manage this
     # This allows the proper error message to be displayed
     return user
+
+# Keyset cursors are an opaque "<iso timestamp>|<uuid>" pair, base64 encoded
+def encode_cursor(timestamp: datetime, row_id: uuid.UUID) -> str:
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(timestamp), uuid.UUID(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def create_conversation(db: Session, user_id: uuid.UUID, title: Optional[str] = None, model: Optional[str] = None):
+    conversation = models.Conversation(user_id=user_id, title=title, model=model)
+    db.add(conversation)
+    db.commit()
+    db.refresh(conversation)
+    return conversation
+
+def get_conversation(db: Session, conversation_id: uuid.UUID, user_id: uuid.UUID):
+    if isinstance(conversation_id, str):
+        conversation_id = uuid.UUID(conversation_id)
+    return db.query(models.Conversation).filter(
+        models.Conversation.id == conversation_id,
+        models.Conversation.user_id == user_id
+    ).first()
+
+def list_conversations(db: Session, user_id: uuid.UUID, limit: int = 20, cursor: Optional[str] = None):
+    """
+    Most recently updated conversations first, paginated on (updated_at, id).
+    Returns (conversations, next_cursor); next_cursor is None on the last page.
+    """
+    query = db.query(models.Conversation).filter(models.Conversation.user_id == user_id)
+    if cursor:
+        updated_at, conversation_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(models.Conversation.updated_at, models.Conversation.id) < tuple_(updated_at, conversation_id)
+        )
+    rows = query.order_by(
+        models.Conversation.updated_at.desc(), models.Conversation.id.desc()
+    ).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].updated_at, rows[-1].id)
+    return rows, next_cursor
+
+def delete_conversation(db: Session, conversation_id: uuid.UUID, user_id: uuid.UUID) -> bool:
+    conversation = get_conversation(db, conversation_id, user_id)
+    if not conversation:
+        return False
+    db.delete(conversation)
+    db.commit()
+    return True
+
+def get_messages(db: Session, conversation_id: uuid.UUID) -> List[models.Message]:
+    return db.query(models.Message).filter(
+        models.Message.conversation_id == conversation_id
+    ).order_by(models.Message.created_at).all()
+
+def add_message(db: Session, conversation_id: uuid.UUID, role: str, content: str, model: Optional[str] = None):
+    """Append a message and bump the conversation's updated_at in the same commit."""
+    message = models.Message(conversation_id=conversation_id, role=role, content=content, model=model)
+    db.add(message)
+    db.query(models.Conversation).filter(models.Conversation.id == conversation_id).update(
+        {models.Conversation.updated_at: datetime.utcnow()}, synchronize_session=False
+    )
+    db.commit()
+    db.refresh(message)
+    return message
@@ -1,11 +1,53 @@
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
+from contextlib import contextmanager
 import os
+import logging
 from . import models, crud
-from .database import engine
+from .database import engine, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary application-wide id for the PostgreSQL advisory lock around setup
+INIT_LOCK_ID = 72011
+
+@contextmanager
+def init_lock():
+    """Serializes schema setup across processes and replicas starting at once."""
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": INIT_LOCK_ID})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": INIT_LOCK_ID})
+
+def create_schema():
+    """Create missing tables and indexes. Safe to run on every start."""
+    if engine.dialect.name == "postgresql":
+        # Backs the admin user search; without it the trigram indexes are skipped
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        except SQLAlchemyError as e:
+            logger.warning(f"Could not enable pg_trgm, user search will not be indexed: {e}")
+    models.Base.metadata.create_all(bind=engine)
+    # create_all only adds indexes together with new tables; add ones introduced since
+    with engine.begin() as conn:
+        for table in models.Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
 
 def init_db(db: Session):
+    with init_lock():
+        _init_db(db)
+
+def _init_db(db: Session):
     # Create tables
-    models.Base.metadata.create_all(bind=engine)
+    create_schema()
     
     # Check if admin user exists
     admin_username = os.environ.get("ADMIN_USERNAME")
@@ -35,3 +77,15 @@ def init_db(db: Session):
         print(f"Created admin user: {admin_username}")
     else:
         print("Failed to create admin user")
+
+def run():
+    """One-time setup for app.serve and deploy scripts: python -m app.db.init_db"""
+    db = SessionLocal()
+    try:
+        init_db(db)
+    finally:
+        db.close()
+    engine.dispose()
+
+if __name__ == "__main__":
+    run()
@@ -1,11 +1,24 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, String, Boolean, DateTime, Date, ForeignKey, Text, Index, text
+from sqlalchemy import Integer, BigInteger, Float
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
 
 Base = declarative_base()
 
+def _has_trigram(ddl, target, bind, **kw) -> bool:
+    # Trigram indexes need PostgreSQL with the pg_trgm extension (see init_db.create_schema)
+    if bind.dialect.name != "postgresql":
+        return False
+    return bind.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+
+def _trigram_index(name: str, column: str) -> Index:
+    return Index(
+        name, column, postgresql_using="gin", postgresql_ops={column: "gin_trgm_ops"}
+    ).ddl_if(callable_=_has_trigram)
+
 class User(Base):
     __tablename__ = "users"
     
@@ -19,5 +32,112 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Admin listing: keyset pagination on (created_at, id), newest first. The partial
+    # indexes serve the pending/suspended/admin filters without scanning everyone else,
+    # the trigram indexes serve case-insensitive username/email prefix search.
+    __table_args__ = (
+        Index("ix_users_created_id", "created_at", "id"),
+        Index(
+            "ix_users_pending_created", "created_at", "id",
+            postgresql_where=text("NOT is_approved"), sqlite_where=text("NOT is_approved"),
+        ),
+        Index(
+            "ix_users_suspended_created", "created_at", "id",
+            postgresql_where=text("NOT is_active"), sqlite_where=text("NOT is_active"),
+        ),
+        Index(
+            "ix_users_admin_created", "created_at", "id",
+            postgresql_where=text("is_admin"), sqlite_where=text("is_admin"),
+        ),
+        _trigram_index("ix_users_username_trgm", "username"),
+        _trigram_index("ix_users_email_trgm", "email"),
+    )
+
     def __repr__(self):
         return f"<User {self.username}>"
+
+class Conversation(Base):
+    __tablename__ = "conversations"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    title = Column(String, nullable=True)
+    model = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    messages = relationship(
+        "Message",
+        back_populates="conversation",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        order_by="Message.created_at",
+    )
+
+    # Serves the per-user listing ordered by most recent activity (keyset pagination)
+    __table_args__ = (
+        Index("ix_conversations_user_updated", "user_id", "updated_at", "id"),
+    )
+
+    def __repr__(self):
+        return f"<Conversation {self.id}>"
+
+class Message(Base):
+    __tablename__ = "messages"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    conversation_id = Column(UUID(as_uuid=True), ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
+    role = Column(String, nullable=False)
+    content = Column(Text, nullable=False)
+    model = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    conversation = relationship("Conversation", back_populates="messages")
+
+    __table_args__ = (
+        Index("ix_messages_conversation_created", "conversation_id", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"<Message {self.role} in {self.conversation_id}>"
+
+class UsageEvent(Base):
+    """One chat completion, written in batches by app.usage (append-only)."""
+    __tablename__ = "usage_events"
+
+    # SQLite only auto-increments INTEGER primary keys
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    # No foreign key: a batch must not fail because one user was removed meanwhile
+    user_id = Column(UUID(as_uuid=True), nullable=False)
+    model = Column(String, nullable=False)
+    endpoint = Column(String, nullable=False)
+    prompt_tokens = Column(Integer, nullable=False)
+    completion_tokens = Column(Integer, nullable=False)
+    # Milliseconds to the first chunk; NULL when nothing was generated
+    ttft_ms = Column(Float, nullable=True)
+    duration_ms = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_usage_events_user_created", "user_id", "created_at"),
+    )
+
+class UsageDaily(Base):
+    """Per day, user and model totals, kept up to date with each batch of usage events."""
+    __tablename__ = "usage_daily"
+
+    day = Column(Date, primary_key=True)
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    model = Column(String, primary_key=True)
+    requests = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(BigInteger, nullable=False, default=0)
+    completion_tokens = Column(BigInteger, nullable=False, default=0)
+    # Sums, so averages stay exact as rows are merged; ttft_count excludes empty replies
+    ttft_ms_total = Column(Float, nullable=False, default=0)
+    ttft_count = Column(Integer, nullable=False, default=0)
+    duration_ms_total = Column(Float, nullable=False, default=0)
+
+    # The primary key serves date-range reports; this one serves a single user's history
+    __table_args__ = (
+        Index("ix_usage_daily_user_day", "user_id", "day"),
+    )
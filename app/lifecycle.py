@@ -0,0 +1,54 @@
+import os
+import signal
+import logging
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+
+class Lifecycle:
+    """
+    Readiness of this worker: "starting" until every startup hook has run,
+    "ready" while serving, "draining" from the first SIGTERM/SIGINT. The
+    server (uvicorn's --timeout-graceful-shutdown) does the actual draining,
+    this only lets /health/ready fail early and counts the chat streams
+    still open.
+    """
+
+    def __init__(self):
+        self.state = "starting"
+        self.streams = 0
+
+    def mark_ready(self):
+        self.state = "ready"
+
+    def start_draining(self):
+        if self.state != "draining":
+            self.state = "draining"
+            logger.info(f"Draining worker {os.getpid()}: {self.streams} chat streams in flight")
+
+    def install_signal_handlers(self):
+        """Chains onto the server's handlers, which still run and start the shutdown."""
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            previous = signal.getsignal(sig)
+            try:
+                signal.signal(sig, partial(self._on_signal, previous))
+            except ValueError:
+                # Not in the main thread (e.g. under a test client); readiness still works
+                return
+
+    def _on_signal(self, previous, signum, frame):
+        self.start_draining()
+        if callable(previous):
+            previous(signum, frame)
+
+    def shutdown(self):
+        self.start_draining()
+        if self.streams:
+            logger.warning(f"Worker {os.getpid()} stopping with {self.streams} chat streams cut off by the drain timeout")
+
+    def stats(self) -> dict:
+        return {"pid": os.getpid(), "state": self.state, "chat_streams": self.streams}
+
+
+lifecycle = Lifecycle()
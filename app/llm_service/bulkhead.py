@@ -0,0 +1,227 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional
+from anyio import CapacityLimiter
+from .catalog import model_catalog, Concurrency
+from app.metrics import LLM_BULKHEAD_ACTIVE, LLM_BULKHEAD_QUEUED, LLM_BULKHEAD_WAIT_SECONDS, LLM_BULKHEAD_REJECTED
+
+logger = logging.getLogger(__name__)
+
+LLM_BULKHEADS_ENABLED = os.environ.get("LLM_BULKHEADS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Per-worker defaults for providers and models without a "concurrency" entry in the model catalog
+LLM_CONCURRENCY_LIMIT = int(os.environ.get("LLM_CONCURRENCY_LIMIT", "32"))
+LLM_QUEUE_SIZE = int(os.environ.get("LLM_QUEUE_SIZE", "64"))
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", "10"))
+
+
+def with_defaults(concurrency: Optional[Concurrency]) -> Concurrency:
+    limit, queue, queue_timeout = concurrency or (None, None, None)
+    return Concurrency(
+        LLM_CONCURRENCY_LIMIT if limit is None else limit,
+        LLM_QUEUE_SIZE if queue is None else queue,
+        LLM_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout,
+    )
+
+
+class BulkheadFull(Exception):
+    def __init__(self, name: str, reason: str, retry_after: float):
+        super().__init__(f"Too many requests for {name} ({reason}), please retry shortly")
+        self.name = name
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def __reduce__(self):
+        # Copyable, so the coalescer can hand each subscriber its own instance
+        return type(self), (self.name, self.reason, self.retry_after)
+
+
+class Bulkhead:
+    """
+    Concurrency limit for one provider (or one model), so a slow upstream
+    only ties up its own slots. Up to `limit` requests run at once, up to
+    `queue` more wait in FIFO order for at most `queue_timeout` seconds, and
+    anything beyond that is rejected at once with BulkheadFull. Sync
+    provider handlers run on a thread limiter of the same size, so they do
+    not draw on the default threadpool shared with the rest of the app.
+    """
+
+    def __init__(self, name: str, concurrency: Concurrency):
+        self.name = name
+        self.limit = concurrency.limit
+        self.queue = concurrency.queue
+        self.queue_timeout = concurrency.queue_timeout
+        self.limiter = CapacityLimiter(concurrency.limit)
+        self.active = 0
+        self.peak_active = 0
+        self.peak_queued = 0
+        self.admitted = 0
+        self.waited = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._active_gauge = LLM_BULKHEAD_ACTIVE.labels(name)
+        self._queued_gauge = LLM_BULKHEAD_QUEUED.labels(name)
+        self._wait_histogram = LLM_BULKHEAD_WAIT_SECONDS.labels(name)
+
+    def _reject(self, reason: str):
+        LLM_BULKHEAD_REJECTED.labels(self.name, reason).inc()
+        raise BulkheadFull(self.name, reason, retry_after=max(1.0, self.queue_timeout))
+
+    async def acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self._admit(0.0)
+            return
+        if len(self._waiters) >= self.queue:
+            self.rejected_full += 1
+            self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._queued_gauge.inc()
+        self.peak_queued = max(self.peak_queued, len(self._waiters))
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not waiter.done() or waiter.cancelled():
+                self.rejected_timeout += 1
+                self._reject("queue_timeout")
+            # The slot was handed over just as the wait timed out; keep it
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # Handed a slot, but the caller is gone: pass it on
+                self._hand_over()
+            raise
+        finally:
+            self._queued_gauge.dec()
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+        waited = time.monotonic() - started
+        self.waited += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        self._wait_histogram.observe(waited)
+        # The slot came from release(); active already counts it
+        self.admitted += 1
+
+    def _admit(self, waited: float):
+        self.active += 1
+        self.admitted += 1
+        self.peak_active = max(self.peak_active, self.active)
+        self._active_gauge.inc()
+        self._wait_histogram.observe(waited)
+
+    def _hand_over(self):
+        # Pass the slot straight to the longest waiter, so new arrivals cannot jump the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+        self._active_gauge.dec()
+
+    def release(self):
+        self._hand_over()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "queue": self.queue,
+            "queue_timeout": self.queue_timeout,
+            "active": self.active,
+            "queued": len(self._waiters),
+            "peak_active": self.peak_active,
+            "peak_queued": self.peak_queued,
+            "threads_busy": self.limiter.borrowed_tokens,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_full,
+            "rejected_queue_timeout": self.rejected_timeout,
+            "wait_ms_avg": round(self.wait_seconds_total / self.waited * 1000, 2) if self.waited else 0.0,
+            "wait_ms_max": round(self.wait_seconds_max * 1000, 2),
+        }
+
+
+class PermitStream:
+    """
+    Async iterator that holds a bulkhead slot (if any) until the stream ends
+    or is closed. Closing it also closes `upstream`, the provider stream
+    underneath `stream`, so nothing is left open if it is closed unread.
+    """
+
+    def __init__(self, stream: AsyncIterator[str], bulkhead: Optional[Bulkhead], upstream: Optional[AsyncIterator[str]] = None):
+        self._stream = stream
+        self._bulkhead = bulkhead
+        self._upstream = upstream
+
+    def _release(self):
+        bulkhead, self._bulkhead = self._bulkhead, None
+        if bulkhead is not None:
+            bulkhead.release()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        try:
+            return await self._stream.__anext__()
+        except BaseException:
+            # Exhausted, failed or cancelled: the upstream is finished with
+            self._release()
+            raise
+
+    async def aclose(self):
+        try:
+            for stream in (self._stream, self._upstream):
+                aclose = getattr(stream, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+        finally:
+            self._release()
+
+
+class Bulkheads:
+    """
+    One bulkhead per provider, plus one for each model whose catalog entry
+    sets its own "concurrency". Built once from the model catalog.
+    """
+
+    def __init__(self, enabled: bool = LLM_BULKHEADS_ENABLED):
+        self.enabled = enabled
+        self.bulkheads: Dict[str, Bulkhead] = {
+            name: Bulkhead(name, with_defaults(spec.concurrency))
+            for name, spec in model_catalog.providers.items()
+        }
+        self._by_model: Dict[str, Bulkhead] = {}
+        for spec in model_catalog.models.values():
+            if spec.concurrency is not None:
+                self.bulkheads[spec.id] = Bulkhead(spec.id, with_defaults(spec.concurrency))
+                self._by_model[spec.id] = self.bulkheads[spec.id]
+            else:
+                self._by_model[spec.id] = self.bulkheads[spec.provider]
+
+    def for_model(self, model: str, provider: str) -> Optional[Bulkhead]:
+        if not self.enabled:
+            return None
+        bulkhead = self._by_model.get(model)
+        if bulkhead is None:
+            # Models registered after startup share their provider's bulkhead
+            bulkhead = self.bulkheads.get(provider)
+        return bulkhead
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "bulkheads": {name: bulkhead.stats() for name, bulkhead in self.bulkheads.items()},
+        }
+
+
+bulkheads = Bulkheads()
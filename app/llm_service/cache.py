@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncIterator, List, Optional
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")  # "memory" or "disk"
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_DIR = os.environ.get("RESPONSE_CACHE_DIR", ".cache/responses")
+
+
+def make_key(model: str, messages: list, max_tokens: Optional[int], temperature: Optional[float]) -> str:
+    """Hash of the normalized request; whitespace around message content is ignored."""
+    normalized = {
+        "model": model,
+        "messages": [
+            [m.get("role", "user"), (m.get("content") or "").strip()]
+            for m in messages
+        ],
+        "max_tokens": int(max_tokens) if max_tokens is not None else None,
+        "temperature": float(temperature) if temperature is not None else None,
+    }
+    payload = json.dumps(normalized, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _entry_size(chunks: List[str]) -> int:
+    return sum(len(chunk.encode("utf-8")) for chunk in chunks)
+
+
+class MemoryBackend:
+    """LRU of key -> (expires_at, size, chunks) bounded by total byte size."""
+
+    def __init__(self, ttl: float, max_bytes: int):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[List[str]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, size, chunks = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return chunks
+
+    def set(self, key: str, chunks: List[str]):
+        size = _entry_size(chunks)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, size, chunks)
+        self.size += size
+        while self.size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self.size -= size
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskBackend:
+    """
+    One JSON file per key; the oldest files are deleted once the byte cap is
+    exceeded. Called from threadpool threads, so the running totals are
+    updated under a lock.
+    """
+
+    def __init__(self, ttl: float, max_bytes: int, directory: str):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.size = sum(p.stat().st_size for p in self.directory.glob("*.json"))
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> Optional[List[str]]:
+        path = self._path(key)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if data.get("expires_at", 0) < time.time():
+            self._remove(path)
+            return None
+        os.utime(path)  # refresh mtime so eviction approximates LRU
+        return data["chunks"]
+
+    def set(self, key: str, chunks: List[str]):
+        payload = json.dumps({"expires_at": time.time() + self.ttl, "chunks": chunks}, ensure_ascii=False).encode("utf-8")
+        if len(payload) > self.max_bytes:
+            return
+        path = self._path(key)
+        self._remove(path)
+        # A temporary name per writer, so concurrent sets of one key cannot interleave their bytes
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(payload)
+        with self._lock:
+            replaced = path.stat().st_size if path.exists() else 0
+            tmp_path.replace(path)
+            self.size += len(payload) - replaced
+            over = self.size > self.max_bytes
+        if over:
+            self._evict()
+
+    def _remove(self, path: Path):
+        with self._lock:
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except OSError:
+                return
+            self.size -= size
+
+    def _evict(self):
+        files = []
+        for path in self.directory.glob("*.json"):
+            try:
+                files.append((path.stat().st_mtime, path))
+            except OSError:
+                # Removed by another thread since the listing
+                pass
+        for _, path in sorted(files):
+            if self.size <= self.max_bytes:
+                break
+            self._remove(path)
+            self.evictions += 1
+
+    def __len__(self):
+        return sum(1 for _ in self.directory.glob("*.json"))
+
+
+class _Recording:
+    """
+    Stream wrapper for ResponseCache.record. Closing it (client gone) closes
+    the upstream too, read or not; a partial reply is not stored.
+    """
+
+    def __init__(self, cache: "ResponseCache", key: str, stream: AsyncIterator[str]):
+        self._cache = cache
+        self._key = key
+        self._stream = stream
+        self._chunks: List[str] = []
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        try:
+            chunk = await self._stream.__anext__()
+        except StopAsyncIteration:
+            chunks, self._chunks = self._chunks, []
+            if chunks:
+                await self._cache.set(self._key, chunks)
+            await self.aclose()
+            raise
+        except BaseException:
+            self._chunks = []
+            await self.aclose()
+            raise
+        self._chunks.append(chunk)
+        return chunk
+
+    async def aclose(self):
+        aclose = getattr(self._stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class ResponseCache:
+    """
+    Exact-match cache of complete LLM responses, stored as the list of
+    streamed chunks so a hit can be replayed through the streaming path.
+    """
+
+    def __init__(self, enabled: bool = RESPONSE_CACHE_ENABLED, backend: str = RESPONSE_CACHE_BACKEND):
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        if enabled and backend == "disk":
+            self.backend = DiskBackend(RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_DIR)
+            self._blocking = True
+        else:
+            self.backend = MemoryBackend(RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_BYTES)
+            self._blocking = False
+
+    async def get(self, key: str) -> Optional[List[str]]:
+        if self._blocking:
+            chunks = await run_in_threadpool(self.backend.get, key)
+        else:
+            chunks = self.backend.get(key)
+        if chunks is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return chunks
+
+    async def set(self, key: str, chunks: List[str]):
+        try:
+            if self._blocking:
+                await run_in_threadpool(self.backend.set, key, chunks)
+            else:
+                self.backend.set(key, chunks)
+            self.stores += 1
+        except Exception as e:
+            logger.warning(f"Failed to store cached response: {e}")
+
+    def record(self, key: str, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+        """Pass chunks through and store them once the stream completes normally."""
+        return _Recording(self, key, stream)
+
+    async def replay(self, chunks: List[str]) -> AsyncIterator[str]:
+        for chunk in chunks:
+            yield chunk
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "bytes": self.backend.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.backend.evictions,
+        }
+
+
+response_cache = ResponseCache()
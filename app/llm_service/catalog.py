@@ -0,0 +1,176 @@
+import os
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Point LLM_MODELS_FILE at another file to add models or OpenAI-compatible
+# endpoints (vLLM, Ollama, LM Studio, ...) without code changes
+DEFAULT_MODELS_FILE = Path(__file__).with_name("models.json")
+LLM_MODELS_FILE = os.environ.get("LLM_MODELS_FILE") or str(DEFAULT_MODELS_FILE)
+LLM_DEFAULT_MODEL = os.environ.get("LLM_DEFAULT_MODEL") or None
+
+PROTOCOLS = ("openai", "gemini")
+
+
+class Concurrency(NamedTuple):
+    # Upstream requests in flight at once
+    limit: Optional[int]
+    # Requests allowed to wait for a slot; beyond that they are rejected at once
+    queue: Optional[int]
+    # Seconds a request may wait before it is rejected
+    queue_timeout: Optional[float]
+
+
+def parse_concurrency(entry: Optional[dict], where: str) -> Optional[Concurrency]:
+    """Settings left out are None and take the defaults from bulkhead.py."""
+    if not entry:
+        return None
+    limit, queue, queue_timeout = entry.get("limit"), entry.get("queue"), entry.get("queue_timeout")
+    concurrency = Concurrency(
+        int(limit) if limit is not None else None,
+        int(queue) if queue is not None else None,
+        float(queue_timeout) if queue_timeout is not None else None,
+    )
+    if (concurrency.limit is not None and concurrency.limit < 1) or any(
+        value is not None and value < 0 for value in (concurrency.queue, concurrency.queue_timeout)
+    ):
+        raise ValueError(f"{where} has an invalid concurrency setting: {entry}")
+    return concurrency
+
+
+class ProviderSpec(NamedTuple):
+    name: str
+    protocol: str
+    base_url: Optional[str]
+    # None for endpoints that do not need a key (e.g. a local server)
+    api_key_env: Optional[str]
+    temperature: float
+    # Bulkhead for the provider's models (see bulkhead.py); None uses the defaults
+    concurrency: Optional[Concurrency] = None
+
+
+class ModelSpec(NamedTuple):
+    id: str
+    provider: str
+    label: str
+    context_window: int
+    max_output: int
+    # USD per million tokens
+    input_cost: float
+    output_cost: float
+    # Typical generation rate, for capacity planning and the model picker
+    tokens_per_second: Optional[float]
+    streaming: bool
+    fallbacks: Tuple[str, ...]
+    # Gives the model a bulkhead of its own instead of sharing its provider's
+    concurrency: Optional[Concurrency] = None
+
+    @property
+    def limits(self) -> Tuple[int, int]:
+        return self.context_window, self.max_output
+
+
+def default_label(model_id: str) -> str:
+    return model_id.replace("-", " ").capitalize()
+
+
+class ModelCatalog:
+    """
+    Every model the app can route to, built once from a JSON config.
+    Lookups are dict hits and the model picker options are precomputed,
+    so nothing here is rebuilt per request.
+    """
+
+    def __init__(self, config: dict, default_model: Optional[str] = None, source: Optional[str] = None):
+        self.source = source
+        self.providers: Dict[str, ProviderSpec] = {}
+        for name, entry in config.get("providers", {}).items():
+            protocol = entry.get("protocol", "openai")
+            if protocol not in PROTOCOLS:
+                raise ValueError(f"Provider '{name}' has unknown protocol '{protocol}'")
+            base_url_env = entry.get("base_url_env")
+            base_url = (os.environ.get(base_url_env) if base_url_env else None) or entry.get("base_url")
+            self.providers[name] = ProviderSpec(
+                name, protocol, base_url, entry.get("api_key_env"), float(entry.get("temperature", 0.7)),
+                parse_concurrency(entry.get("concurrency"), f"Provider '{name}'"),
+            )
+
+        self.models: Dict[str, ModelSpec] = {}
+        for entry in config.get("models", []):
+            model_id = entry["id"]
+            if model_id in self.models:
+                raise ValueError(f"Model '{model_id}' is defined twice")
+            if entry["provider"] not in self.providers:
+                raise ValueError(f"Model '{model_id}' uses unknown provider '{entry['provider']}'")
+            cost = entry.get("cost_per_million") or {}
+            self.models[model_id] = ModelSpec(
+                id=model_id,
+                provider=entry["provider"],
+                label=entry.get("label") or default_label(model_id),
+                context_window=int(entry["context_window"]),
+                max_output=int(entry["max_output"]),
+                input_cost=float(cost.get("input", 0)),
+                output_cost=float(cost.get("output", 0)),
+                tokens_per_second=entry.get("tokens_per_second"),
+                streaming=bool(entry.get("streaming", True)),
+                fallbacks=tuple(entry.get("fallbacks", ())),
+                concurrency=parse_concurrency(entry.get("concurrency"), f"Model '{model_id}'"),
+            )
+        if not self.models:
+            raise ValueError("The model catalog is empty")
+
+        self.default_model = default_model or config.get("default_model") or next(iter(self.models))
+        if self.default_model not in self.models:
+            raise ValueError(f"Default model '{self.default_model}' is not in the catalog")
+
+        # Model picker options grouped by provider, in file order
+        self.options: Dict[str, List[dict]] = {}
+        for spec in self.models.values():
+            self.options.setdefault(spec.provider, []).append({"id": spec.id, "label": spec.label})
+        self.public: List[dict] = [
+            {
+                "id": spec.id,
+                "label": spec.label,
+                "provider": spec.provider,
+                "context_window": spec.context_window,
+                "max_output": spec.max_output,
+                "cost_per_million": {"input": spec.input_cost, "output": spec.output_cost},
+                "tokens_per_second": spec.tokens_per_second,
+                "streaming": spec.streaming,
+                "default": spec.id == self.default_model,
+            }
+            for spec in self.models.values()
+        ]
+
+    @classmethod
+    def from_file(cls, path: str, default_model: Optional[str] = None) -> "ModelCatalog":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), default_model=default_model, source=str(path))
+
+    def get(self, model: str) -> Optional[ModelSpec]:
+        return self.models.get(model)
+
+    def provider_for(self, model: str) -> Optional[str]:
+        spec = self.models.get(model)
+        return spec.provider if spec is not None else None
+
+    def limits(self, model: str) -> Optional[Tuple[int, int]]:
+        spec = self.models.get(model)
+        return spec.limits if spec is not None else None
+
+    def fallbacks(self) -> Dict[str, List[str]]:
+        return {spec.id: list(spec.fallbacks) for spec in self.models.values() if spec.fallbacks}
+
+    def stats(self) -> dict:
+        return {
+            "source": self.source,
+            "default_model": self.default_model,
+            "providers": {name: len(models) for name, models in self.options.items()},
+            "models": len(self.models),
+        }
+
+
+model_catalog = ModelCatalog.from_file(LLM_MODELS_FILE, default_model=LLM_DEFAULT_MODEL)
@@ -0,0 +1,240 @@
+import os
+import logging
+import httpx
+from openai import OpenAI, AsyncOpenAI
+from google import genai
+from google.genai import types
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from .catalog import model_catalog
+
+logger = logging.getLogger(__name__)
+
+# Base URL and API key environment variable per provider, from the model catalog
+PROVIDER_ENDPOINTS = {
+    name: (spec.base_url, spec.api_key_env) for name, spec in model_catalog.providers.items()
+}
+
+# Connection pool settings shared by every provider client
+MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = float(os.environ.get("LLM_KEEPALIVE_EXPIRY", "30"))
+CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "10"))
+READ_TIMEOUT = float(os.environ.get("LLM_READ_TIMEOUT", "120"))
+HTTP2 = os.environ.get("LLM_HTTP2", "false").lower() in ("1", "true", "yes")
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def _http_client_kwargs() -> dict:
+    http2 = HTTP2 and HTTP2_AVAILABLE
+    if HTTP2 and not HTTP2_AVAILABLE:
+        logger.warning("LLM_HTTP2 is enabled but the 'h2' package is not installed; using HTTP/1.1")
+    return {
+        "limits": httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        "http2": http2,
+    }
+
+
+class _PooledClient:
+    """One provider SDK client plus the httpx clients (and pools) it sends through."""
+
+    def __init__(self, provider: str, base_url: Optional[str]):
+        self.provider = provider
+        self.base_url = base_url
+        self.requests_total = 0
+        self._sdk_client = None
+        self._sync_sdk_client = None
+        self._async_http: Optional[httpx.AsyncClient] = None
+        self._sync_http: Optional[httpx.Client] = None
+
+    def _count_request(self, request):
+        self.requests_total += 1
+
+    async def _acount_request(self, request):
+        self.requests_total += 1
+
+    def async_http(self) -> httpx.AsyncClient:
+        if self._async_http is None:
+            self._async_http = httpx.AsyncClient(
+                event_hooks={"request": [self._acount_request]}, **_http_client_kwargs()
+            )
+        return self._async_http
+
+    def sync_http(self) -> httpx.Client:
+        if self._sync_http is None:
+            self._sync_http = httpx.Client(
+                event_hooks={"request": [self._count_request]}, **_http_client_kwargs()
+            )
+        return self._sync_http
+
+    async def aclose(self):
+        if self._async_http is not None:
+            await self._async_http.aclose()
+        if self._sync_http is not None:
+            self._sync_http.close()
+        self._async_http = self._sync_http = None
+        self._sdk_client = self._sync_sdk_client = None
+
+    def stats(self) -> dict:
+        return {
+            "provider": self.provider,
+            "base_url": self.base_url,
+            "requests_total": self.requests_total,
+            "async_pool": _pool_stats(self._async_http),
+            "sync_pool": _pool_stats(self._sync_http),
+        }
+
+
+def _pool_stats(client) -> Optional[dict]:
+    if client is None:
+        return None
+    # httpx does not expose its connection pool publicly; read httpcore's view of it
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    if pool is None:
+        return None
+    connections = list(pool.connections)
+    idle = sum(1 for conn in connections if conn.is_idle())
+    queued = sum(1 for req in list(getattr(pool, "_requests", [])) if req.is_queued())
+    return {
+        "connections": len(connections),
+        "active": len(connections) - idle,
+        "idle": idle,
+        "queued_requests": queued,
+        "max_connections": MAX_CONNECTIONS,
+    }
+
+
+class ResponseStream:
+    """
+    Text deltas of a streamed provider response. Closing it closes the
+    response, returning its connection to the shared pool, whether or not
+    it was read at all; a generator that was never started could not.
+    """
+
+    def __init__(self, response, text_of: Callable[[Any], Optional[str]], close: Callable[[], Awaitable[None]]):
+        self._chunks = response.__aiter__()
+        self._text_of = text_of
+        self._close = close
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        while True:
+            try:
+                chunk = await self._chunks.__anext__()
+            except BaseException:
+                # Finished, failed or cancelled: the response is done with
+                await self.aclose()
+                raise
+            text = self._text_of(chunk)
+            if text:
+                return text
+
+    async def aclose(self):
+        if not self._closed:
+            self._closed = True
+            await self._close()
+
+
+def delta_text(chunk) -> Optional[str]:
+    """Text of an OpenAI-style streamed chat completion chunk."""
+    if not chunk.choices:
+        return None
+    return getattr(chunk.choices[0].delta, "content", None)
+
+
+class ClientRegistry:
+    """
+    Long-lived provider clients keyed by (provider, base URL).
+    Reusing them keeps TLS sessions and keep-alive connections warm across chat turns.
+    """
+
+    def __init__(self):
+        self._clients: Dict[Tuple[str, Optional[str]], _PooledClient] = {}
+
+    def _entry(self, provider: str, base_url: Optional[str] = None) -> _PooledClient:
+        if base_url is None:
+            base_url = PROVIDER_ENDPOINTS[provider][0]
+        key = (provider, base_url)
+        entry = self._clients.get(key)
+        if entry is None:
+            entry = self._clients[key] = _PooledClient(provider, base_url)
+        return entry
+
+    def _api_key(self, provider: str) -> str:
+        env_var = PROVIDER_ENDPOINTS[provider][1]
+        if env_var is None:
+            # Keyless endpoint; the OpenAI SDK still insists on a value
+            return "unused"
+        api_key = os.environ.get(env_var)
+        if not api_key:
+            raise RuntimeError(f"{env_var} environment variable not set")
+        return api_key
+
+    def get_async_openai(self, provider: str, base_url: Optional[str] = None) -> AsyncOpenAI:
+        entry = self._entry(provider, base_url)
+        if entry._sdk_client is None:
+            entry._sdk_client = AsyncOpenAI(
+                api_key=self._api_key(provider),
+                base_url=entry.base_url,
+                http_client=entry.async_http(),
+            )
+        return entry._sdk_client
+
+    def get_openai(self, provider: str, base_url: Optional[str] = None) -> OpenAI:
+        entry = self._entry(provider, base_url)
+        if entry._sync_sdk_client is None:
+            entry._sync_sdk_client = OpenAI(
+                api_key=self._api_key(provider),
+                base_url=entry.base_url,
+                http_client=entry.sync_http(),
+            )
+        return entry._sync_sdk_client
+
+    def get_gemini(self, base_url: Optional[str] = None) -> genai.Client:
+        entry = self._entry("gemini", base_url)
+        if entry._sdk_client is None:
+            http_options = types.HttpOptions(
+                base_url=entry.base_url,
+                httpx_client=entry.sync_http(),
+                httpx_async_client=entry.async_http(),
+            )
+            entry._sdk_client = genai.Client(api_key=self._api_key("gemini"), http_options=http_options)
+            entry._sync_sdk_client = entry._sdk_client
+        return entry._sdk_client
+
+    def startup(self):
+        """Build clients for every provider with a configured API key."""
+        for provider, spec in model_catalog.providers.items():
+            if spec.api_key_env and not os.environ.get(spec.api_key_env):
+                logger.info(f"Skipping {provider} client: {spec.api_key_env} not set")
+                continue
+            if spec.protocol == "gemini":
+                self.get_gemini()
+            else:
+                self.get_async_openai(provider)
+
+    async def aclose(self):
+        for entry in self._clients.values():
+            try:
+                await entry.aclose()
+            except Exception as e:
+                logger.warning(f"Error closing {entry.provider} client: {e}")
+        self._clients.clear()
+
+    def stats(self) -> list:
+        return [entry.stats() for entry in self._clients.values()]
+
+
+registry = ClientRegistry()
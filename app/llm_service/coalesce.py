@@ -0,0 +1,168 @@
+import os
+import copy
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+LLM_COALESCE_ENABLED = os.environ.get("LLM_COALESCE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+class _Flight:
+    """Fan-out buffer for one upstream generation shared by every identical request."""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        # The upstream's `served` (which model answered), for every subscriber
+        self.served = None
+        # Set once the upstream stream is open (or failed to open)
+        self.opened = asyncio.Event()
+        # Replaced after every append; waiters hold on to the instance they saw
+        self.changed = asyncio.Event()
+
+    def notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+def _fresh(error: BaseException) -> BaseException:
+    """A copy of a flight's error for one subscriber, chained to the original."""
+    try:
+        clone = copy.copy(error)
+    except Exception:
+        return error
+    clone.__cause__ = error
+    return clone
+
+
+class _Subscription:
+    """One reader of a flight, counted from creation until it finishes or is closed."""
+
+    def __init__(self, coalescer: "StreamCoalescer", key: str, flight: _Flight):
+        self._coalescer = coalescer
+        self._key = key
+        self._flight = flight
+        self._index = 0
+        self._left = False
+        flight.subscribers += 1
+
+    def _leave(self):
+        if not self._left:
+            self._left = True
+            self._coalescer._leave(self._key, self._flight)
+
+    @property
+    def served(self):
+        return self._flight.served
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        flight = self._flight
+        try:
+            while True:
+                if self._index < len(flight.chunks):
+                    chunk = flight.chunks[self._index]
+                    self._index += 1
+                    return chunk
+                if flight.done:
+                    if flight.error is not None:
+                        # Each subscriber gets its own instance; one shared object would collect every reader's traceback
+                        raise _fresh(flight.error)
+                    raise StopAsyncIteration
+                await flight.changed.wait()
+        except BaseException:
+            self._leave()
+            raise
+
+    async def aclose(self):
+        self._leave()
+
+
+class StreamCoalescer:
+    """
+    Single-flight layer around call_llm.
+
+    The first request for a key starts the upstream stream in a background
+    task that appends every chunk to a shared buffer. Each subscriber reads
+    the buffer at its own pace, so it gets what was already emitted and then
+    live chunks, and a slow reader never holds back the producer or other
+    readers. The upstream stream is cancelled once every subscriber is gone.
+    """
+
+    def __init__(self, enabled: bool = LLM_COALESCE_ENABLED):
+        self.enabled = enabled
+        self.leaders = 0
+        self.followers = 0
+        self._flights: Dict[str, _Flight] = {}
+
+    async def stream(self, key: str, open_stream: Callable[[], Awaitable[AsyncIterator[str]]]) -> AsyncIterator[str]:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.create_task(self._produce(key, flight, open_stream))
+            self.leaders += 1
+        else:
+            self.followers += 1
+        # Counted before it is handed out, so a reader that leaves before its
+        # first read cannot cancel the flight under the others
+        subscription = _Subscription(self, key, flight)
+        try:
+            # Errors opening the upstream (a full bulkhead, an unknown model) reach
+            # the caller here, before it has started a response
+            await flight.opened.wait()
+        except BaseException:
+            await subscription.aclose()
+            raise
+        if flight.error is not None and not flight.chunks:
+            await subscription.aclose()
+            raise _fresh(flight.error)
+        return subscription
+
+    async def _produce(self, key: str, flight: _Flight, open_stream):
+        try:
+            llm_stream = await open_stream()
+            flight.served = getattr(llm_stream, "served", None)
+            flight.opened.set()
+            # Closed explicitly, so cancelling the flight also closes the provider stream
+            async with aclosing(llm_stream):
+                async for chunk in llm_stream:
+                    flight.chunks.append(chunk)
+                    flight.notify()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.opened.set()
+            flight.notify()
+
+    def _leave(self, key: str, flight: _Flight):
+        flight.subscribers -= 1
+        if flight.subscribers == 0 and not flight.done:
+            # Nobody is listening any more; stop paying for the generation
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "followers": self.followers,
+        }
+
+
+coalescer = StreamCoalescer()
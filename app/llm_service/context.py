@@ -0,0 +1,182 @@
+import os
+import logging
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple
+from .catalog import model_catalog
+
+logger = logging.getLogger(__name__)
+
+# "system_recent" keeps system messages plus the most recent turns,
+# "sliding_window" keeps only the most recent messages of any role
+CONTEXT_TRIM_STRATEGY = os.environ.get("CONTEXT_TRIM_STRATEGY", "system_recent")
+# Optional cap on prompt tokens below the model's window, to bound cost on long chats
+CONTEXT_MAX_PROMPT_TOKENS = int(os.environ.get("CONTEXT_MAX_PROMPT_TOKENS", "0")) or None
+# Headroom for estimation error, since the estimate is not the provider's tokenizer
+CONTEXT_SAFETY_MARGIN = float(os.environ.get("CONTEXT_SAFETY_MARGIN", "0.05"))
+# Room kept for the reply when history has to be trimmed; the rest of the window goes to the prompt
+CONTEXT_MIN_OUTPUT_TOKENS = int(os.environ.get("CONTEXT_MIN_OUTPUT_TOKENS", "1024"))
+
+# Chat formats add a few tokens of framing around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Average characters per token when no tokenizer is available
+CHARS_PER_TOKEN = {
+    "llama": 3.8,
+    "gemma": 4.0,
+    "gemini": 4.0,
+    "deepseek": 3.6,
+    "default": 3.5,
+}
+
+
+def model_family(model: str) -> str:
+    name = (model or "").lower()
+    for family in ("llama", "gemma", "gemini", "deepseek"):
+        if family in name:
+            return family
+    return "default"
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(family: str) -> Callable[[str], int]:
+    """
+    Token counter for a model family. Uses tiktoken when it is installed
+    (a close approximation for these BPE vocabularies), otherwise a
+    characters-per-token heuristic. Built once per family.
+    """
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception:
+        ratio = CHARS_PER_TOKEN.get(family, CHARS_PER_TOKEN["default"])
+        return lambda text: int(len(text) / ratio) + 1
+
+
+@lru_cache(maxsize=4096)
+def count_text_tokens(family: str, text: str) -> int:
+    # History is resent every turn, so most message texts are counted many times
+    return get_tokenizer(family)(text)
+
+
+def count_completion_tokens(model: str, text: str) -> int:
+    # Not cached: a generated reply is counted once, and caching would pin whole replies in memory
+    return get_tokenizer(model_family(model))(text) if text else 0
+
+
+def count_message_tokens(model: str, messages: list) -> int:
+    family = model_family(model)
+    return sum(
+        count_text_tokens(family, m.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+        for m in messages
+    )
+
+
+def _trim_sliding_window(messages: list, budget: int, counts: List[int]) -> list:
+    kept = []
+    used = 0
+    for message, tokens in zip(reversed(messages), reversed(counts)):
+        if kept and used + tokens > budget:
+            break
+        kept.append(message)
+        used += tokens
+    return list(reversed(kept))
+
+
+def _trim_system_recent(messages: list, budget: int, counts: List[int]) -> list:
+    system_indexes = [i for i, m in enumerate(messages) if m.get("role") == "system"]
+    used = sum(counts[i] for i in system_indexes)
+    kept = set(system_indexes)
+    for i in range(len(messages) - 1, -1, -1):
+        if i in kept:
+            continue
+        # Always keep the newest message, even if it alone exceeds the budget
+        if used + counts[i] > budget and len(kept) > len(system_indexes):
+            break
+        kept.add(i)
+        used += counts[i]
+    return [m for i, m in enumerate(messages) if i in kept]
+
+
+TRIM_STRATEGIES = {
+    "sliding_window": _trim_sliding_window,
+    "system_recent": _trim_system_recent,
+}
+
+
+class ContextManager:
+    """Fits a conversation into the model's context window before it is sent."""
+
+    def __init__(
+        self,
+        strategy: str = CONTEXT_TRIM_STRATEGY,
+        max_prompt_tokens: Optional[int] = CONTEXT_MAX_PROMPT_TOKENS,
+        min_output_tokens: int = CONTEXT_MIN_OUTPUT_TOKENS,
+    ):
+        if strategy not in TRIM_STRATEGIES:
+            raise ValueError(f"Unknown context trim strategy '{strategy}'")
+        self.strategy = strategy
+        self.max_prompt_tokens = max_prompt_tokens
+        self.min_output_tokens = max(1, min_output_tokens)
+        self.requests = 0
+        self.requests_trimmed = 0
+        self.outputs_clamped = 0
+        self.messages_dropped = 0
+        self.tokens_saved = 0
+
+    def limits(self, model: str) -> Optional[Tuple[int, int]]:
+        return model_catalog.limits(model)
+
+    def prepare(self, model: str, messages: list, max_tokens: Optional[int]) -> Tuple[list, Optional[int]]:
+        """
+        Returns (messages, max_tokens) fitted to the model's limits. The prompt
+        is budgeted first: history is trimmed only if it does not fit next to
+        a reply of min_output_tokens. max_tokens is then clamped to the model's
+        output limit and to what the prompt leaves of the window.
+        """
+        self.requests += 1
+        limits = self.limits(model)
+        if limits is None:
+            return messages, max_tokens
+        context_window, max_output = limits
+        if max_tokens is None or max_tokens > max_output:
+            max_tokens = max_output
+
+        usable = int(context_window * (1 - CONTEXT_SAFETY_MARGIN))
+        budget = usable - min(max_tokens, self.min_output_tokens)
+        if self.max_prompt_tokens:
+            budget = min(budget, self.max_prompt_tokens)
+
+        family = model_family(model)
+        counts = [count_text_tokens(family, m.get("content") or "") + MESSAGE_OVERHEAD_TOKENS for m in messages]
+        total = sum(counts)
+        prompt_tokens = total
+        if total > budget:
+            trimmed = TRIM_STRATEGIES[self.strategy](messages, budget, counts)
+            prompt_tokens = count_message_tokens(model, trimmed)
+            saved = total - prompt_tokens
+            self.requests_trimmed += 1
+            self.messages_dropped += len(messages) - len(trimmed)
+            self.tokens_saved += saved
+            logger.info(f"Trimmed context for {model}: dropped {len(messages) - len(trimmed)} messages (~{saved} tokens)")
+            messages = trimmed
+
+        # Prompt plus reply must fit the window; the newest message alone may still not
+        room = max(1, usable - prompt_tokens)
+        if max_tokens > room:
+            max_tokens = room
+            self.outputs_clamped += 1
+        return messages, max_tokens
+
+    def stats(self) -> dict:
+        return {
+            "strategy": self.strategy,
+            "requests": self.requests,
+            "requests_trimmed": self.requests_trimmed,
+            "outputs_clamped": self.outputs_clamped,
+            "messages_dropped": self.messages_dropped,
+            "tokens_saved": self.tokens_saved,
+        }
+
+
+context_manager = ContextManager()
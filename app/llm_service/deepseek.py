@@ -1,19 +1,14 @@
-import os
-from openai import OpenAI
-from typing import Generator, Union
+from .clients import registry, ResponseStream, delta_text
+from .catalog import model_catalog
+from typing import AsyncGenerator, Generator, Union
 
-MODEL_PROVIDERS = {
-    "deepseek-chat": "deepseek",
-    "deepseek-reasoner": "deepseek"
-}
-
-def call_deepseek(messages, max_tokens, model_id, stream=True) -> Union[str, Generator[str, None, None]]:
-    client = OpenAI(api_key=os.environ.get("DEEPSEEK_API_KEY"), base_url="https://api.deepseek.com")
+def call_deepseek(messages, max_tokens, model_id, stream=True, temperature=None) -> Union[str, Generator[str, None, None]]:
+    client = registry.get_openai("deepseek")
     kwargs = {
         "model": model_id,
         "messages": messages,
         "max_tokens": max_tokens if max_tokens is not None else 8192,
-        "temperature": 0.7,
+        "temperature": model_catalog.providers["deepseek"].temperature if temperature is None else temperature,
         "stream": stream
     }
     if not stream:
@@ -21,8 +16,28 @@ def call_deepseek(messages, max_tokens, model_id, stream=True) -> Union[str, Gen
 
     def _stream_generator():
         response = client.chat.completions.create(**kwargs)
-        for chunk in response:
-            delta = chunk.choices[0].delta
-            if hasattr(delta, "content") and delta.content:
-                yield delta.content
-    return _stream_generator()
\ No newline at end of file
+        try:
+            for chunk in response:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if hasattr(delta, "content") and delta.content:
+                    yield delta.content
+        finally:
+            response.close()
+    return _stream_generator()
+
+async def call_deepseek_async(messages, max_tokens, model_id, stream=True, temperature=None) -> Union[str, AsyncGenerator[str, None]]:
+    client = registry.get_async_openai("deepseek")
+    kwargs = {
+        "model": model_id,
+        "messages": messages,
+        "max_tokens": max_tokens if max_tokens is not None else 8192,
+        "temperature": model_catalog.providers["deepseek"].temperature if temperature is None else temperature,
+        "stream": stream
+    }
+    if not stream:
+        return (await client.chat.completions.create(**kwargs)).choices[0].message.content
+
+    response = await client.chat.completions.create(**kwargs)
+    return ResponseStream(response, delta_text, response.close)
@@ -1,44 +1,86 @@
-import os
-from google import genai
 from google.genai import types
+from .clients import registry, ResponseStream
+from .catalog import model_catalog
 
-MODEL_PROVIDERS = {
-    "gemini-2.5-flash-preview-04-17": "gemini",
-    "gemini-2.5-pro-exp-03-25": "gemini"
-    # Add more models/providers as needed
+# Gemini only knows "user" and "model" turns; system prompts go in the config
+ROLE_MAP = {
+    "user": "user",
+    "assistant": "model",
+    "model": "model",
 }
 
-def call_gemini(messages, max_tokens, model_id, stream=False):
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        raise RuntimeError("GEMINI_API_KEY environment variable not set")
+def build_request(messages, max_tokens, temperature=None):
+    """
+    Convert OpenAI-style chat messages into Gemini contents and config.
+    System messages become the system instruction, consecutive turns from
+    the same role are merged because Gemini expects them to alternate.
+    """
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
 
-    if isinstance(messages, list) and messages and isinstance(messages[0], dict):
-        messages = [m["content"] for m in messages]
+    system_parts = []
+    contents = []
+    for message in messages:
+        if not isinstance(message, dict):
+            message = {"role": "user", "content": str(message)}
+        role = message.get("role", "user")
+        text = message.get("content") or ""
+        if role == "system":
+            system_parts.append(text)
+            continue
+        role = ROLE_MAP.get(role, "user")
+        if contents and contents[-1].role == role:
+            contents[-1].parts.append(types.Part(text=text))
+        else:
+            contents.append(types.Content(role=role, parts=[types.Part(text=text)]))
 
-    client = genai.Client(api_key=api_key)
-    response = client.models.generate_content(
-        model=model_id,
-        contents=messages,
-        config=types.GenerateContentConfig(
-            temperature=0.5,
-            max_output_tokens=max_tokens if max_tokens is not None else 8192
-        ),
+    config = types.GenerateContentConfig(
+        temperature=model_catalog.providers["gemini"].temperature if temperature is None else temperature,
+        max_output_tokens=max_tokens if max_tokens is not None else 8192,
+        system_instruction="\n\n".join(system_parts) if system_parts else None,
     )
+    return contents, config
+
+def call_gemini(messages, max_tokens, model_id, stream=False, temperature=None):
+    contents, config = build_request(messages, max_tokens, temperature)
+    client = registry.get_gemini()
     if not stream:
+        response = client.models.generate_content(
+            model=model_id,
+            contents=contents,
+            config=config,
+        )
         return response.text
 
     def _stream_generator():
         response = client.models.generate_content_stream(
             model=model_id,
-            contents=messages,
-            config=types.GenerateContentConfig(
-                temperature=0.5,
-                max_output_tokens=max_tokens if max_tokens is not None else 8192
-            ),
+            contents=contents,
+            config=config,
         )
-        for chunk in response:
-            if hasattr(chunk, "text") and chunk.text:
-                yield chunk.text
-                
+        try:
+            for chunk in response:
+                if hasattr(chunk, "text") and chunk.text:
+                    yield chunk.text
+        finally:
+            response.close()
+
     return _stream_generator()
+
+async def call_gemini_async(messages, max_tokens, model_id, stream=False, temperature=None):
+    contents, config = build_request(messages, max_tokens, temperature)
+    client = registry.get_gemini()
+    if not stream:
+        response = await client.aio.models.generate_content(
+            model=model_id,
+            contents=contents,
+            config=config,
+        )
+        return response.text
+
+    response = await client.aio.models.generate_content_stream(
+        model=model_id,
+        contents=contents,
+        config=config,
+    )
+    return ResponseStream(response, lambda chunk: getattr(chunk, "text", None), response.aclose)
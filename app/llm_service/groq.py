@@ -1,34 +1,24 @@
-import os
-from openai import OpenAI
-from typing import Generator, Union
-
-MODEL_PROVIDERS = {
-    "llama-3.3-70b-versatile": "groq",
-    "llama-3.1-8b-instant": "groq",
-    "gemma2-9b-it": "groq",
-    "meta-llama/llama-4-maverick-17b-128e-instruct": "groq",
-    # Add more models/providers as needed
-}
+from .clients import registry, ResponseStream, delta_text
+from .catalog import model_catalog
+from typing import AsyncGenerator, Generator, Optional, Union
 
 def call_groq(
     messages: list,
     max_tokens: int,
     model_id: str,
-    stream: bool = False
+    stream: bool = False,
+    temperature: Optional[float] = None
 ) -> Union[str, Generator[str, None, None]]:
     """
     Call the Groq-backed OpenAI API for chat completions.
     Supports streaming according to OpenAI API docs.
     """
-    client = OpenAI(
-        api_key=os.environ["GROQ_API_KEY"],
-        base_url="https://api.groq.com/openai/v1"
-    )
+    client = registry.get_openai("groq")
     kwargs = {
         "model": model_id,
         "messages": messages,
         "max_tokens": max_tokens or 8192,
-        "temperature": 0.5,
+        "temperature": model_catalog.providers["groq"].temperature if temperature is None else temperature,
         "stream": stream
     }
     if not stream:
@@ -37,8 +27,40 @@ def call_groq(
 
     def _stream_generator():
         response = client.chat.completions.create(**kwargs)
-        for chunk in response:
-            delta = chunk.choices[0].delta
-            if hasattr(delta, "content") and delta.content:
-                yield delta.content
+        try:
+            for chunk in response:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if hasattr(delta, "content") and delta.content:
+                    yield delta.content
+        finally:
+            response.close()
     return _stream_generator()
+
+async def call_groq_async(
+    messages: list,
+    max_tokens: int,
+    model_id: str,
+    stream: bool = False,
+    temperature: Optional[float] = None
+) -> Union[str, AsyncGenerator[str, None]]:
+    """
+    Async variant of call_groq built on AsyncOpenAI.
+    The upstream request is started before returning, so connection and
+    auth errors surface here rather than halfway through a response.
+    """
+    client = registry.get_async_openai("groq")
+    kwargs = {
+        "model": model_id,
+        "messages": messages,
+        "max_tokens": max_tokens or 8192,
+        "temperature": model_catalog.providers["groq"].temperature if temperature is None else temperature,
+        "stream": stream
+    }
+    if not stream:
+        response = await client.chat.completions.create(**kwargs)
+        return response.choices[0].message.content
+
+    response = await client.chat.completions.create(**kwargs)
+    return ResponseStream(response, delta_text, response.close)
@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional
+from .router import call_llm, provider_for
+from .latency import first_token_latency
+from .catalog import model_catalog
+from .context import context_manager
+
+logger = logging.getLogger(__name__)
+
+LLM_HEDGING_ENABLED = os.environ.get("LLM_HEDGING_ENABLED", "false").lower() in ("1", "true", "yes")
+# Deadline = p95 first-token latency of the primary's provider * multiplier, clamped to [min, max]
+HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", "95"))
+HEDGE_MULTIPLIER = float(os.environ.get("LLM_HEDGE_MULTIPLIER", "1.0"))
+HEDGE_MIN_DEADLINE = float(os.environ.get("LLM_HEDGE_MIN_DEADLINE", "0.5"))
+HEDGE_MAX_DEADLINE = float(os.environ.get("LLM_HEDGE_MAX_DEADLINE", "10"))
+# Used until a provider has enough samples for a meaningful percentile
+HEDGE_DEFAULT_DEADLINE = float(os.environ.get("LLM_HEDGE_DEFAULT_DEADLINE", "3"))
+HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+# Fallback models on other providers, tried in order; defaults come from the model catalog
+FALLBACK_MODELS: Dict[str, List[str]] = (
+    json.loads(os.environ["LLM_FALLBACK_MODELS"]) if os.environ.get("LLM_FALLBACK_MODELS")
+    else model_catalog.fallbacks()
+)
+
+_EMPTY = object()
+
+
+class Served(NamedTuple):
+    """The model that answered, with the messages and max_tokens as prepared for it."""
+    model: str
+    messages: list
+    max_tokens: Optional[int]
+
+
+class ServedStream:
+    """
+    Response chunks from the model in `served`. `first` is a chunk already
+    read from `stream` while racing, handed out before the rest.
+    """
+
+    def __init__(self, served: Served, stream: AsyncIterator[str], first=None):
+        self.served = served
+        self._stream = stream
+        self._first = first
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        first, self._first = self._first, None
+        if first is _EMPTY:
+            await self.aclose()
+            raise StopAsyncIteration
+        if first is not None:
+            return first
+        return await self._stream.__anext__()
+
+    async def aclose(self):
+        self._first = None
+        await self._stream.aclose()
+
+
+class HedgingPolicy:
+    """
+    Bounds tail latency by racing a fallback model against a slow primary.
+
+    The primary request starts immediately. If it has not produced a first
+    chunk by the deadline (derived from the provider's observed first-token
+    p95), the next fallback starts too and whichever emits first wins; the
+    others are cancelled and their upstream streams closed. A request that
+    fails before its first chunk triggers the next fallback right away.
+    """
+
+    def __init__(self, enabled: bool = LLM_HEDGING_ENABLED, fallbacks: Optional[Dict[str, List[str]]] = None):
+        self.enabled = enabled
+        self.fallbacks = FALLBACK_MODELS if fallbacks is None else fallbacks
+        self.hedges_started = 0
+        self.failovers = 0
+        self.wins: Dict[str, int] = {}
+
+    def deadline(self, model: str) -> float:
+        provider = provider_for(model)
+        if provider is None or first_token_latency.count(provider) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DEADLINE
+        p95 = first_token_latency.percentile(provider, HEDGE_PERCENTILE)
+        return min(HEDGE_MAX_DEADLINE, max(HEDGE_MIN_DEADLINE, p95 * HEDGE_MULTIPLIER))
+
+    async def call(self, messages: list, max_tokens: Optional[int], model: str, temperature: Optional[float] = None) -> ServedStream:
+        """
+        Takes the conversation and max_tokens as requested; each model tried
+        gets them fitted to its own limits by the context manager. When
+        hedging, returns once a candidate has produced its first chunk.
+        """
+        candidates = [model] + [m for m in self.fallbacks.get(model, []) if provider_for(m) is not None]
+        if not self.enabled or len(candidates) == 1:
+            served = Served(model, *context_manager.prepare(model, messages, max_tokens))
+            return ServedStream(served, await call_llm(served.messages, served.max_tokens, model, temperature))
+        return await self._race(messages, max_tokens, candidates, temperature)
+
+    async def _first_chunk(self, messages, max_tokens, model, temperature):
+        # A fallback may have a smaller window or output limit than the primary
+        served = Served(model, *context_manager.prepare(model, messages, max_tokens))
+        started = time.monotonic()
+        llm_stream = None
+        try:
+            llm_stream = await call_llm(served.messages, served.max_tokens, model, temperature)
+            first = await llm_stream.__anext__()
+        except StopAsyncIteration:
+            first = _EMPTY
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                self._record_cancelled(model, time.monotonic() - started)
+            if llm_stream is not None:
+                await llm_stream.aclose()
+            raise
+        return ServedStream(served, llm_stream, first)
+
+    def _record_cancelled(self, model: str, elapsed: float):
+        # A loser's first token was at least this slow. Without the sample only
+        # winners are recorded, the p95 drifts low and ever more requests get hedged
+        provider = provider_for(model)
+        if provider is not None:
+            first_token_latency.record(provider, elapsed)
+
+    async def _race(self, messages, max_tokens, candidates: List[str], temperature: Optional[float] = None) -> ServedStream:
+        pending = set()
+        next_index = 0
+        winner = None
+        last_error = None
+        deadline_at = None
+
+        def start_next():
+            nonlocal next_index, deadline_at
+            candidate = candidates[next_index]
+            next_index += 1
+            pending.add(asyncio.create_task(self._first_chunk(messages, max_tokens, candidate, temperature)))
+            deadline_at = time.monotonic() + self.deadline(candidate)
+
+        try:
+            start_next()
+            while winner is None:
+                timeout = None
+                if next_index < len(candidates):
+                    timeout = max(0.0, deadline_at - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedges_started += 1
+                    logger.info(f"Hedging with {candidates[next_index]} after first-token deadline")
+                    start_next()
+                    continue
+                for task in done:
+                    pending.discard(task)
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        logger.warning(f"LLM request failed before first token: {last_error}")
+                    elif winner is None:
+                        winner = task.result()
+                    else:
+                        # Two finished together; close the loser's stream
+                        await task.result().aclose()
+                if winner is None and not pending:
+                    if next_index >= len(candidates):
+                        raise last_error
+                    self.failovers += 1
+                    start_next()
+        finally:
+            for task in pending:
+                task.cancel()
+            # A loser may have opened its stream just before being cancelled
+            for result in await asyncio.gather(*pending, return_exceptions=True):
+                if isinstance(result, ServedStream):
+                    await result.aclose()
+
+        model = winner.served.model
+        self.wins[model] = self.wins.get(model, 0) + 1
+        return winner
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "hedges_started": self.hedges_started,
+            "failovers": self.failovers,
+            "wins": dict(self.wins),
+            "first_token_latency": first_token_latency.stats(),
+        }
+
+
+hedging_policy = HedgingPolicy()
@@ -0,0 +1,43 @@
+import os
+from collections import deque
+from typing import Deque, Dict, Optional
+
+LATENCY_WINDOW = int(os.environ.get("LLM_LATENCY_WINDOW", "200"))
+
+
+class LatencyTracker:
+    """Rolling window of first-token latencies (seconds) per provider."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, provider: str, seconds: float):
+        samples = self._samples.get(provider)
+        if samples is None:
+            samples = self._samples[provider] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentile(self, provider: str, pct: float) -> Optional[float]:
+        samples = self._samples.get(provider)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def count(self, provider: str) -> int:
+        return len(self._samples.get(provider, ()))
+
+    def stats(self) -> dict:
+        return {
+            provider: {
+                "samples": len(samples),
+                "p50": self.percentile(provider, 50),
+                "p95": self.percentile(provider, 95),
+            }
+            for provider, samples in self._samples.items()
+        }
+
+
+first_token_latency = LatencyTracker()
@@ -0,0 +1,57 @@
+from .clients import registry, ResponseStream, delta_text
+from .catalog import model_catalog
+from typing import AsyncGenerator, Generator, Optional, Union
+
+# Any provider in the model catalog with protocol "openai" and no dedicated
+# module is served by these handlers, e.g. a local vLLM or Ollama server.
+
+def _request_kwargs(provider: str, messages: list, max_tokens: int, model_id: str, stream: bool, temperature: Optional[float]) -> dict:
+    return {
+        "model": model_id,
+        "messages": messages,
+        "max_tokens": max_tokens or model_catalog.get(model_id).max_output,
+        "temperature": model_catalog.providers[provider].temperature if temperature is None else temperature,
+        "stream": stream
+    }
+
+def call_openai_compatible(
+    provider: str,
+    messages: list,
+    max_tokens: int,
+    model_id: str,
+    stream: bool = False,
+    temperature: Optional[float] = None
+) -> Union[str, Generator[str, None, None]]:
+    client = registry.get_openai(provider)
+    kwargs = _request_kwargs(provider, messages, max_tokens, model_id, stream, temperature)
+    if not stream:
+        return client.chat.completions.create(**kwargs).choices[0].message.content
+
+    def _stream_generator():
+        response = client.chat.completions.create(**kwargs)
+        try:
+            for chunk in response:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if hasattr(delta, "content") and delta.content:
+                    yield delta.content
+        finally:
+            response.close()
+    return _stream_generator()
+
+async def call_openai_compatible_async(
+    provider: str,
+    messages: list,
+    max_tokens: int,
+    model_id: str,
+    stream: bool = False,
+    temperature: Optional[float] = None
+) -> Union[str, AsyncGenerator[str, None]]:
+    client = registry.get_async_openai(provider)
+    kwargs = _request_kwargs(provider, messages, max_tokens, model_id, stream, temperature)
+    if not stream:
+        return (await client.chat.completions.create(**kwargs)).choices[0].message.content
+
+    response = await client.chat.completions.create(**kwargs)
+    return ResponseStream(response, delta_text, response.close)
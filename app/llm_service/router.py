@@ -1,26 +1,144 @@
-from fastapi.concurrency import run_in_threadpool
-from .groq import call_groq, MODEL_PROVIDERS as GROQ_MODELS
-from .gemini import call_gemini, MODEL_PROVIDERS as GEMINI_MODELS
-from .deepseek import call_deepseek, MODEL_PROVIDERS as DEEPSEEK_MODELS
+from anyio import CapacityLimiter, to_thread
+from .groq import call_groq, call_groq_async
+from .gemini import call_gemini, call_gemini_async
+from .deepseek import call_deepseek, call_deepseek_async
+from .openai_compat import call_openai_compatible, call_openai_compatible_async
+from .catalog import model_catalog
+from .latency import first_token_latency
+from .bulkhead import bulkheads, PermitStream
+from app.metrics import track_llm_stream, record_llm_error
+from functools import partial
+from typing import AsyncIterator, Callable, Dict, Iterator, NamedTuple, Optional
 import asyncio
+import threading
+import time
 
-PROVIDERS = [
-    (GROQ_MODELS, call_groq),
-    (GEMINI_MODELS, call_gemini),
-    (DEEPSEEK_MODELS, call_deepseek)
-    # Add more providers here as (MODEL_DICT, HANDLER)
-]
+# Providers with a dedicated module, as name -> (SYNC_HANDLER, ASYNC_HANDLER).
+# ASYNC_HANDLER may be None; the sync handler then runs in the threadpool.
+PROVIDER_HANDLERS = {
+    "groq": (call_groq, call_groq_async),
+    "gemini": (call_gemini, call_gemini_async),
+    "deepseek": (call_deepseek, call_deepseek_async),
+}
 
-DEFAULT_MODEL = "gemini-2.5-flash-preview-04-17"
+class Route(NamedTuple):
+    provider: str
+    handler: Callable
+    async_handler: Optional[Callable]
+    streaming: bool
 
-async def call_llm(messages: list, max_tokens: int, model: str):
+def _handlers(provider: str):
+    if provider in PROVIDER_HANDLERS:
+        return PROVIDER_HANDLERS[provider]
+    if model_catalog.providers[provider].protocol == "openai":
+        return partial(call_openai_compatible, provider), partial(call_openai_compatible_async, provider)
+    raise ValueError(f"No handler for provider '{provider}'")
+
+# One dict hit per request instead of scanning providers
+ROUTES: Dict[str, Route] = {
+    spec.id: Route(spec.provider, *_handlers(spec.provider), spec.streaming)
+    for spec in model_catalog.models.values()
+}
+
+DEFAULT_MODEL = model_catalog.default_model
+
+def provider_for(model: str) -> Optional[str]:
+    return model_catalog.provider_for(model)
+
+async def _single_chunk(text: str) -> AsyncIterator[str]:
+    if text:
+        yield text
+
+_DONE = object()
+
+class _SyncStream:
+    """
+    Like iterate_in_threadpool, but closes the sync generator (and with it
+    the provider's HTTP response) when the consumer stops early, even before
+    the first read. The lock makes the close wait for a read still running
+    in a worker thread, since a generator cannot be closed while it is
+    executing.
+    """
+
+    def __init__(self, sync_stream: Iterator[str], limiter: Optional[CapacityLimiter] = None):
+        self._sync_stream = sync_stream
+        self._limiter = limiter
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _step(self):
+        with self._lock:
+            return next(self._sync_stream, _DONE)
+
+    def _close(self):
+        with self._lock:
+            self._sync_stream.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        if self._closed:
+            raise StopAsyncIteration
+        try:
+            chunk = await to_thread.run_sync(self._step, limiter=self._limiter)
+        except BaseException:
+            await self.aclose()
+            raise
+        if chunk is _DONE:
+            await self.aclose()
+            raise StopAsyncIteration
+        return chunk
+
+    async def aclose(self):
+        if self._closed:
+            return
+        self._closed = True
+        if hasattr(self._sync_stream, "close"):
+            await to_thread.run_sync(self._close, limiter=self._limiter)
+
+async def call_llm(messages: list, max_tokens: int, model: str, temperature: Optional[float] = None) -> AsyncIterator[str]:
     """
-    Calls the LLM with the given messages and model.
-    Returns: LLM response (str or generator)
+    Calls the LLM with the given messages and model. A temperature of None
+    uses the provider's default.
+    Returns: async iterator over the streamed response text
     """
     if not model:
         model = DEFAULT_MODEL
-    for model_dict, handler in PROVIDERS:
-        if model in model_dict:
-            return await run_in_threadpool(handler, messages, max_tokens, model, True)
-    raise ValueError(f"Model '{model}' is not supported.")
+    route = ROUTES.get(model)
+    if route is None:
+        raise ValueError(f"Model '{model}' is not supported.")
+    provider = route.provider
+    # A slot in the provider's bulkhead is held until the stream ends or is closed
+    bulkhead = bulkheads.for_model(model, provider)
+    limiter = bulkhead.limiter if bulkhead is not None else None
+    if bulkhead is not None:
+        await bulkhead.acquire()
+    started = time.monotonic()
+    try:
+        if not route.streaming:
+            # The whole reply arrives at once; hand it on as a single chunk
+            if route.async_handler is not None:
+                text = await route.async_handler(messages, max_tokens, model, False, temperature=temperature)
+            else:
+                text = await to_thread.run_sync(partial(route.handler, messages, max_tokens, model, False, temperature=temperature), limiter=limiter)
+            llm_stream = _single_chunk(text)
+        elif route.async_handler is not None:
+            llm_stream = await route.async_handler(messages, max_tokens, model, True, temperature=temperature)
+        else:
+            # Fallback: every blocking read of the sync generator happens in a worker
+            # thread, on the provider's own limiter rather than the shared threadpool
+            sync_stream = await to_thread.run_sync(partial(route.handler, messages, max_tokens, model, True, temperature=temperature), limiter=limiter)
+            llm_stream = _SyncStream(sync_stream, limiter)
+    except BaseException as e:
+        if bulkhead is not None:
+            bulkhead.release()
+        if isinstance(e, Exception):
+            record_llm_error(provider, model, e)
+        raise
+    tracked = track_llm_stream(
+        provider, model, started, llm_stream,
+        on_first_chunk=partial(first_token_latency.record, provider),
+    )
+    # Also closes the provider stream itself, which the tracking generator cannot do before its first read
+    return PermitStream(tracked, bulkhead, upstream=llm_stream)
@@ -0,0 +1,73 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Optional
+from app.metrics import EVENT_LOOP_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_INTERVAL_MS = float(os.environ.get("LOOP_LAG_INTERVAL_MS", "100"))
+LOOP_LAG_SAMPLES = int(os.environ.get("LOOP_LAG_SAMPLES", "600"))
+
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag: a background task sleeps for a fixed interval
+    and records how late it wakes up. Anything that blocks the loop (sync
+    I/O, CPU-heavy work) shows up directly as lag for every stream on the
+    worker.
+    """
+
+    def __init__(self, interval_ms: float = LOOP_LAG_INTERVAL_MS, max_samples: int = LOOP_LAG_SAMPLES):
+        self.interval = interval_ms / 1000
+        self.samples = deque(maxlen=max_samples)
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        # A task left over from another event loop cannot be awaited here
+        if task.get_loop() is asyncio.get_running_loop():
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            self.samples.append(lag)
+            EVENT_LOOP_LAG_SECONDS.observe(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+
+    def percentile(self, pct: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def stats(self) -> dict:
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": len(self.samples),
+            "p50_ms": round(self.percentile(50) * 1000, 2),
+            "p95_ms": round(self.percentile(95) * 1000, 2),
+            "p99_ms": round(self.percentile(99) * 1000, 2),
+            "max_ms": round(self.max_lag * 1000, 2),
+        }
+
+
+loop_lag_monitor = LoopLagMonitor()
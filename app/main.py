@@ -1,24 +1,45 @@
 from fastapi import FastAPI, HTTPException, Depends, Request, Response, Form, Cookie, APIRouter, status, Body
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, StreamingResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware  # Changed from fastapi.middleware.base
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from urllib.parse import quote
+from contextlib import aclosing
 from pydantic import BaseModel
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, NamedTuple
 from dotenv import load_dotenv
-from app.llm_service.router import call_llm
-from app.llm_service.groq import MODEL_PROVIDERS as GROQ_MODELS
-from app.llm_service.gemini import MODEL_PROVIDERS as GEMINI_MODELS
-from app.llm_service.deepseek import MODEL_PROVIDERS as DEEPSEEK_MODELS
-from app.db.database import engine, get_db
-from app.db import models, crud, init_db
+from app.llm_service.router import provider_for
+from app.llm_service.catalog import model_catalog
+from app.llm_service.clients import registry as llm_clients
+from app.llm_service.cache import response_cache, make_key as make_cache_key
+from app.llm_service.coalesce import coalescer
+from app.llm_service.context import context_manager
+from app.llm_service.hedging import hedging_policy, Served, ServedStream
+from app.llm_service.bulkhead import bulkheads, BulkheadFull
+from app.llm_service.context import count_completion_tokens, count_message_tokens
+from app.quota import quota_manager, QuotaExceeded
+from app.sse import sse_streamer
+from app.loop_monitor import loop_lag_monitor
+from app.metrics import render_latest as render_metrics, mark_process_dead, chat_children, llm_children
+from app import auth_cache
+from app.passwords import password_hasher, PasswordHasherBusy
+from app.middleware import AuthMiddleware, AUTH_SCOPE_KEY
+from app.signing import load_keyring
+from app.lifecycle import lifecycle
+from app.usage import usage_recorder, usage_report
+from app.streaming import CancellableStreamingResponse, stream_cancellations
+from app.batch import batch_runner
+from app.db.database import get_db, get_async_db, AsyncSessionLocal, pool_stats as db_pool_stats
+from app.db import models, async_crud, init_db
 from app.schemas import UserCreate, User, UserList, UserApproval, UserAdmin, UserActivation
-from sqlalchemy.orm import Session
-from jose import JWTError, jwt
+from app.schemas import UserBulkAction, UserBulkFilter, UserBulkResult
+from app.schemas import ConversationCreate, ConversationList, MessageList, Conversation, QuotaLimits
+from app.schemas import ChatBatchJob, ChatBatchRequest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from jose import JWTError
 from datetime import datetime, timedelta
 import httpx
 import os
@@ -39,11 +60,24 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# JWT Configuration
-SECRET_KEY = os.environ.get("SECRET_KEY", secrets.token_hex(32))
-ALGORITHM = "HS256"
+# JWT Configuration: every worker must share the signing keys (see app/signing.py);
+# uvicorn reads WEB_CONCURRENCY as its default worker count
+keyring = load_keyring(required=int(os.environ.get("WEB_CONCURRENCY") or "1") > 1)
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+# Schema and admin user setup; `python -m app.serve` does it once before starting workers
+DB_INIT_ON_STARTUP = os.environ.get("DB_INIT_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+# Readiness fails if the database does not answer within this many seconds
+READINESS_DB_TIMEOUT = float(os.environ.get("READINESS_DB_TIMEOUT", "2"))
+
+# Bearer token Prometheus must send to scrape /metrics; unset leaves it open
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# Rows per page on /admin/users
+ADMIN_USERS_PAGE_SIZE = int(os.environ.get("ADMIN_USERS_PAGE_SIZE", "50"))
+# Longest period the usage report covers
+USAGE_REPORT_MAX_DAYS = 366
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Chatbot API",
@@ -67,40 +101,17 @@ templates = Jinja2Templates(directory="app/templates")
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# Authentication middleware
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Allow access to public paths without authentication
-        public_paths = ['/', '/login', '/register', '/token', '/static', '/health']
-        path = request.url.path
-        
-        # Check if the path is public or starts with one of the public paths
-        is_public = any(path == p or path.startswith(f"{p}/") for p in public_paths)
-        
-        if is_public:
-            response = await call_next(request)
-            return response
-        
-        # Check for authentication
-        token = request.cookies.get("access_token")
-        if not token:
-            # For API requests that expect JSON
-            if request.headers.get("accept") == "application/json":
-                return JSONResponse(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    content={"detail": "Not authenticated"}
-                )
-            # For regular browser requests, redirect to login
-            return RedirectResponse(
-                url=f"/login?redirect={quote(str(request.url.path))}",
-                status_code=status.HTTP_302_FOUND
-            )
-        
-        response = await call_next(request)
-        return response
+def _decode_access_token(token: str) -> dict:
+    return keyring.decode(token)
 
-# Add the auth middleware
-app.add_middleware(AuthMiddleware)
+# Authentication middleware; pages and APIs outside these paths need a login cookie
+PUBLIC_PATHS = ['/', '/login', '/register', '/token', '/static', '/health', '/metrics']
+app.add_middleware(
+    AuthMiddleware,
+    public_paths=PUBLIC_PATHS,
+    decode_token=_decode_access_token,
+    anonymous_paths=['/static', '/metrics', '/health'],
+)
 
 # Token functions
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -110,23 +121,33 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    return keyring.sign(to_encode)
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def _load_user(username: str):
+    """Returns a cached snapshot of the user, hitting the database only on a miss."""
+    user = auth_cache.get_user(username)
+    if user is None:
+        async with AsyncSessionLocal() as db:
+            db_user = await async_crud.get_user(db, username=username)
+        if db_user is None:
+            return None
+        user = auth_cache.put_user(db_user)
+    return user
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = auth_cache.decode_token(token, _decode_access_token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = crud.get_user(db, username=username)
+    user = await _load_user(username)
     if user is None:
         raise credentials_exception
     if not user.is_active:
@@ -149,25 +170,31 @@ async def get_current_admin_user(current_user: models.User = Depends(get_current
 # Authentication dependency for routes
 async def get_current_user_from_cookie(
     request: Request,
-    response: Response,
-    db: Session = Depends(get_db)
+    response: Response
 ) -> Optional[models.User]:
-    token = request.cookies.get("access_token")
-    if not token:
-        return None
-    
-    if token.startswith("Bearer "):
-        token = token[7:]
-    
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    if AUTH_SCOPE_KEY in request.scope:
+        # Already verified by AuthMiddleware
+        payload = request.scope[AUTH_SCOPE_KEY]
+        if payload is None:
             return None
-    except JWTError:
+    else:
+        token = request.cookies.get("access_token")
+        if not token:
+            return None
+        
+        if token.startswith("Bearer "):
+            token = token[7:]
+        
+        try:
+            payload = auth_cache.decode_token(token, _decode_access_token)
+        except JWTError:
+            return None
+    
+    username: str = payload.get("sub")
+    if username is None:
         return None
     
-    user = crud.get_user(db, username=username)
+    user = await _load_user(username)
     if user is None or not user.is_active:
         return None
     
@@ -175,8 +202,8 @@ async def get_current_user_from_cookie(
 
 # API Authentication endpoints
 @app.post("/token")
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.authenticate_user(db, form_data.username, form_data.password)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await async_crud.authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -190,21 +217,106 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
-# Initialize database on startup
+# Initialize database on startup (single-process runs; app.serve does it up front)
 @app.on_event("startup")
 def startup_db_client():
-    # Create database tables
-    models.Base.metadata.create_all(bind=engine)
-    
-    # Initialize admin user
+    if not DB_INIT_ON_STARTUP:
+        return
+    # Create database tables and indexes, then the admin user
     db = next(get_db())
-    init_db.init_db(db)
+    try:
+        init_db.init_db(db)
+    finally:
+        db.close()
+
+# Provider clients are long-lived so connections stay warm between chat turns
+@app.on_event("startup")
+def startup_llm_clients():
+    llm_clients.startup()
+
+@app.on_event("shutdown")
+async def shutdown_llm_clients():
+    await llm_clients.aclose()
+
+@app.on_event("shutdown")
+def shutdown_password_hasher():
+    password_hasher.shutdown()
+
+@app.on_event("startup")
+async def startup_loop_monitor():
+    loop_lag_monitor.start()
+
+@app.on_event("shutdown")
+async def shutdown_loop_monitor():
+    await loop_lag_monitor.stop()
 
-# Health check endpoint
+@app.on_event("startup")
+async def startup_usage_recorder():
+    usage_recorder.start()
+
+# Runs after uvicorn has drained the open requests, so their usage is written too
+@app.on_event("shutdown")
+async def shutdown_usage_recorder():
+    await usage_recorder.stop()
+
+# Registered last, so the worker only reports ready once everything above has started
+@app.on_event("startup")
+def startup_lifecycle():
+    lifecycle.install_signal_handlers()
+    lifecycle.mark_ready()
+
+@app.on_event("shutdown")
+def shutdown_lifecycle():
+    lifecycle.shutdown()
+    mark_process_dead()
+
+# bcrypt runs on a bounded pool; when it is saturated, shed load rather than queue
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server is busy, please retry shortly"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+# A provider's bulkhead is full: reject this request, the other providers are unaffected
+@app.exception_handler(BulkheadFull)
+async def bulkhead_full_handler(request: Request, exc: BulkheadFull):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after))},
+    )
+
+# Health check endpoints. Liveness only says the process is serving, so a
+# draining worker is not restarted; readiness tells the load balancer
+# whether to send it new requests.
 @app.get("/health")
+@app.get("/health/live")
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/ready")
+async def readiness_check():
+    if lifecycle.state != "ready":
+        return JSONResponse(status_code=503, content={"status": lifecycle.state})
+    try:
+        async with AsyncSessionLocal() as db:
+            await asyncio.wait_for(db.execute(text("SELECT 1")), READINESS_DB_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Readiness check failed: {e!r}")
+        return JSONResponse(status_code=503, content={"status": "unavailable", "detail": "database"})
+    return {"status": "ready"}
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    if METRICS_TOKEN and not secrets.compare_digest(
+        request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}"
+    ):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 # Page endpoints
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request, current_user: Optional[models.User] = Depends(get_current_user_from_cookie)):
@@ -227,9 +339,9 @@ async def login(
     username: str = Form(...),
     password: str = Form(...),
     redirect: str = Form("/"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = crud.authenticate_user(db, username, password)
+    user = await async_crud.authenticate_user(db, username, password)
     if not user:
         return RedirectResponse(
             url=f"/login?error=Invalid%20username%20or%20password&redirect={quote(redirect)}",
@@ -275,31 +387,115 @@ async def logout(response: Response):
 # User management endpoints (admin only)
 @app.get("/api/admin/users", response_model=UserList)
 async def read_users_api(
-    skip: int = 0, 
-    limit: int = 100, 
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    status: Optional[str] = None,
+    q: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_admin_user)
+):
+    try:
+        users, next_cursor = await async_crud.list_users(
+            db, limit=max(1, min(limit, 200)), cursor=cursor, status=status, search=q
+        )
+        total, is_estimate = await async_crud.count_users(db, status=status, search=q)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"users": users, "next_cursor": next_cursor, "total": total, "total_is_estimate": is_estimate}
+
+@app.get("/api/admin/stats")
+async def read_stats_api(current_user: models.User = Depends(get_current_admin_user)):
+    return {
+        "llm_clients": llm_clients.stats(),
+        "response_cache": response_cache.stats(),
+        "coalescer": coalescer.stats(),
+        "context": context_manager.stats(),
+        "hedging": hedging_policy.stats(),
+        "bulkheads": bulkheads.stats(),
+        "quota": quota_manager.stats(),
+        "db_pool": db_pool_stats.snapshot(),
+        "auth_cache": auth_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "sse": sse_streamer.stats(),
+        "event_loop": loop_lag_monitor.stats(),
+        "models": model_catalog.stats(),
+        "lifecycle": lifecycle.stats(),
+        "signing": keyring.stats(),
+        "usage": usage_recorder.stats(),
+        "cancellations": stream_cancellations.stats(),
+        "batch": batch_runner.stats(),
+    }
+
+@app.get("/api/admin/usage")
+async def read_usage_api(
+    days: int = 30,
+    user_id: Optional[uuid.UUID] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_admin_user)
+):
+    return await usage_report(db, days=max(1, min(days, USAGE_REPORT_MAX_DAYS)), user_id=user_id)
+
+@app.get("/api/admin/quotas")
+async def read_quotas_api(current_user: models.User = Depends(get_current_admin_user)):
+    return {"default": await quota_manager.limits_for(None)}
+
+@app.put("/api/admin/quotas")
+async def set_default_quota_api(
+    limits: QuotaLimits,
+    current_user: models.User = Depends(get_current_admin_user)
+):
+    updated = {**await quota_manager.limits_for(None), **limits.dict(exclude_none=True)}
+    await quota_manager.set_default_limits(updated)
+    return {"default": updated}
+
+@app.get("/api/admin/quotas/{user_id}")
+async def read_user_quota_api(
+    user_id: uuid.UUID,
+    current_user: models.User = Depends(get_current_admin_user)
+):
+    return {"user_id": str(user_id), "limits": await quota_manager.limits_for(user_id)}
+
+@app.put("/api/admin/quotas/{user_id}")
+async def set_user_quota_api(
+    user_id: uuid.UUID,
+    limits: QuotaLimits,
+    current_user: models.User = Depends(get_current_admin_user)
+):
+    await quota_manager.set_user_limits(user_id, limits.dict(exclude_none=True) or None)
+    return {"user_id": str(user_id), "limits": await quota_manager.limits_for(user_id)}
+
+@app.delete("/api/admin/quotas/{user_id}")
+async def reset_user_quota_api(
+    user_id: uuid.UUID,
     current_user: models.User = Depends(get_current_admin_user)
 ):
-    users = crud.get_users(db, skip=skip, limit=limit)
-    return {"users": users}
+    await quota_manager.set_user_limits(user_id, None)
+    return {"user_id": str(user_id), "limits": await quota_manager.limits_for(user_id)}
 
 @app.get("/users/pending")
 async def read_pending_users(
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_admin_user)
 ):
-    users = crud.get_pending_users(db)
-    return {"users": users}
+    try:
+        users, next_cursor = await async_crud.list_users(
+            db, limit=max(1, min(limit, 200)), cursor=cursor, status="pending"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"users": users, "next_cursor": next_cursor}
 
 @app.post("/users/approve")
 async def approve_user(
     approval: UserApproval,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
         # Get the current user from the cookie directly
-        current_user = await get_current_user_from_cookie(request, Response(), db)
+        current_user = await get_current_user_from_cookie(request, Response())
         
         if not current_user:
             raise HTTPException(status_code=401, detail="Not authenticated")
@@ -308,7 +504,7 @@ async def approve_user(
             raise HTTPException(status_code=403, detail="Not authorized. Admin privileges required.")
             
         if approval.approve:
-            user = crud.approve_user(db, approval.user_id)
+            user = await async_crud.approve_user(db, approval.user_id)
             if user:
                 return {"message": f"User {user.username} approved successfully"}
             else:
@@ -324,10 +520,10 @@ async def approve_user(
 async def set_admin_status(
     admin_status: UserAdmin,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
-        current_user = await get_current_user_from_cookie(request, Response(), db)
+        current_user = await get_current_user_from_cookie(request, Response())
         
         if not current_user:
             raise HTTPException(status_code=401, detail="Not authenticated")
@@ -336,7 +532,7 @@ async def set_admin_status(
             raise HTTPException(status_code=403, detail="Not authorized. Admin privileges required.")
             
         if admin_status.make_admin:
-            user = crud.promote_to_admin(db, admin_status.user_id)
+            user = await async_crud.promote_to_admin(db, admin_status.user_id)
             if user:
                 return {"message": f"User {user.username} is now an admin"}
             else:
@@ -351,10 +547,10 @@ async def set_admin_status(
 async def set_active_status(
     activation: UserActivation,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
-        current_user = await get_current_user_from_cookie(request, Response(), db)
+        current_user = await get_current_user_from_cookie(request, Response())
         
         if not current_user:
             raise HTTPException(status_code=401, detail="Not authenticated")
@@ -363,10 +559,10 @@ async def set_active_status(
             raise HTTPException(status_code=403, detail="Not authorized. Admin privileges required.")
             
         if activation.activate:
-            user = crud.activate_user(db, activation.user_id)
+            user = await async_crud.activate_user(db, activation.user_id)
             action = "activated"
         else:
-            user = crud.suspend_user(db, activation.user_id)
+            user = await async_crud.suspend_user(db, activation.user_id)
             action = "suspended"
         
         if user:
@@ -377,6 +573,37 @@ async def set_active_status(
             raise e
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/users/bulk", response_model=UserBulkResult)
+async def bulk_user_action(
+    body: UserBulkAction,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[models.User] = Depends(get_current_user_from_cookie)
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized. Admin privileges required.")
+    target = body.filter or UserBulkFilter()
+    try:
+        results = await async_crud.bulk_update_users(
+            db,
+            body.action,
+            user_ids=body.user_ids,
+            status=target.status,
+            search=(target.q or "").strip() or None,
+            # Admins cannot suspend themselves, matching the single-user UI
+            exclude_id=current_user.id if body.action == "suspend" else None,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    updated = sum(1 for _, outcome in results if outcome == "updated")
+    logger.info(f"{current_user.username} bulk {body.action}: {updated} of {len(results)} users updated")
+    return {
+        "action": body.action,
+        "updated": updated,
+        "results": [{"user_id": user_id, "outcome": outcome} for user_id, outcome in results],
+    }
+
 # User registration
 @app.get("/register", response_class=HTMLResponse)
 async def register_page(request: Request):
@@ -385,7 +612,7 @@ async def register_page(request: Request):
 @app.post("/register")
 async def register_user_form(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     username: str = Form(None),
     email: str = Form(None),
     password: str = Form(None),
@@ -394,14 +621,14 @@ async def register_user_form(
     # Handle API requests (JSON body)
     if user_json:
         try:
-            existing_user = crud.get_user(db, username=user_json.username)
+            existing_user = await async_crud.get_user(db, username=user_json.username)
             if existing_user:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Username already registered"
                 )
             
-            new_user = crud.create_user(
+            new_user = await async_crud.create_user(
                 db=db,
                 username=user_json.username,
                 password=user_json.password,
@@ -416,6 +643,8 @@ async def register_user_form(
                 )
             
             return {"message": "User registered successfully. Please wait for admin approval."}
+        except PasswordHasherBusy:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -430,14 +659,14 @@ async def register_user_form(
                 status_code=303
             )
             
-        existing_user = crud.get_user(db, username=username)
+        existing_user = await async_crud.get_user(db, username=username)
         if existing_user:
             return RedirectResponse(
                 url="/register?error=Username+already+registered",
                 status_code=303
             )
         
-        new_user = crud.create_user(
+        new_user = await async_crud.create_user(
             db=db,
             username=username,
             password=password,
@@ -455,6 +684,8 @@ async def register_user_form(
             url="/register?success=true",
             status_code=303
         )
+    except PasswordHasherBusy:
+        raise
     except Exception as e:
         return RedirectResponse(
             url=f"/register?error={str(e)}",
@@ -464,7 +695,7 @@ async def register_user_form(
 @app.get("/admin/users", response_class=HTMLResponse)
 async def admin_users_page(
     request: Request, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user_from_cookie)
 ):
     if not current_user:
@@ -473,16 +704,32 @@ async def admin_users_page(
     if not current_user.is_admin:
         return RedirectResponse(url="/?error=Admin+access+required", status_code=303)
     
-    users = crud.get_users(db)
-    pending_users = crud.get_pending_users(db)
-    message = request.query_params.get("message")
+    params = request.query_params
+    status = params.get("status") if params.get("status") in async_crud.USER_FILTERS else None
+    search = (params.get("q") or "").strip() or None
+    try:
+        users, next_cursor = await async_crud.list_users(
+            db, limit=ADMIN_USERS_PAGE_SIZE, cursor=params.get("cursor"), status=status, search=search
+        )
+    except ValueError:
+        # Stale or hand-edited cursor: start over from the first page
+        users, next_cursor = await async_crud.list_users(db, limit=ADMIN_USERS_PAGE_SIZE, status=status, search=search)
+    total, total_is_estimate = await async_crud.count_users(db, status=status, search=search)
+    pending_count, _ = await async_crud.count_users(db, status="pending")
+    message = params.get("message")
     
     return templates.TemplateResponse(
         "admin/users.html", 
         {
             "request": request,
             "users": users,
-            "pending_users": pending_users,
+            "next_cursor": next_cursor,
+            "is_first_page": not params.get("cursor"),
+            "status": status,
+            "search": search or "",
+            "total": total,
+            "total_is_estimate": total_is_estimate,
+            "pending_count": pending_count,
             "current_user": current_user,
             "is_authenticated": True,
             "username": current_user.username,
@@ -490,6 +737,91 @@ async def admin_users_page(
         }
     )
 
+@app.get("/admin/usage", response_class=HTMLResponse)
+async def admin_usage_page(
+    request: Request,
+    days: int = 30,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_from_cookie)
+):
+    if not current_user:
+        return RedirectResponse(url="/login?redirect=%2Fadmin%2Fusage", status_code=303)
+
+    if not current_user.is_admin:
+        return RedirectResponse(url="/?error=Admin+access+required", status_code=303)
+
+    days = max(1, min(days, USAGE_REPORT_MAX_DAYS))
+    return templates.TemplateResponse(
+        "admin/usage.html",
+        {
+            "request": request,
+            "report": await usage_report(db, days=days),
+            "days": days,
+            "current_user": current_user,
+            "is_authenticated": True,
+            "username": current_user.username
+        }
+    )
+
+@app.get("/api/models")
+async def list_models_api(current_user: Optional[models.User] = Depends(get_current_user_from_cookie)):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return {"default_model": model_catalog.default_model, "models": model_catalog.public}
+
+# Conversation endpoints
+@app.get("/api/conversations", response_model=ConversationList)
+async def list_conversations_api(
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[models.User] = Depends(get_current_user_from_cookie)
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    try:
+        conversations, next_cursor = await async_crud.list_conversations(
+            db, current_user.id, limit=max(1, min(limit, 100)), cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"conversations": conversations, "next_cursor": next_cursor}
+
+@app.post("/api/conversations", response_model=Conversation)
+async def create_conversation_api(
+    conversation: ConversationCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[models.User] = Depends(get_current_user_from_cookie)
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return await async_crud.create_conversation(db, current_user.id, title=conversation.title, model=conversation.model)
+
+@app.get("/api/conversations/{conversation_id}", response_model=MessageList)
+async def read_conversation_api(
+    conversation_id: uuid.UUID,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[models.User] = Depends(get_current_user_from_cookie)
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    conversation = await async_crud.get_conversation(db, conversation_id, current_user.id)
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return {"conversation": conversation, "messages": await async_crud.get_messages(db, conversation.id)}
+
+@app.delete("/api/conversations/{conversation_id}")
+async def delete_conversation_api(
+    conversation_id: uuid.UUID,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[models.User] = Depends(get_current_user_from_cookie)
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if not await async_crud.delete_conversation(db, conversation_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return {"message": "Conversation deleted"}
+
 # Chatbot and other endpoints
 @app.get("/chat", response_class=HTMLResponse)
 async def chat_page(
@@ -500,14 +832,12 @@ async def chat_page(
         redirect_url = f"/login?redirect={quote('/chat')}"
         return RedirectResponse(url=redirect_url, status_code=303)
     
-    model_options = get_model_options()
-    selected_model = next(iter(GROQ_MODELS.keys()), "")
     return templates.TemplateResponse(
         "chat.html",
         {
             "request": request,
-            "model_options": model_options,
-            "selected_model": selected_model,
+            "model_options": model_catalog.options,
+            "selected_model": model_catalog.default_model,
             "is_authenticated": True,
             "current_user": current_user,
             "username": current_user.username
@@ -518,53 +848,369 @@ async def chat_page(
 async def chat(
     request: Request, 
     body: dict = Body(...),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Optional[models.User] = Depends(get_current_user_from_cookie)
 ):
     if not current_user:
         return RedirectResponse(url="/?error=You%20need%20to%20login%20to%20access%20this%20page", status_code=303)
     
+    # Reject over-quota users before touching the database or any provider
+    await check_quota(current_user)
+
     try:
-        messages = body.get("messages", [])
-        model = body.get("model", list(GROQ_MODELS.keys())[0])
-        max_tokens = body.get("max_tokens", 12800)
         stream = body.get("stream", False)
-        # Ensure messages are dicts
-        messages = [msg if isinstance(msg, dict) else msg.dict() for msg in messages]
+        turn = await prepare_chat_turn(db, current_user, body)
 
         if stream:
-            # Streaming response
-            async def text_stream():
-                llm_stream = await call_llm(messages, max_tokens, model)
-                # If llm_stream is a generator, iterate and yield
-                for chunk in llm_stream:
-                    yield chunk
-                    await asyncio.sleep(0)  # Yield control to event loop for immediate flush
-            return StreamingResponse(text_stream(), media_type="text/plain")
+            # Give the pooled connection back before a potentially long stream
+            await db.close()
+            # Opened before the response starts, so a full bulkhead is a 503 rather than an error inside a 200
+            started = time.perf_counter()
+            llm_stream, conversation = await open_turn_stream(turn)
+            model, messages, max_tokens = llm_stream.served
+            headers = {"X-Conversation-Id": str(conversation.id)} if conversation else None
+            reply = stream_reply(current_user, llm_stream, started, messages, max_tokens, model, conversation)
+            return CancellableStreamingResponse(reply, media_type="text/plain", headers=headers, upstream=llm_stream)
         else:
             # Non-streaming response
-            response = await call_llm(messages, max_tokens, model)
-            # If response is a generator, join it
-            if hasattr(response, "__iter__") and not isinstance(response, str):
-                response = "".join(response)
-            elif isinstance(response, dict):
-                response = str(response)
-            return {"response": response, "model": model}
+            started = time.perf_counter()
+            llm_stream, conversation = await open_turn_stream(turn)
+            model, messages, max_tokens = llm_stream.served
+            chunks = []
+            first_chunk_at = None
+            async for chunk in llm_stream:
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter()
+                chunks.append(chunk)
+            response = "".join(chunks)
+            tokens = count_completion_tokens(model, response)
+            llm_children(provider_for(model) or "unknown", model).tokens.observe(tokens)
+            record_usage(current_user, model, "/chat", messages, tokens, started, first_chunk_at)
+            await quota_manager.record_tokens(current_user.id, tokens)
+            result = {"response": response, "model": model}
+            if conversation:
+                await async_crud.add_message(db, conversation.id, "assistant", response, model=model)
+                result["conversation_id"] = str(conversation.id)
+            return result
+    except (HTTPException, BulkheadFull):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/chat/stream")
+async def chat_stream(
+    request: Request,
+    body: dict = Body(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[models.User] = Depends(get_current_user_from_cookie)
+):
+    """Same request body as /chat, answered as Server-Sent Events (delta*, then done or error)."""
+    if not current_user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    await check_quota(current_user)
+
+    try:
+        turn = await prepare_chat_turn(db, current_user, body)
+        await db.close()
+        # Opened before the response starts, so a full bulkhead is a 503 rather than an error event inside a 200
+        started = time.perf_counter()
+        llm_stream, conversation = await open_turn_stream(turn)
+    except (HTTPException, BulkheadFull):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-def get_model_options():
-    options = {
-        "groq": [
-            {"id": model_id, "label": model_id.replace("-", " ").capitalize()}
-            for model_id in GROQ_MODELS.keys()
-        ],
-        "gemini": [
-            {"id": model_id, "label": model_id.replace("-", " ").capitalize()}
-            for model_id in GEMINI_MODELS.keys()
-        ],
-        "deepseek": [
-            {"id": model_id, "label": model_id.replace("-", " ").capitalize()}
-            for model_id in DEEPSEEK_MODELS.keys()
-        ]
+    served = llm_stream.served
+    reply = []
+
+    async def deltas():
+        async with aclosing(stream_reply(
+            current_user, llm_stream, started, served.messages, served.max_tokens, served.model,
+            conversation, endpoint="/chat/stream"
+        )) as reply_stream:
+            async for chunk in reply_stream:
+                reply.append(chunk)
+                yield chunk
+
+    def summary():
+        completion_tokens = count_completion_tokens(served.model, "".join(reply))
+        prompt_tokens = count_message_tokens(served.model, served.messages)
+        result = {
+            "model": served.model,
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+        if conversation:
+            result["conversation_id"] = str(conversation.id)
+        return result
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if conversation:
+        headers["X-Conversation-Id"] = str(conversation.id)
+    return CancellableStreamingResponse(
+        sse_streamer.stream(deltas(), summary), media_type="text/event-stream", headers=headers, upstream=llm_stream
+    )
+
+@app.post("/chat/batch")
+async def chat_batch(
+    batch: ChatBatchRequest,
+    current_user: Optional[models.User] = Depends(get_current_user_from_cookie)
+):
+    """
+    Runs independent chat jobs concurrently and answers NDJSON: one line per
+    job as it finishes ({"index", "status": "ok"|"error", ...}), in finish
+    order, then a {"summary": ...} line.
+    """
+    if not current_user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    await check_quota(current_user)
+    for index, job in enumerate(batch.jobs):
+        model = job.model or model_catalog.default_model
+        if model_catalog.get(model) is None:
+            raise HTTPException(status_code=400, detail=f"Job {index}: model '{model}' is not supported.")
+
+    async def lines():
+        in_flight = chat_children("/chat/batch")
+        in_flight.inc()
+        lifecycle.streams += 1
+        try:
+            async with aclosing(batch_runner.stream(
+                batch.jobs, lambda job: run_batch_job(current_user, job), batch.concurrency
+            )) as results:
+                async for line in results:
+                    yield line
+        finally:
+            in_flight.dec()
+            lifecycle.streams -= 1
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return CancellableStreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
+
+async def run_batch_job(current_user: models.User, job: ChatBatchJob) -> dict:
+    """One attempt at a batch job; errors are left to the batch runner to retry or report."""
+    model = job.model or model_catalog.default_model
+    # Per attempt, so a long batch is paced by the user's quota rather than let through by one check;
+    # the batch runner waits out a rejection without counting it as an attempt
+    await quota_manager.check(current_user.id)
+    use_cache = response_cache.enabled and job.cache
+    chunks = []
+    started = time.perf_counter()
+    first_chunk_at = None
+    completed = False
+    messages = job.messages
+    try:
+        async with aclosing(await open_llm_stream(
+            job.messages, job.max_tokens or DEFAULT_MAX_TOKENS, model, job.temperature, use_cache
+        )) as llm_stream:
+            model, messages = llm_stream.served.model, llm_stream.served.messages
+            async for chunk in llm_stream:
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter()
+                chunks.append(chunk)
+        completed = True
+    finally:
+        # Meter whatever was generated, including by attempts that failed midway;
+        # attempts that never got a reply are left out so retries do not inflate the request count
+        tokens = count_completion_tokens(model, "".join(chunks))
+        if completed or tokens:
+            if tokens:
+                llm_children(provider_for(model) or "unknown", model).tokens.observe(tokens)
+            record_usage(current_user, model, "/chat/batch", messages, tokens, started, first_chunk_at)
+            await quota_manager.record_tokens(current_user.id, tokens)
+    prompt_tokens = count_message_tokens(model, messages)
+    return {
+        "model": model,
+        "response": "".join(chunks),
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": tokens,
+            "total_tokens": prompt_tokens + tokens,
+        },
     }
-    return options
\ No newline at end of file
+
+async def check_quota(current_user: models.User):
+    try:
+        await quota_manager.check(current_user.id)
+    except QuotaExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Rate limit exceeded ({e.limit}). Please try again later.",
+            headers={"Retry-After": str(max(1, int(e.retry_after + 0.999)))},
+        )
+
+# Before context_manager.prepare clamps it to what the serving model allows
+DEFAULT_MAX_TOKENS = 12800
+
+class ChatTurn(NamedTuple):
+    messages: list
+    max_tokens: int
+    model: str
+    temperature: Optional[float]
+    use_cache: bool
+    conversation: Optional[models.Conversation]
+    # Saved by open_turn_stream once the upstream is open, in a conversation
+    # created from new_conversation (create_conversation arguments) if there is none yet
+    user_message: Optional[str]
+    new_conversation: Optional[dict]
+
+async def prepare_chat_turn(db: AsyncSession, current_user: models.User, body: dict) -> ChatTurn:
+    messages = body.get("messages", [])
+    model = body.get("model") or model_catalog.default_model
+    if model_catalog.get(model) is None:
+        raise HTTPException(status_code=400, detail=f"Model '{model}' is not supported.")
+    max_tokens = body.get("max_tokens", DEFAULT_MAX_TOKENS)
+    if max_tokens is not None and (not isinstance(max_tokens, int) or isinstance(max_tokens, bool) or max_tokens < 1):
+        raise HTTPException(status_code=400, detail="max_tokens must be a positive integer.")
+    # Ensure messages are dicts
+    messages = [msg if isinstance(msg, dict) else msg.dict() for msg in messages]
+    use_cache = response_cache.enabled and body.get("cache", True)
+    temperature = body.get("temperature")
+
+    # Conversation mode: the client sends only the new message, history lives server-side
+    conversation = None
+    user_message = None
+    new_conversation = None
+    if isinstance(body.get("message"), str):
+        user_message = body["message"]
+        conversation = await load_conversation_for_turn(db, current_user, body)
+        messages = []
+        if conversation is None:
+            title = user_message.strip().splitlines()[0][:80] if user_message.strip() else None
+            new_conversation = {"user_id": current_user.id, "title": title, "model": body.get("model")}
+        else:
+            messages = [
+                {"role": msg.role, "content": msg.content}
+                for msg in await async_crud.get_messages(db, conversation.id)
+            ]
+        messages.append({"role": "user", "content": user_message})
+    # Fitted to a model's limits by the hedging policy, separately for every model it tries
+    return ChatTurn(messages, max_tokens, model, temperature, use_cache, conversation, user_message, new_conversation)
+
+async def open_turn_stream(turn: ChatTurn):
+    """
+    Opens the upstream for a turn, then saves the user's message (and creates
+    the conversation if it is new), so a turn that never reached a provider
+    (a full bulkhead, a provider error) leaves nothing behind for the client's
+    retry to duplicate. Returns (llm_stream, conversation).
+    """
+    llm_stream = await open_llm_stream(turn.messages, turn.max_tokens, turn.model, turn.temperature, turn.use_cache)
+    conversation = turn.conversation
+    if turn.user_message is not None:
+        try:
+            conversation = await save_user_turn(turn)
+        except BaseException:
+            await llm_stream.aclose()
+            raise
+    return llm_stream, conversation
+
+async def stream_reply(current_user, llm_stream, started: float, messages, max_tokens, model, conversation, endpoint="/chat"):
+    """
+    Streams the reply from an already opened `llm_stream` (see open_llm_stream),
+    metering it against the user's quota and saving it to the conversation.
+    """
+    in_flight = chat_children(endpoint)
+    in_flight.inc()
+    lifecycle.streams += 1
+    chunks = []
+    first_chunk_at = None
+    outcome = "failed"
+    try:
+        # Closed explicitly so a client that goes away also closes the provider stream
+        async with aclosing(llm_stream):
+            async for chunk in llm_stream:
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter()
+                chunks.append(chunk)
+                yield chunk
+        outcome = "completed"
+    except (asyncio.CancelledError, GeneratorExit):
+        outcome = "cancelled"
+        raise
+    finally:
+        in_flight.dec()
+        lifecycle.streams -= 1
+        # Meter whatever was generated, including partial output
+        tokens = count_completion_tokens(model, "".join(chunks))
+        provider = provider_for(model) or "unknown"
+        if tokens:
+            llm_children(provider, model).tokens.observe(tokens)
+        if outcome == "completed":
+            stream_cancellations.record_completed(model, tokens)
+        elif outcome == "cancelled":
+            stream_cancellations.record_cancelled(endpoint, provider, model, tokens, max_tokens)
+        record_usage(current_user, model, endpoint, messages, tokens, started, first_chunk_at)
+        await quota_manager.record_tokens(current_user.id, tokens)
+    if conversation:
+        # One write for the whole reply, once the stream has finished
+        await save_assistant_message(conversation.id, "".join(chunks), model)
+
+def record_usage(current_user, model: str, endpoint: str, messages: list, completion_tokens: int, started: float, first_chunk_at: Optional[float]):
+    # Queued for a batched write (app/usage.py), nothing here waits on the database
+    usage_recorder.record(
+        current_user.id, model, endpoint,
+        prompt_tokens=count_message_tokens(model, messages),
+        completion_tokens=completion_tokens,
+        ttft=first_chunk_at - started if first_chunk_at is not None else None,
+        duration=time.perf_counter() - started,
+    )
+
+async def load_conversation_for_turn(db: AsyncSession, current_user: models.User, body: dict) -> Optional[models.Conversation]:
+    """The conversation the turn continues, or None for a new one (created by open_turn_stream)."""
+    conversation_id = body.get("conversation_id")
+    if not conversation_id:
+        return None
+    try:
+        conversation = await async_crud.get_conversation(db, conversation_id, current_user.id)
+    except ValueError:
+        conversation = None
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return conversation
+
+async def save_user_turn(turn: ChatTurn) -> models.Conversation:
+    # The request's session is closed before a stream opens, so use a fresh one
+    async with AsyncSessionLocal() as db:
+        conversation = turn.conversation
+        if conversation is None:
+            conversation = await async_crud.create_conversation(db, **turn.new_conversation)
+        await async_crud.add_message(db, conversation.id, "user", turn.user_message)
+    return conversation
+
+async def save_assistant_message(conversation_id, content: str, model: str):
+    # The request's session may already be closed once a stream finishes, so use a fresh one
+    async with AsyncSessionLocal() as db:
+        await async_crud.add_message(db, conversation_id, "assistant", content, model=model)
+
+async def open_llm_stream(messages: list, max_tokens: Optional[int], model: str, temperature=None, use_cache: bool = False):
+    """
+    Returns an async iterator over the response chunks, replayed from the
+    response cache on a hit, otherwise streamed from the provider. Identical
+    concurrent requests share a single upstream stream. Takes the messages and
+    max_tokens as requested; its `served` attribute has the model that
+    answered and what was sent to it, for metering.
+    """
+    if not use_cache and not coalescer.enabled:
+        return await hedging_policy.call(messages, max_tokens, model, temperature)
+    key = make_cache_key(model, messages, max_tokens, temperature)
+    if use_cache:
+        cached = await response_cache.get(key)
+        if cached is not None:
+            served = Served(model, *context_manager.prepare(model, messages, max_tokens))
+            return ServedStream(served, response_cache.replay(cached))
+
+    async def upstream():
+        llm_stream = await hedging_policy.call(messages, max_tokens, model, temperature)
+        if use_cache:
+            # A fallback's answer is cached as that model's, not as the one requested
+            served_key = key if llm_stream.served.model == model else make_cache_key(
+                llm_stream.served.model, messages, max_tokens, temperature
+            )
+            return ServedStream(llm_stream.served, response_cache.record(served_key, llm_stream))
+        return llm_stream
+
+    if coalescer.enabled:
+        return await coalescer.stream(key, upstream)
+    return await upstream()
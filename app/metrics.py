@@ -0,0 +1,190 @@
+import os
+import time
+import logging
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Optional
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Set (by app.serve) when several workers serve the app: each writes its samples
+# under this directory and a scrape of any worker aggregates all of them
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+# All metric objects are created once at import; hot paths only touch
+# pre-resolved label children (see llm_children / chat_children).
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 8, 13, 20, 30, 60, 120)
+COUNT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "llm_time_to_first_token_seconds", "Time from upstream request to first chunk",
+    ["provider", "model"], buckets=LATENCY_BUCKETS,
+)
+LLM_GENERATION_SECONDS = Histogram(
+    "llm_generation_seconds", "Time from upstream request to end of stream",
+    ["provider", "model"], buckets=LATENCY_BUCKETS,
+)
+LLM_CHUNKS = Histogram(
+    "llm_response_chunks", "Chunks per upstream response",
+    ["provider", "model"], buckets=COUNT_BUCKETS,
+)
+LLM_TOKENS = Histogram(
+    "llm_response_tokens", "Estimated tokens per generated reply",
+    ["provider", "model"], buckets=COUNT_BUCKETS,
+)
+LLM_ERRORS = Counter(
+    "llm_upstream_errors_total", "Upstream failures by exception type",
+    ["provider", "model", "error"],
+)
+LLM_STREAMS_IN_FLIGHT = Gauge(
+    "llm_streams_in_flight", "Upstream streams currently open", ["provider"],
+    multiprocess_mode="livesum",
+)
+CHAT_STREAMS_IN_FLIGHT = Gauge(
+    "chat_streams_in_flight", "Chat responses currently streaming to clients", ["endpoint"],
+    multiprocess_mode="livesum",
+)
+LLM_BULKHEAD_ACTIVE = Gauge(
+    "llm_bulkhead_active", "Upstream requests holding a bulkhead slot", ["bulkhead"],
+    multiprocess_mode="livesum",
+)
+LLM_BULKHEAD_QUEUED = Gauge(
+    "llm_bulkhead_queued", "Requests waiting for a bulkhead slot", ["bulkhead"],
+    multiprocess_mode="livesum",
+)
+LLM_BULKHEAD_WAIT_SECONDS = Histogram(
+    "llm_bulkhead_wait_seconds", "Time requests waited for a bulkhead slot", ["bulkhead"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+LLM_BULKHEAD_REJECTED = Counter(
+    "llm_bulkhead_rejected_total", "Requests turned away by a bulkhead", ["bulkhead", "reason"],
+)
+CHAT_STREAMS_CANCELLED = Counter(
+    "chat_streams_cancelled_total", "Chat responses stopped because the client went away", ["endpoint"],
+)
+LLM_TOKENS_SAVED = Counter(
+    "llm_tokens_saved_total", "Estimated completion tokens not generated thanks to cancelled streams",
+    ["provider", "model"],
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds", "Time request handlers waited for a database connection",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds", "How late the loop-lag sampler woke up",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+class _LLMChildren:
+    __slots__ = ("ttft", "generation", "chunks", "tokens", "in_flight")
+
+    def __init__(self, provider: str, model: str):
+        self.ttft = LLM_TIME_TO_FIRST_TOKEN.labels(provider, model)
+        self.generation = LLM_GENERATION_SECONDS.labels(provider, model)
+        self.chunks = LLM_CHUNKS.labels(provider, model)
+        self.tokens = LLM_TOKENS.labels(provider, model)
+        self.in_flight = LLM_STREAMS_IN_FLIGHT.labels(provider)
+
+
+@lru_cache(maxsize=None)
+def llm_children(provider: str, model: str) -> _LLMChildren:
+    return _LLMChildren(provider, model)
+
+
+@lru_cache(maxsize=None)
+def chat_children(endpoint: str):
+    return CHAT_STREAMS_IN_FLIGHT.labels(endpoint)
+
+
+def record_llm_error(provider: str, model: str, error: BaseException):
+    LLM_ERRORS.labels(provider, model, type(error).__name__).inc()
+
+
+async def track_llm_stream(
+    provider: str,
+    model: str,
+    started: float,
+    stream: AsyncIterator[str],
+    on_first_chunk: Optional[Callable[[float], None]] = None,
+) -> AsyncIterator[str]:
+    """Pass an upstream stream through, recording TTFT, duration, chunks and errors."""
+    children = llm_children(provider, model)
+    children.in_flight.inc()
+    chunks = 0
+    try:
+        async for chunk in stream:
+            if chunks == 0:
+                ttft = time.monotonic() - started
+                children.ttft.observe(ttft)
+                if on_first_chunk is not None:
+                    on_first_chunk(ttft)
+            chunks += 1
+            yield chunk
+        children.generation.observe(time.monotonic() - started)
+        children.chunks.observe(chunks)
+    except Exception as e:
+        record_llm_error(provider, model, e)
+        raise
+    finally:
+        children.in_flight.dec()
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class RuntimeCollector:
+    """
+    Point-in-time gauges read at scrape time: threadpool and DB pool usage.
+    With several workers these describe the worker that answered the scrape.
+    """
+
+    def describe(self):
+        # Keeps register() from calling collect() at import, before the DB engines exist
+        return []
+
+    def collect(self):
+        threadpool = GaugeMetricFamily("threadpool_threads", "Worker threads of the default threadpool", labels=["state"])
+        try:
+            from anyio.to_thread import current_default_thread_limiter
+            limiter = current_default_thread_limiter()
+            threadpool.add_metric(["busy"], limiter.borrowed_tokens)
+            threadpool.add_metric(["limit"], limiter.total_tokens)
+        except Exception:
+            # Only readable from inside the event loop
+            pass
+        yield threadpool
+
+        from app.db.database import engine, async_engine
+        gauges = {
+            name: GaugeMetricFamily(f"db_pool_{name}", f"SQLAlchemy pool {name.replace('_', ' ')}", labels=["engine"])
+            for name in ("size", "checked_out", "overflow")
+        }
+        for label, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool)):
+            for name, method in (("size", "size"), ("checked_out", "checkedout"), ("overflow", "overflow")):
+                if hasattr(pool, method):
+                    # QueuePool.overflow() counts up from -size; report only connections beyond the pool
+                    value = getattr(pool, method)()
+                    gauges[name].add_metric([label], max(0, value) if name == "overflow" else value)
+        yield from gauges.values()
+
+
+REGISTRY.register(RuntimeCollector())
+
+
+def render_latest():
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(RuntimeCollector())
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    """Drops this worker's live gauges from the shared multiprocess files."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
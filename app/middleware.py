@@ -0,0 +1,98 @@
+from typing import Callable, Iterable, Optional
+from urllib.parse import quote
+from jose import JWTError
+from starlette.requests import cookie_parser
+from starlette.responses import JSONResponse, RedirectResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app import auth_cache
+
+# Key under which the verified token payload is stored in the ASGI scope;
+# Starlette exposes it as `request.auth`. None means no valid token.
+AUTH_SCOPE_KEY = "auth"
+
+
+class PrefixMatcher:
+    """
+    Matches a path against a fixed set of public paths: a path matches if it
+    equals one of them or lies beneath it. Built once at startup so each
+    request costs one set lookup and one C-level startswith over a tuple.
+    """
+
+    def __init__(self, paths: Iterable[str]):
+        paths = list(paths)
+        self.exact = frozenset(paths)
+        # "/" only matches itself, otherwise every path would be public
+        self.prefixes = tuple(p.rstrip("/") + "/" for p in paths if p != "/")
+
+    def __call__(self, path: str) -> bool:
+        return path in self.exact or path.startswith(self.prefixes)
+
+
+def _cookie_token(scope: Scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"cookie":
+            token = cookie_parser(value.decode("latin-1")).get("access_token")
+            if token and token.startswith("Bearer "):
+                token = token[7:]
+            return token or None
+    return None
+
+
+class AuthMiddleware:
+    """
+    Pure-ASGI gate for pages and APIs that require a login cookie.
+
+    The access token is verified once per request (through the auth cache)
+    and its payload is stored in scope["auth"] for the auth dependencies to
+    reuse. Requests to non-public paths without a valid token get a 401 for
+    JSON clients and a redirect to the login page otherwise. Responses,
+    including streamed ones, are passed through untouched.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        public_paths: Iterable[str],
+        decode_token: Callable[[str], dict],
+        anonymous_paths: Iterable[str] = (),
+    ):
+        self.app = app
+        self.is_public = PrefixMatcher(public_paths)
+        # Public paths that never look at the identity (e.g. static files)
+        self.is_anonymous = PrefixMatcher(anonymous_paths)
+        self.decode_token = decode_token
+
+    def _verify(self, token: Optional[str]) -> Optional[dict]:
+        if not token:
+            return None
+        try:
+            return auth_cache.decode_token(token, self.decode_token)
+        except JWTError:
+            return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        if self.is_anonymous(path):
+            await self.app(scope, receive, send)
+            return
+
+        payload = self._verify(_cookie_token(scope))
+        scope[AUTH_SCOPE_KEY] = payload
+        if payload is not None or self.is_public(path):
+            await self.app(scope, receive, send)
+            return
+
+        accept = None
+        for name, value in scope["headers"]:
+            if name == b"accept":
+                accept = value.decode("latin-1")
+                break
+        if accept == "application/json":
+            response = JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+        else:
+            response = RedirectResponse(url=f"/login?redirect={quote(path)}", status_code=302)
+        await response(scope, receive, send)
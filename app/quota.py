@@ -0,0 +1,163 @@
+import os
+import time
+import logging
+import importlib
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUOTA_ENABLED = os.environ.get("QUOTA_ENABLED", "true").lower() in ("1", "true", "yes")
+# Default per-user limits; 0 disables that limit
+QUOTA_REQUESTS_PER_MINUTE = int(os.environ.get("QUOTA_REQUESTS_PER_MINUTE", "30"))
+QUOTA_TOKENS_PER_MINUTE = int(os.environ.get("QUOTA_TOKENS_PER_MINUTE", "40000"))
+# "module:Class" of a QuotaStore implementation shared by all workers
+QUOTA_STORE = os.environ.get("QUOTA_STORE", "")
+
+DEFAULT_LIMITS_KEY = "default"
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, limit: str, retry_after: float):
+        super().__init__(f"Quota exceeded: {limit}")
+        self.limit = limit
+        self.retry_after = retry_after
+
+    def __reduce__(self):
+        return type(self), (self.limit, self.retry_after)
+
+
+class QuotaStore:
+    """
+    Storage for token buckets and limit overrides.
+
+    The in-process store below is enough for a single worker. Multi-worker
+    deployments should point QUOTA_STORE at an implementation backed by a
+    shared store (e.g. Redis) that performs each operation atomically.
+    """
+
+    async def take(self, key: str, capacity: float, refill_per_second: float, amount: float) -> float:
+        """
+        Remove `amount` from the bucket if it holds at least that much (for
+        amount 0: if it is not empty). Returns 0 on success, otherwise the
+        seconds until the request would succeed.
+        """
+        raise NotImplementedError
+
+    async def charge(self, key: str, capacity: float, refill_per_second: float, amount: float):
+        """Remove `amount` unconditionally; the bucket may go negative."""
+        raise NotImplementedError
+
+    async def get_limits(self, key: str) -> Optional[Dict[str, int]]:
+        raise NotImplementedError
+
+    async def set_limits(self, key: str, limits: Optional[Dict[str, int]]):
+        raise NotImplementedError
+
+
+class InMemoryQuotaStore(QuotaStore):
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._limits: Dict[str, Dict[str, int]] = {}
+
+    def _refill(self, key: str, capacity: float, refill_per_second: float) -> float:
+        now = time.monotonic()
+        level, updated = self._buckets.get(key, (capacity, now))
+        return min(capacity, level + (now - updated) * refill_per_second)
+
+    async def take(self, key, capacity, refill_per_second, amount):
+        level = self._refill(key, capacity, refill_per_second)
+        if level >= amount and level > 0:
+            self._buckets[key] = (level - amount, time.monotonic())
+            return 0.0
+        self._buckets[key] = (level, time.monotonic())
+        missing = max(amount, 1) - level
+        return missing / refill_per_second if refill_per_second else float("inf")
+
+    async def charge(self, key, capacity, refill_per_second, amount):
+        level = self._refill(key, capacity, refill_per_second)
+        self._buckets[key] = (level - amount, time.monotonic())
+
+    async def get_limits(self, key):
+        return self._limits.get(key)
+
+    async def set_limits(self, key, limits):
+        if limits is None:
+            self._limits.pop(key, None)
+        else:
+            self._limits[key] = dict(limits)
+
+
+def load_store(path: str = QUOTA_STORE) -> QuotaStore:
+    if not path:
+        return InMemoryQuotaStore()
+    module_name, _, class_name = path.partition(":")
+    store_class = getattr(importlib.import_module(module_name), class_name)
+    return store_class()
+
+
+class QuotaManager:
+    """
+    Per-user token buckets for requests/minute and generated tokens/minute.
+
+    check() runs before any upstream call and rejects immediately when either
+    bucket is empty. Generated tokens are only known once the stream ends, so
+    record_tokens() charges them afterwards and may leave the bucket in debt,
+    which then blocks the user's next request until it refills.
+    """
+
+    def __init__(self, store: Optional[QuotaStore] = None, enabled: bool = QUOTA_ENABLED):
+        self.enabled = enabled
+        self.store = store or load_store()
+        self.rejected = 0
+        self.default_limits = {
+            "requests_per_minute": QUOTA_REQUESTS_PER_MINUTE,
+            "tokens_per_minute": QUOTA_TOKENS_PER_MINUTE,
+        }
+
+    async def limits_for(self, user_id) -> Dict[str, int]:
+        limits = dict(await self.store.get_limits(DEFAULT_LIMITS_KEY) or self.default_limits)
+        override = await self.store.get_limits(str(user_id))
+        if override:
+            limits.update(override)
+        return limits
+
+    async def check(self, user_id):
+        if not self.enabled:
+            return
+        limits = await self.limits_for(user_id)
+        rpm = limits.get("requests_per_minute") or 0
+        tpm = limits.get("tokens_per_minute") or 0
+        if tpm:
+            retry_after = await self.store.take(f"tpm:{user_id}", tpm, tpm / 60.0, 0)
+            if retry_after:
+                self.rejected += 1
+                raise QuotaExceeded("tokens_per_minute", retry_after)
+        if rpm:
+            retry_after = await self.store.take(f"rpm:{user_id}", rpm, rpm / 60.0, 1)
+            if retry_after:
+                self.rejected += 1
+                raise QuotaExceeded("requests_per_minute", retry_after)
+
+    async def record_tokens(self, user_id, tokens: int):
+        if not self.enabled or tokens <= 0:
+            return
+        limits = await self.limits_for(user_id)
+        tpm = limits.get("tokens_per_minute") or 0
+        if tpm:
+            await self.store.charge(f"tpm:{user_id}", tpm, tpm / 60.0, tokens)
+
+    async def set_default_limits(self, limits: Dict[str, int]):
+        await self.store.set_limits(DEFAULT_LIMITS_KEY, limits)
+
+    async def set_user_limits(self, user_id, limits: Optional[Dict[str, int]]):
+        await self.store.set_limits(str(user_id), limits)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "store": type(self.store).__name__,
+            "rejected": self.rejected,
+        }
+
+
+quota_manager = QuotaManager()
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr, field_validator
-from typing import Optional, List, Union
+from pydantic import BaseModel, EmailStr, Field, field_validator, model_validator
+from typing import Any, Dict, Literal, Optional, List, Union
 from datetime import datetime
 import uuid
 
@@ -49,6 +49,38 @@ class UserActivation(BaseModel):
                 raise ValueError('Invalid UUID format')
         return v
 
+# Most ids one bulk request may name; filters have no cap
+BULK_MAX_IDS = 10000
+
+class UserBulkFilter(BaseModel):
+    # Same filters as the admin user list
+    status: Optional[Literal["pending", "suspended", "admin"]] = None
+    q: Optional[str] = None
+
+class UserBulkAction(BaseModel):
+    action: Literal["approve", "suspend", "activate", "promote"]
+    user_ids: Optional[List[uuid.UUID]] = Field(None, max_length=BULK_MAX_IDS)
+    filter: Optional[UserBulkFilter] = None
+
+    @model_validator(mode="after")
+    def one_target(self):
+        if (self.user_ids is None) == (self.filter is None):
+            raise ValueError("Provide exactly one of user_ids or filter")
+        # An empty filter would match, and update, every user
+        if self.filter is not None and not self.filter.status and not (self.filter.q or "").strip():
+            raise ValueError("A filter needs a status or a search term")
+        return self
+
+class UserBulkOutcome(BaseModel):
+    user_id: uuid.UUID
+    # updated, unchanged (already in the target state), not_found, or skipped
+    outcome: str
+
+class UserBulkResult(BaseModel):
+    action: str
+    updated: int
+    results: List[UserBulkOutcome]
+
 class User(UserBase):
     id: uuid.UUID
     is_admin: bool
@@ -61,6 +93,10 @@ class User(UserBase):
 
 class UserList(BaseModel):
     users: List[User]
+    next_cursor: Optional[str] = None
+    # Approximate for large tables, see total_is_estimate
+    total: Optional[int] = None
+    total_is_estimate: bool = False
 
 class Token(BaseModel):
     access_token: str
@@ -69,3 +105,55 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: Optional[str] = None
     is_admin: Optional[bool] = None
+
+class ConversationCreate(BaseModel):
+    title: Optional[str] = None
+    model: Optional[str] = None
+
+class Conversation(BaseModel):
+    id: uuid.UUID
+    title: Optional[str] = None
+    model: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        orm_mode = True
+
+class ConversationList(BaseModel):
+    conversations: List[Conversation]
+    next_cursor: Optional[str] = None
+
+class Message(BaseModel):
+    id: uuid.UUID
+    role: str
+    content: str
+    model: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+class MessageList(BaseModel):
+    conversation: Conversation
+    messages: List[Message]
+
+class QuotaLimits(BaseModel):
+    # 0 disables the limit; a negative rate would leave the bucket rejecting forever
+    requests_per_minute: Optional[int] = Field(None, ge=0)
+    tokens_per_minute: Optional[int] = Field(None, ge=0)
+
+class ChatBatchJob(BaseModel):
+    model: Optional[str] = None
+    messages: List[Dict[str, Any]] = Field(..., min_length=1)
+    max_tokens: Optional[int] = Field(None, ge=1)
+    temperature: Optional[float] = None
+    cache: bool = True
+
+# Most jobs one batch request may carry
+BATCH_MAX_JOBS = 1000
+
+class ChatBatchRequest(BaseModel):
+    jobs: List[ChatBatchJob] = Field(..., min_length=1, max_length=BATCH_MAX_JOBS)
+    # Jobs of this batch run at once; never more than CHAT_BATCH_CONCURRENCY
+    concurrency: Optional[int] = Field(None, ge=1)
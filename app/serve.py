@@ -0,0 +1,81 @@
+"""
+Production server: python -m app.serve
+
+Does the one-time work up front in this process (checks that a shared
+signing key is configured, creates the schema and the admin user), then
+starts uvicorn with one worker per available CPU. Workers skip database
+setup. On SIGTERM each worker stops accepting connections, reports
+not-ready on /health/ready, and gives in-flight chat streams up to
+SHUTDOWN_DRAIN_SECONDS to finish.
+
+For development, `uvicorn app.main:app --reload` still works as before.
+"""
+import os
+import shutil
+import logging
+import tempfile
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger("app.serve")
+
+
+def available_cpus() -> int:
+    try:
+        # Respects CPU pinning (taskset, cgroups cpusets), unlike os.cpu_count()
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def prepare_metrics_dir(workers: int):
+    """Gives the workers a clean shared directory for Prometheus multiprocess mode."""
+    if workers <= 1:
+        return
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.path.join(tempfile.gettempdir(), "chatbot-metrics")
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+
+
+def main():
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    workers = int(os.environ.get("WEB_CONCURRENCY") or available_cpus())
+    host = os.environ.get("HOST", "0.0.0.0")
+    port = int(os.environ.get("PORT", "8009"))
+    drain_seconds = int(os.environ.get("SHUTDOWN_DRAIN_SECONDS", "30"))
+
+    # Fail here, once, instead of in every worker
+    from app.signing import load_keyring
+    keyring = load_keyring(required=workers > 1)
+    logger.info(f"Signing keys from {keyring.source}, active kid '{keyring.active}'")
+
+    prepare_metrics_dir(workers)
+
+    from app.db import init_db
+    init_db.run()
+
+    if workers > 1 and not os.environ.get("QUOTA_STORE"):
+        logger.warning("QUOTA_STORE is not set: each worker enforces chat quotas on its own")
+
+    # Inherited by the worker processes
+    os.environ["DB_INIT_ON_STARTUP"] = "false"
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+
+    import uvicorn
+    logger.info(f"Starting {workers} workers on {host}:{port}, drain timeout {drain_seconds}s")
+    uvicorn.run(
+        "app.main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        timeout_graceful_shutdown=drain_seconds,
+        proxy_headers=True,
+        forwarded_allow_ips=os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import logging
+import secrets
+import threading
+from typing import Dict, Optional
+from jose import jwt, JWTError
+
+logger = logging.getLogger(__name__)
+
+ALGORITHM = "HS256"
+
+# Key sources, first match wins:
+#   JWT_KEYS_FILE    JSON keyring {"active": "<kid>", "keys": {"<kid>": "<secret>", ...}}
+#   SECRET_KEY_FILE  a file holding one key (e.g. a Docker/Kubernetes secret)
+#   SECRET_KEY       the key itself
+JWT_KEYS_FILE = os.environ.get("JWT_KEYS_FILE")
+SECRET_KEY_FILE = os.environ.get("SECRET_KEY_FILE")
+SECRET_KEY = os.environ.get("SECRET_KEY")
+# How often a keyring file is checked for changes, so a rotation needs no restart
+JWT_KEYS_RELOAD_SECONDS = float(os.environ.get("JWT_KEYS_RELOAD_SECONDS", "30"))
+
+# kid used for a single SECRET_KEY / SECRET_KEY_FILE key
+DEFAULT_KID = "default"
+
+
+class MissingSigningKey(RuntimeError):
+    pass
+
+
+class Keyring:
+    """
+    Signing keys shared by every worker. Tokens are signed with the active
+    key and carry its id in the `kid` header; verification picks the key by
+    `kid`, so old keys can stay in the ring until their tokens expire.
+    Tokens without a `kid` (issued before keyrings) are checked against the
+    active key.
+    """
+
+    def __init__(self, keys: Dict[str, str], active: str, source: str, path: Optional[str] = None):
+        if active not in keys:
+            raise MissingSigningKey(f"Active key '{active}' is not in the keyring")
+        self.keys = keys
+        self.active = active
+        self.source = source
+        self._path = path
+        self._mtime = os.path.getmtime(path) if path else None
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+
+    def sign(self, claims: dict) -> str:
+        return jwt.encode(claims, self.keys[self.active], algorithm=ALGORITHM, headers={"kid": self.active})
+
+    def decode(self, token: str) -> dict:
+        self._maybe_reload()
+        kid = jwt.get_unverified_header(token).get("kid") or self.active
+        key = self.keys.get(kid)
+        if key is None:
+            raise JWTError(f"Unknown signing key '{kid}'")
+        return jwt.decode(token, key, algorithms=[ALGORITHM])
+
+    def _maybe_reload(self):
+        if self._path is None or time.monotonic() - self._checked < JWT_KEYS_RELOAD_SECONDS:
+            return
+        with self._lock:
+            self._checked = time.monotonic()
+            try:
+                mtime = os.path.getmtime(self._path)
+                if mtime == self._mtime:
+                    return
+                keys, active = _read_keyring(self._path)
+            except (OSError, ValueError, MissingSigningKey) as e:
+                # Keep serving with the keys we have rather than rejecting every token
+                logger.error(f"Could not reload keyring {self._path}: {e}")
+                return
+            self.keys, self.active, self._mtime = keys, active, mtime
+            logger.info(f"Reloaded keyring {self._path}: {len(keys)} keys, active '{active}'")
+
+    def stats(self) -> dict:
+        return {"source": self.source, "active_kid": self.active, "keys": len(self.keys)}
+
+
+def _read_keyring(path: str):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    keys = {str(kid): str(secret) for kid, secret in (data.get("keys") or {}).items() if secret}
+    active = data.get("active")
+    if not keys or active not in keys:
+        raise MissingSigningKey(f"{path} must list keys and name an active one")
+    return keys, active
+
+
+def load_keyring(required: bool = False) -> Keyring:
+    """
+    Builds the keyring from the environment. With no key configured it
+    falls back to a random per-process key, which only works with a single
+    worker; `required=True` (multi-worker serving) refuses to do that.
+    """
+    if JWT_KEYS_FILE:
+        keys, active = _read_keyring(JWT_KEYS_FILE)
+        return Keyring(keys, active, source="JWT_KEYS_FILE", path=JWT_KEYS_FILE)
+    if SECRET_KEY_FILE:
+        with open(SECRET_KEY_FILE, encoding="utf-8") as f:
+            key = f.read().strip()
+        if not key:
+            raise MissingSigningKey(f"{SECRET_KEY_FILE} is empty")
+        return Keyring({DEFAULT_KID: key}, DEFAULT_KID, source="SECRET_KEY_FILE")
+    if SECRET_KEY:
+        return Keyring({DEFAULT_KID: SECRET_KEY}, DEFAULT_KID, source="SECRET_KEY")
+    if required:
+        raise MissingSigningKey(
+            "Set SECRET_KEY, SECRET_KEY_FILE or JWT_KEYS_FILE: every worker must share the signing key"
+        )
+    logger.warning("No SECRET_KEY configured; using a random key, tokens will not survive a restart")
+    return Keyring({DEFAULT_KID: secrets.token_hex(32)}, DEFAULT_KID, source="ephemeral")
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Deltas are buffered until this much time has passed since the first one
+# in the buffer, or until the buffer holds this many bytes
+SSE_FLUSH_INTERVAL_MS = float(os.environ.get("SSE_FLUSH_INTERVAL_MS", "20"))
+SSE_FLUSH_BYTES = int(os.environ.get("SSE_FLUSH_BYTES", "512"))
+# Comment lines sent while the provider is silent, so proxies keep the connection open
+SSE_HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", "15"))
+
+HEARTBEAT = ": keep-alive\n\n"
+
+
+def format_event(data: dict, event: Optional[str] = None, event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    # JSON keeps the payload on a single data line, whatever the text contains
+    lines.append("data: " + json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+    return "\n".join(lines) + "\n\n"
+
+
+class SSEStreamer:
+    """
+    Turns a stream of text deltas into Server-Sent Events.
+
+    The first delta is sent at once so time-to-first-token is unaffected.
+    After that, deltas are coalesced into one `delta` event per flush
+    window (SSE_FLUSH_INTERVAL_MS) or per SSE_FLUSH_BYTES, whichever comes
+    first, which cuts writes and TCP frames per response and re-renders in
+    the browser. Each event carries an increasing id. The stream ends with
+    a `done` event holding the caller's summary plus timing stats, or an
+    `error` event if the upstream fails.
+    """
+
+    def __init__(
+        self,
+        flush_interval_ms: float = SSE_FLUSH_INTERVAL_MS,
+        flush_bytes: int = SSE_FLUSH_BYTES,
+        heartbeat_seconds: float = SSE_HEARTBEAT_SECONDS,
+    ):
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_bytes = flush_bytes
+        self.heartbeat_seconds = heartbeat_seconds
+        self.streams = 0
+        self.deltas = 0
+        self.events = 0
+        self.heartbeats = 0
+        self.errors = 0
+
+    async def stream(self, chunks: AsyncIterator[str], summary: Optional[Callable[[], dict]] = None) -> AsyncIterator[str]:
+        self.streams += 1
+        started = time.monotonic()
+        first_at = None
+        event_id = 0
+        deltas = 0
+        buffer = []
+        buffered_bytes = 0
+        flush_at = None
+
+        def flush():
+            nonlocal event_id, buffered_bytes, flush_at
+            event = format_event({"text": "".join(buffer)}, "delta", event_id)
+            event_id += 1
+            self.events += 1
+            buffer.clear()
+            buffered_bytes = 0
+            flush_at = None
+            return event
+
+        next_chunk = asyncio.ensure_future(chunks.__anext__())
+        try:
+            while True:
+                now = time.monotonic()
+                timeout = flush_at - now if flush_at is not None else self.heartbeat_seconds
+                done, _ = await asyncio.wait({next_chunk}, timeout=max(0.0, timeout))
+                if not done:
+                    if buffer:
+                        yield flush()
+                    else:
+                        self.heartbeats += 1
+                        yield HEARTBEAT
+                    continue
+                try:
+                    chunk = next_chunk.result()
+                except StopAsyncIteration:
+                    break
+                next_chunk = asyncio.ensure_future(chunks.__anext__())
+                if not chunk:
+                    continue
+                deltas += 1
+                self.deltas += 1
+                buffer.append(chunk)
+                buffered_bytes += len(chunk.encode("utf-8"))
+                now = time.monotonic()
+                if first_at is None:
+                    first_at = now
+                    yield flush()
+                elif buffered_bytes >= self.flush_bytes or (flush_at is not None and now >= flush_at):
+                    yield flush()
+                elif flush_at is None:
+                    flush_at = now + self.flush_interval
+            if buffer:
+                yield flush()
+            final = dict(summary() if summary else {})
+            final["timing"] = {
+                "first_token_ms": round((first_at - started) * 1000, 1) if first_at else None,
+                "total_ms": round((time.monotonic() - started) * 1000, 1),
+                "deltas": deltas,
+                "events": event_id,
+            }
+            yield format_event(final, "done", event_id)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error while streaming events: {e}")
+            if buffer:
+                yield flush()
+            yield format_event({"detail": str(e)}, "error", event_id)
+        finally:
+            if not next_chunk.done():
+                next_chunk.cancel()
+                try:
+                    await next_chunk
+                except BaseException:
+                    pass
+            aclose = getattr(chunks, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def stats(self) -> dict:
+        return {
+            "flush_interval_ms": self.flush_interval * 1000,
+            "flush_bytes": self.flush_bytes,
+            "streams": self.streams,
+            "deltas": self.deltas,
+            "events": self.events,
+            "heartbeats": self.heartbeats,
+            "errors": self.errors,
+        }
+
+
+sse_streamer = SSEStreamer()
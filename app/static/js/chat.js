@@ -9,6 +9,46 @@ const selectedModelInput = document.getElementById('selected-model');
 let messages = [];
 let streamController = null;
 let isStreaming = false;
+// History lives server-side; the browser only remembers which conversation it is in
+let conversationId = localStorage.getItem('conversationId');
+
+function setConversationId(id) {
+  conversationId = id;
+  if (id) {
+    localStorage.setItem('conversationId', id);
+  } else {
+    localStorage.removeItem('conversationId');
+  }
+}
+
+async function loadConversation() {
+  if (!conversationId) return;
+  try {
+    const res = await fetch(`/api/conversations/${conversationId}`, { credentials: 'same-origin' });
+    if (!res.ok) {
+      setConversationId(null);
+      return;
+    }
+    const data = await res.json();
+    if (!data.messages.length) return;
+    showChatState();
+    data.messages.forEach((msg) => {
+      messages.push({ role: msg.role, content: msg.content });
+      appendMessage(msg.role, msg.content);
+    });
+  } catch (err) {
+    console.error('Could not load conversation:', err);
+  }
+}
+
+function startNewConversation() {
+  if (isStreaming) return;
+  setConversationId(null);
+  messages = [];
+  chatWindow.innerHTML = '';
+  welcomeState.classList.remove('hidden');
+  updateWelcomeState();
+}
 
 function updateWelcomeState() {
   if (messages.length === 0) {
@@ -47,16 +87,17 @@ function addCopyButtonsToCodeBlocks(container) {
   });
 }
 
+marked.setOptions({
+  gfm: true,
+  breaks: true,
+  smartLists: true,
+  smartypants: true,
+  highlight: function(code, lang) {
+    return code;
+  }
+});
+
 function renderMarkdownWithMath(text) {
-  marked.setOptions({
-    gfm: true,
-    breaks: true,
-    smartLists: true,
-    smartypants: true,
-    highlight: function(code, lang) {
-      return code;
-    }
-  });
   let html = marked.parse(text || "");
   const tempDiv = document.createElement('div');
   tempDiv.innerHTML = html;
@@ -133,6 +174,35 @@ function setInputStateStreaming(streaming) {
   }
 }
 
+// Reads a text/event-stream response, calling onEvent(event, data) for each
+// event; heartbeat comments are skipped. Stops early if onEvent returns false.
+async function readEventStream(res, onEvent) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (value) buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = 'message';
+      let data = '';
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trimStart();
+      }
+      if (!data) continue;
+      if (onEvent(event, JSON.parse(data)) === false) {
+        reader.cancel();
+        return;
+      }
+    }
+    if (done) return;
+  }
+}
+
 async function sendMessage(content) {
   if (messages.length === 0 && window.botMarkdownInstructions) {
     content = window.botMarkdownInstructions + "\n\n" + content;
@@ -156,26 +226,17 @@ async function sendMessage(content) {
   let abortController = new AbortController();
   streamController = abortController;
 
-  // Helper for typing animation
-  async function typeText(target, fullText, prevText = "") {
-    // Only type the new part
-    let start = prevText.length;
-    for (let i = start; i < fullText.length; i++) {
-      if (!isStreaming) break;
-      target.innerHTML = renderMarkdownWithMath(fullText.slice(0, i + 1));
-      addCopyButtonsToCodeBlocks(target);
-      chatWindow.scrollTop = chatWindow.scrollHeight;
-      if (window.MathJax) MathJax.typesetPromise([target]);
-      await new Promise(r => setTimeout(r, 0)); // Typing speed (ms per char)
-    }
-  }
-
   try {
-    const model = selectedModelInput ? selectedModelInput.value : 'llama-3.3-70b-versatile';
-    const res = await fetch('/chat', {
+    const model = selectedModelInput ? selectedModelInput.value : undefined;  // server default
+    const res = await fetch('/chat/stream', {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ messages, model: model, max_tokens: 8192, stream: true }),
+      body: JSON.stringify({
+        conversation_id: conversationId,
+        message: content,
+        model: model,
+        max_tokens: 8192
+      }),
       signal: abortController.signal
     });
 
@@ -185,11 +246,17 @@ async function sendMessage(content) {
       return;
     }
 
+    const newConversationId = res.headers.get('X-Conversation-Id');
+    if (newConversationId) setConversationId(newConversationId);
+
     if (!res.body || !res.body.getReader) {
       // Not a stream, fallback to JSON
       const data = await res.json();
+      if (data.conversation_id) setConversationId(data.conversation_id);
       assistantContent = data.response || '';
-      await typeText(bubble, assistantContent);
+      bubble.innerHTML = renderMarkdownWithMath(assistantContent);
+      addCopyButtonsToCodeBlocks(bubble);
+      if (window.MathJax) MathJax.typesetPromise([bubble]);
       if (assistantContent.trim() !== "") {
         messages.push({ role: 'assistant', content: assistantContent });
       } else {
@@ -200,24 +267,35 @@ async function sendMessage(content) {
       return;
     }
 
-    // Stream response with typing animation
-    const reader = res.body.getReader();
-    const decoder = new TextDecoder();
+    // Server-Sent Events, rendered incrementally: finished blocks are frozen
+    // and only the trailing block is re-parsed, at most once per frame
     assistantContent = '';
-    bubble.innerHTML = '';
-    let done = false;
-    let prevContent = '';
-    while (!done) {
-      const { value, done: streamDone } = await reader.read();
-      if (value) {
-        const chunk = decoder.decode(value, { stream: true });
-        assistantContent += chunk;
-        // Animate only the new part
-        await typeText(bubble, assistantContent, prevContent);
-        prevContent = assistantContent;
-      }
-      done = streamDone;
-      if (!isStreaming) break;
+    let streamError = null;
+    const renderer = new StreamingMarkdownRenderer(bubble, {
+      onBlock: (node) => {
+        finishRenderedBlock(node);
+        addCopyButtonsToCodeBlocks(node);
+      },
+      onFrame: () => { chatWindow.scrollTop = chatWindow.scrollHeight; }
+    });
+    try {
+      await readEventStream(res, (event, data) => {
+        if (event === 'delta') {
+          assistantContent += data.text;
+          renderer.append(data.text);
+        } else if (event === 'done') {
+          if (data.conversation_id) setConversationId(data.conversation_id);
+        } else if (event === 'error') {
+          streamError = data.detail || 'Stream failed';
+        }
+        return isStreaming;
+      });
+    } finally {
+      renderer.finish();
+    }
+    if (streamError && assistantContent.trim() === "") {
+      bubble.innerHTML = '<span class="text-red-500">Error: Could not get response.</span>';
+      return;
     }
     if (assistantContent.trim() !== "") {
       messages.push({ role: 'assistant', content: assistantContent });
@@ -269,4 +347,8 @@ chatForm.querySelector('button[type="submit"]').addEventListener('click', (e) =>
   }
 });
 
+const newChatBtn = document.getElementById('new-chat');
+if (newChatBtn) newChatBtn.addEventListener('click', startNewConversation);
+
 updateWelcomeState();
+loadConversation();
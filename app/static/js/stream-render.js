@@ -0,0 +1,110 @@
+// Incremental markdown rendering for streamed answers.
+//
+// Re-parsing the whole answer on every chunk is quadratic in its length.
+// Instead, text up to the last block boundary (a blank line outside fenced
+// code and $$ math) is rendered once into a frozen node and never touched
+// again; only the unfinished trailing block is re-parsed. DOM work happens
+// at most once per animation frame, and highlighting / MathJax run only on
+// newly frozen nodes.
+
+const FENCE_RE = /^ {0,3}(`{3,}|~{3,})/;
+const MATH_FENCE_RE = /^\s*\$\$\s*$/;
+
+// Returns the offset just past the last block boundary in `text`, or 0.
+function lastBlockBoundary(text) {
+  let boundary = 0;
+  let fence = null;
+  let inMath = false;
+  let offset = 0;
+  let prevBlank = false;
+  const lines = text.split('\n');
+  // The final element has no newline yet, so it is never a complete line
+  for (let i = 0; i < lines.length - 1; i++) {
+    const line = lines[i];
+    offset += line.length + 1;
+    const fenceMatch = line.match(FENCE_RE);
+    if (fence) {
+      if (fenceMatch && fenceMatch[1][0] === fence[0] && fenceMatch[1].length >= fence.length) fence = null;
+      prevBlank = false;
+      continue;
+    }
+    if (inMath) {
+      if (MATH_FENCE_RE.test(line)) inMath = false;
+      prevBlank = false;
+      continue;
+    }
+    if (fenceMatch) {
+      fence = fenceMatch[1];
+    } else if (MATH_FENCE_RE.test(line)) {
+      inMath = true;
+    } else if (line.trim() === '') {
+      if (!prevBlank) boundary = offset;
+      prevBlank = true;
+      continue;
+    }
+    prevBlank = false;
+  }
+  return boundary;
+}
+
+class StreamingMarkdownRenderer {
+  // onBlock(node) runs once for every frozen node (highlighting, math, copy
+  // buttons); onFrame() runs after each DOM update (e.g. to keep scrolled).
+  constructor(container, { onBlock = null, onFrame = null } = {}) {
+    this.container = container;
+    this.onBlock = onBlock;
+    this.onFrame = onFrame;
+    this.text = '';
+    this.frozenLength = 0;
+    this.frame = null;
+    this.container.innerHTML = '';
+    this.frozen = document.createElement('div');
+    this.tail = document.createElement('div');
+    this.container.appendChild(this.frozen);
+    this.container.appendChild(this.tail);
+  }
+
+  append(delta) {
+    this.text += delta;
+    if (this.frame === null) {
+      this.frame = requestAnimationFrame(() => {
+        this.frame = null;
+        this.render(false);
+      });
+    }
+  }
+
+  // Renders everything that is left; call once the stream has ended
+  finish() {
+    if (this.frame !== null) {
+      cancelAnimationFrame(this.frame);
+      this.frame = null;
+    }
+    this.render(true);
+  }
+
+  render(final) {
+    const pending = this.text.slice(this.frozenLength);
+    const boundary = final ? pending.length : lastBlockBoundary(pending);
+    if (boundary > 0) {
+      const block = document.createElement('div');
+      block.innerHTML = marked.parse(pending.slice(0, boundary));
+      this.frozen.appendChild(block);
+      this.frozenLength += boundary;
+      if (this.onBlock) this.onBlock(block);
+    }
+    const tailText = this.text.slice(this.frozenLength);
+    this.tail.innerHTML = tailText ? marked.parse(tailText) : '';
+    if (this.onFrame) this.onFrame();
+  }
+}
+
+// Highlights and typesets a freshly frozen node only
+function finishRenderedBlock(node) {
+  if (window.hljs) {
+    node.querySelectorAll('pre code').forEach((code) => window.hljs.highlightElement(code));
+  }
+  if (window.MathJax && window.MathJax.typesetPromise && /\$|\\\(/.test(node.textContent)) {
+    window.MathJax.typesetPromise([node]);
+  }
+}
@@ -0,0 +1,121 @@
+import os
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+from app.metrics import CHAT_STREAMS_CANCELLED, LLM_TOKENS_SAVED
+
+logger = logging.getLogger(__name__)
+
+# Longest a worker spends closing the provider stream once the client has gone
+STREAM_CLOSE_TIMEOUT = float(os.environ.get("STREAM_CLOSE_TIMEOUT", "5"))
+
+
+class CancellableStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that stops generating as soon as the client goes away.
+
+    The disconnect is watched for alongside the body, whatever ASGI version
+    the server speaks, rather than noticed at the next failed write. The
+    body iterator is then closed, which closes every layer down to the
+    provider stream (whose HTTP connection is what keeps the model
+    generating). Cleanup runs outside of a cancelled scope so its awaits
+    complete, bounded by STREAM_CLOSE_TIMEOUT.
+
+    `upstream` is a provider stream opened before the response was returned.
+    It is closed as well, in case the body ends (or never starts) without
+    closing it, so its bulkhead slot is always given back.
+    """
+
+    def __init__(self, content, *args, upstream=None, **kwargs):
+        super().__init__(content, *args, **kwargs)
+        self.upstream = upstream
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await super().__call__(scope, receive, send)
+
+        streaming = asyncio.ensure_future(self.stream_response(send))
+        watching = asyncio.ensure_future(self.listen_for_disconnect(receive))
+        disconnected = False
+        try:
+            await asyncio.wait({streaming, watching}, return_when=asyncio.FIRST_COMPLETED)
+            disconnected = not streaming.done()
+        finally:
+            watching.cancel()
+            # Also covers this task being cancelled itself, e.g. at the end of a shutdown drain
+            if not streaming.done():
+                streaming.cancel()
+            try:
+                await asyncio.wait_for(self._finish(streaming), STREAM_CLOSE_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"Upstream stream still closing after {STREAM_CLOSE_TIMEOUT}s, leaving it behind")
+            except OSError:
+                # Written to a connection that was already gone (ASGI 2.4 servers report it this way)
+                disconnected = True
+
+        if self.background is not None and not disconnected:
+            await self.background()
+
+    async def _finish(self, streaming: asyncio.Future):
+        try:
+            await streaming
+        except asyncio.CancelledError:
+            pass
+        finally:
+            try:
+                # The iterator may be parked at a yield (stopped while sending), not inside the await
+                await self.body_iterator.aclose()
+            finally:
+                if self.upstream is not None:
+                    await self.upstream.aclose()
+
+
+class StreamCancellations:
+    """
+    Counts chat streams cut short by the client and estimates the tokens
+    that were not generated: the model's average completed reply length
+    (capped at max_tokens), less what had been generated by then.
+    """
+
+    def __init__(self):
+        self.cancelled = 0
+        self.by_endpoint: Dict[str, int] = {}
+        self.tokens_generated = 0
+        self.tokens_saved = 0
+        # model -> (completed replies, their total tokens)
+        self._completed: Dict[str, Tuple[int, int]] = {}
+
+    def record_completed(self, model: str, tokens: int):
+        count, total = self._completed.get(model, (0, 0))
+        self._completed[model] = (count + 1, total + tokens)
+
+    def expected_tokens(self, model: str, max_tokens: Optional[int] = None) -> Optional[int]:
+        count, total = self._completed.get(model, (0, 0))
+        if not count:
+            return None
+        expected = total // count
+        return min(expected, max_tokens) if max_tokens else expected
+
+    def record_cancelled(self, endpoint: str, provider: str, model: str, tokens: int, max_tokens: Optional[int] = None):
+        self.cancelled += 1
+        self.by_endpoint[endpoint] = self.by_endpoint.get(endpoint, 0) + 1
+        self.tokens_generated += tokens
+        CHAT_STREAMS_CANCELLED.labels(endpoint).inc()
+        expected = self.expected_tokens(model, max_tokens)
+        if expected is not None and expected > tokens:
+            self.tokens_saved += expected - tokens
+            LLM_TOKENS_SAVED.labels(provider, model).inc(expected - tokens)
+
+    def stats(self) -> dict:
+        return {
+            "cancelled": self.cancelled,
+            "by_endpoint": dict(self.by_endpoint),
+            "tokens_generated_before_cancel": self.tokens_generated,
+            "tokens_saved_estimate": self.tokens_saved,
+            "close_timeout_seconds": STREAM_CLOSE_TIMEOUT,
+        }
+
+
+stream_cancellations = StreamCancellations()
@@ -0,0 +1,230 @@
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import AsyncSessionLocal
+from app.db import async_crud
+from app.llm_service.catalog import model_catalog
+
+logger = logging.getLogger(__name__)
+
+USAGE_ENABLED = os.environ.get("USAGE_ENABLED", "true").lower() in ("1", "true", "yes")
+# A batch is written once it holds USAGE_BATCH_SIZE events or USAGE_FLUSH_SECONDS have passed
+USAGE_BATCH_SIZE = int(os.environ.get("USAGE_BATCH_SIZE", "500"))
+USAGE_FLUSH_SECONDS = float(os.environ.get("USAGE_FLUSH_SECONDS", "2"))
+# Heaviest users listed in the admin usage report
+USAGE_TOP_USERS = int(os.environ.get("USAGE_TOP_USERS", "20"))
+# Events held per worker while the database is slow; beyond that new events are dropped
+USAGE_QUEUE_SIZE = int(os.environ.get("USAGE_QUEUE_SIZE", "20000"))
+
+
+class UsageRecorder:
+    """
+    Write-behind log of chat completions. `record` only puts the event on an
+    in-process queue; a background task writes the queue to usage_events in
+    batched multi-row inserts and updates the daily rollups in the same
+    transaction, so a chat turn never waits on the database. Events still
+    queued when the worker stops are written on shutdown.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = USAGE_ENABLED,
+        batch_size: int = USAGE_BATCH_SIZE,
+        flush_seconds: float = USAGE_FLUSH_SECONDS,
+        queue_size: int = USAGE_QUEUE_SIZE,
+    ):
+        self.enabled = enabled
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.queue_size = queue_size
+        self.recorded = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+        self.last_flush_ms = 0.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: List[dict] = []
+        self._writing: Optional[asyncio.Future] = None
+
+    def start(self):
+        if not self.enabled:
+            return
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._pending = []
+            self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        # A task left over from another event loop cannot be awaited here
+        if task.get_loop() is not asyncio.get_running_loop():
+            return
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        if self._writing is not None and not self._writing.done():
+            await self._writing
+        remaining, self._pending = self._pending, []
+        while not self._queue.empty():
+            remaining.append(self._queue.get_nowait())
+        for i in range(0, len(remaining), self.batch_size):
+            await self._write(remaining[i:i + self.batch_size])
+
+    def record(
+        self,
+        user_id,
+        model: str,
+        endpoint: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        ttft: Optional[float],
+        duration: float,
+    ):
+        """Queues one completion; `ttft` and `duration` are in seconds. Never blocks."""
+        if not self.enabled:
+            return
+        event = {
+            "user_id": user_id,
+            "model": model,
+            "endpoint": endpoint,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "ttft_ms": round(ttft * 1000, 1) if ttft is not None else None,
+            "duration_ms": round(duration * 1000, 1),
+            "created_at": datetime.utcnow(),
+        }
+        try:
+            if self._queue is None:
+                raise asyncio.QueueFull
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(f"Usage queue full or not started, {self.dropped} events dropped so far")
+            return
+        self.recorded += 1
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for the first event, then fill the batch until it is full or the deadline passes
+            self._pending.append(await self._queue.get())
+            deadline = loop.time() + self.flush_seconds
+            while len(self._pending) < self.batch_size:
+                while not self._queue.empty() and len(self._pending) < self.batch_size:
+                    self._pending.append(self._queue.get_nowait())
+                timeout = deadline - loop.time()
+                if len(self._pending) >= self.batch_size or timeout <= 0:
+                    break
+                try:
+                    self._pending.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            batch, self._pending = self._pending, []
+            # Shielded so a shutdown in the middle of a write lets it finish instead of losing the batch
+            self._writing = asyncio.ensure_future(self._write(batch))
+            await asyncio.shield(self._writing)
+
+    async def _write(self, batch: List[dict]):
+        started = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as db:
+                await async_crud.write_usage_events(db, batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Could not write {len(batch)} usage events: {e!r}")
+            return
+        self.written += len(batch)
+        self.batches += 1
+        self.last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "batch_size": self.batch_size,
+            "flush_seconds": self.flush_seconds,
+            "queued": self._queue.qsize() + len(self._pending) if self._queue is not None else 0,
+            "recorded": self.recorded,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+usage_recorder = UsageRecorder()
+
+
+_COUNTERS = ("requests", "prompt_tokens", "completion_tokens", "ttft_ms_total", "ttft_count", "duration_ms_total")
+
+
+def _add(totals: dict, row) -> dict:
+    # PostgreSQL returns SUM() over BIGINT as Decimal
+    values = {name: float(getattr(row, name) or 0) for name in _COUNTERS}
+    for name, value in values.items():
+        totals[name] = totals.get(name, 0) + value
+    # Estimated at the catalog's current prices
+    spec = model_catalog.get(row.model)
+    if spec is not None:
+        cost = (values["prompt_tokens"] * spec.input_cost + values["completion_tokens"] * spec.output_cost) / 1_000_000
+        totals["cost_usd"] = totals.get("cost_usd", 0.0) + cost
+    return totals
+
+
+def _summary(totals: dict, **fields) -> dict:
+    prompt, completion = int(totals.get("prompt_tokens", 0)), int(totals.get("completion_tokens", 0))
+    return {
+        **fields,
+        "requests": int(totals.get("requests", 0)),
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "total_tokens": prompt + completion,
+        "cost_usd": round(totals.get("cost_usd", 0.0), 4),
+        "avg_ttft_ms": round(totals["ttft_ms_total"] / totals["ttft_count"], 1) if totals.get("ttft_count") else None,
+        "avg_duration_ms": round(totals["duration_ms_total"] / totals["requests"], 1) if totals.get("requests") else None,
+    }
+
+
+async def usage_report(db: AsyncSession, days: int = 30, user_id=None, top_users: int = USAGE_TOP_USERS) -> dict:
+    """Totals per day, model and heaviest user over the last `days` days (UTC), read from the daily rollups."""
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    overall: dict = {}
+    by_day: Dict[object, dict] = {}
+    by_model: Dict[str, dict] = {}
+    for row in await async_crud.usage_by_day_and_model(db, since, user_id=user_id):
+        _add(overall, row)
+        _add(by_day.setdefault(row.day, {}), row)
+        _add(by_model.setdefault(row.model, {}), row)
+    by_user: Dict[object, dict] = {}
+    usernames = {}
+    for row in await async_crud.usage_by_user_and_model(db, since, limit=top_users, user_id=user_id):
+        usernames[row.user_id] = row.username
+        _add(by_user.setdefault(row.user_id, {}), row)
+    users = [
+        _summary(totals, user_id=str(uid), username=usernames[uid])
+        for uid, totals in by_user.items()
+    ]
+    users.sort(key=lambda entry: entry["total_tokens"], reverse=True)
+    return {
+        "since": since.isoformat(),
+        "days": days,
+        "totals": _summary(overall),
+        "daily": [_summary(totals, day=day.isoformat()) for day, totals in sorted(by_day.items())],
+        "models": sorted(
+            (_summary(totals, model=model) for model, totals in by_model.items()),
+            key=lambda entry: entry["total_tokens"], reverse=True,
+        ),
+        "users": users,
+    }
@@ -0,0 +1,157 @@
+"""
+Local stand-ins for the LLM providers, for load testing without real quota.
+
+Serves the OpenAI chat-completions protocol (used for Groq and DeepSeek)
+and the Gemini generateContent protocol from one process, streaming
+synthetic tokens with configurable latency, rate, jitter and error rate.
+
+    python benchmarks/fake_providers.py --port 9100 --ttft-ms 300 --tokens-per-second 80
+
+Then start the app against it:
+
+    GROQ_BASE_URL=http://127.0.0.1:9100/v1 GROQ_API_KEY=fake \\
+    DEEPSEEK_BASE_URL=http://127.0.0.1:9100/v1 DEEPSEEK_API_KEY=fake \\
+    GEMINI_BASE_URL=http://127.0.0.1:9100 GEMINI_API_KEY=fake \\
+    uvicorn app.main:app --port 8009
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "the model streams tokens back to the client while the server keeps many "
+    "connections open and every chunk travels through the proxy to the browser"
+).split()
+
+
+class FakeConfig:
+    def __init__(self, ttft_ms=300.0, tokens_per_second=80.0, tokens=200, jitter=0.2, error_rate=0.0, seed=None):
+        self.ttft = ttft_ms / 1000
+        self.tokens_per_second = tokens_per_second
+        self.tokens = tokens
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+    def delay(self, base: float) -> float:
+        # Uniform jitter of +/- `jitter` around the base delay
+        return max(0.0, base * (1 + self.random.uniform(-self.jitter, self.jitter)))
+
+    def should_fail(self) -> bool:
+        return self.random.random() < self.error_rate
+
+    async def tokens_stream(self, max_tokens=None):
+        count = min(self.tokens, max_tokens) if max_tokens else self.tokens
+        await asyncio.sleep(self.delay(self.ttft))
+        interval = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+        for i in range(count):
+            if i:
+                await asyncio.sleep(self.delay(interval))
+            yield WORDS[i % len(WORDS)] + " "
+
+
+def build_app(config: FakeConfig) -> FastAPI:
+    app = FastAPI(title="Fake LLM providers")
+    stats = {"requests": 0, "errors": 0, "streams": 0}
+
+    @app.get("/stats")
+    async def read_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        if config.should_fail():
+            stats["errors"] += 1
+            return JSONResponse(status_code=500, content={"error": {"message": "injected failure", "type": "server_error"}})
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", "fake")
+
+        if not body.get("stream"):
+            text = "".join([token async for token in config.tokens_stream(body.get("max_tokens"))])
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            }
+
+        async def events():
+            stats["streams"] += 1
+
+            def chunk(delta, finish_reason=None):
+                return "data: " + json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }) + "\n\n"
+
+            yield chunk({"role": "assistant", "content": ""})
+            async for token in config.tokens_stream(body.get("max_tokens")):
+                yield chunk({"content": token})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    # Gemini: POST /{version}/models/{model}:generateContent or :streamGenerateContent?alt=sse
+    @app.post("/{version}/models/{target}")
+    async def gemini(version: str, target: str, request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        _, _, method = target.partition(":")
+        if config.should_fail():
+            stats["errors"] += 1
+            return JSONResponse(status_code=500, content={"error": {"code": 500, "message": "injected failure", "status": "INTERNAL"}})
+        max_tokens = (body.get("generationConfig") or {}).get("maxOutputTokens")
+
+        def response(text, finish_reason=None):
+            candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+            if finish_reason:
+                candidate["finishReason"] = finish_reason
+            return {"candidates": [candidate]}
+
+        if method == "generateContent":
+            text = "".join([token async for token in config.tokens_stream(max_tokens)])
+            return response(text, "STOP")
+
+        async def events():
+            stats["streams"] += 1
+            async for token in config.tokens_stream(max_tokens):
+                yield "data: " + json.dumps(response(token)) + "\r\n\r\n"
+            yield "data: " + json.dumps(response("", "STOP")) + "\r\n\r\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--ttft-ms", type=float, default=300, help="delay before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=80, help="generation rate after the first token")
+    parser.add_argument("--tokens", type=int, default=200, help="tokens per response (capped by max_tokens)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative +/- jitter applied to every delay")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    config = FakeConfig(args.ttft_ms, args.tokens_per_second, args.tokens, args.jitter, args.error_rate, args.seed)
+    uvicorn.run(build_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
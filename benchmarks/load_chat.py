@@ -0,0 +1,184 @@
+"""
+Chat load generator.
+
+Logs in through /login, then runs concurrent streaming chat sessions
+against a running server and prints a JSON report: TTFT and inter-token
+latency percentiles, token and request throughput, error counts, and the
+event-loop lag seen by the server (from /api/admin/stats) and by this
+client. Meant to run against benchmarks/fake_providers.py, with quotas
+disabled (QUOTA_ENABLED=false) so the limiter does not cap the load.
+
+    python benchmarks/load_chat.py --url http://localhost:8009 \\
+        --concurrency 50 --requests 10 --endpoint /chat/stream --output run.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+
+import httpx
+
+from report import LoopLagProbe, percentiles
+
+
+class Results:
+    def __init__(self):
+        self.ttft = []
+        self.inter_token = []
+        self.durations = []
+        self.tokens = 0
+        self.completed = 0
+        self.errors = {}
+
+    def error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+async def read_plain(response):
+    async for text in response.aiter_text():
+        if text:
+            yield text
+
+
+async def read_events(response):
+    buffer = ""
+    async for text in response.aiter_text():
+        buffer += text
+        while "\n\n" in buffer:
+            block, buffer = buffer.split("\n\n", 1)
+            event, data = None, ""
+            for line in block.split("\n"):
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    data += line[5:].strip()
+            if event == "delta":
+                yield json.loads(data)["text"]
+            elif event == "error":
+                raise RuntimeError(json.loads(data).get("detail", "stream error"))
+
+
+async def one_request(client, args, session_id: int, index: int, results: Results):
+    prompt = "Write a short story." if args.identical else f"Write a short story. ({session_id}-{index}-{uuid.uuid4().hex[:8]})"
+    body = {
+        "messages": [{"role": "user", "content": prompt}],
+        "model": args.model,
+        "max_tokens": args.max_tokens,
+        "stream": True,
+        "cache": not args.no_cache,
+    }
+    reader = read_events if args.endpoint == "/chat/stream" else read_plain
+    started = time.perf_counter()
+    last = None
+    text = []
+    try:
+        async with client.stream("POST", args.endpoint, json=body) as response:
+            if response.status_code != 200:
+                results.error(f"http_{response.status_code}")
+                await response.aread()
+                return
+            async for chunk in reader(response):
+                now = time.perf_counter()
+                if last is None:
+                    results.ttft.append(now - started)
+                else:
+                    results.inter_token.append(now - last)
+                last = now
+                text.append(chunk)
+    except (httpx.HTTPError, RuntimeError) as e:
+        results.error(type(e).__name__)
+        return
+    if last is None:
+        results.error("empty_response")
+        return
+    results.durations.append(time.perf_counter() - started)
+    # Whitespace-separated words approximate tokens (the fake providers emit one word per token)
+    results.tokens += len("".join(text).split())
+    results.completed += 1
+
+
+async def session(client, args, session_id: int, results: Results):
+    for index in range(args.requests):
+        await one_request(client, args, session_id, index, results)
+
+
+async def server_stats(client, token):
+    try:
+        response = await client.get("/api/admin/stats", headers={"Authorization": f"Bearer {token}"})
+        return response.json() if response.status_code == 200 else None
+    except httpx.HTTPError:
+        return None
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 2, max_keepalive_connections=args.concurrency + 2)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        credentials = {"username": args.username, "password": args.password}
+        response = await client.post("/login", data=credentials)
+        if "access_token" not in client.cookies:
+            raise SystemExit(f"Login failed (status {response.status_code})")
+        token = (await client.post("/token", data=credentials)).json()["access_token"]
+
+        results = Results()
+        probe = LoopLagProbe()
+        probe.start()
+        started = time.perf_counter()
+        await asyncio.gather(*(session(client, args, i, results) for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        await probe.stop()
+        stats = await server_stats(client, token)
+
+    attempted = args.concurrency * args.requests
+    report = {
+        "config": {
+            "url": args.url,
+            "endpoint": args.endpoint,
+            "model": args.model,
+            "concurrency": args.concurrency,
+            "requests_per_session": args.requests,
+            "max_tokens": args.max_tokens,
+            "identical_prompts": args.identical,
+        },
+        "requests": attempted,
+        "completed": results.completed,
+        "errors": results.errors,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(results.completed / elapsed, 2),
+        "tokens": results.tokens,
+        "tokens_per_s": round(results.tokens / elapsed, 1),
+        "ttft_ms": percentiles(results.ttft),
+        "inter_token_ms": percentiles(results.inter_token),
+        "request_duration_ms": percentiles(results.durations),
+        "server_loop_lag_ms": stats.get("event_loop") if stats else None,
+        "client_loop_lag_ms": percentiles(probe.samples),
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8009")
+    parser.add_argument("--username", default=os.environ.get("ADMIN_USERNAME", "admin"))
+    parser.add_argument("--password", default=os.environ.get("ADMIN_PASSWORD"))
+    parser.add_argument("--endpoint", default="/chat", choices=["/chat", "/chat/stream"])
+    parser.add_argument("--model", default="llama-3.3-70b-versatile")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent chat sessions")
+    parser.add_argument("--requests", type=int, default=5, help="sequential requests per session")
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--identical", action="store_true", help="send the same prompt every time (exercises coalescing)")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the response cache")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Login throughput benchmark.
+
+Fires concurrent POST /token requests at a running server while probing
+/health in the background. With bcrypt on the event loop the probe stalls
+behind every login; with the bounded hashing pool it stays flat, and an
+overloaded pool answers 503 instead of queueing.
+
+    python benchmarks/login_bench.py --url http://localhost:8000 \
+        --username admin --password secret --requests 200 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+import httpx
+
+from report import percentiles
+
+
+async def login_worker(client, queue, args, latencies, statuses):
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        started = time.perf_counter()
+        response = await client.post("/token", data={"username": args.username, "password": args.password})
+        latencies.append(time.perf_counter() - started)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+
+async def probe(client, stop, latencies, interval):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/health")
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        queue = asyncio.Queue()
+        for _ in range(args.requests):
+            queue.put_nowait(None)
+        login_latencies, probe_latencies, statuses = [], [], {}
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(client, stop, probe_latencies, args.probe_interval))
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            login_worker(client, queue, args, login_latencies, statuses)
+            for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe_task
+
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "logins_per_s": round(statuses.get(200, 0) / elapsed, 2),
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "login_latency_ms": percentiles(login_latencies),
+        "health_latency_ms": percentiles(probe_latencies),
+        "health_latency_mean_ms": round(statistics.mean(probe_latencies) * 1000, 2) if probe_latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--username", default=os.environ.get("ADMIN_USERNAME", "admin"))
+    parser.add_argument("--password", default=os.environ.get("ADMIN_PASSWORD"))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--probe-interval", type=float, default=0.01)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
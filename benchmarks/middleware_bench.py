@@ -0,0 +1,158 @@
+"""
+Auth middleware overhead benchmark.
+
+Calls a small ASGI app in-process (no sockets, no server) with three
+middleware setups and reports the mean time per request for a static file
+and for a streamed response of many small chunks:
+
+    none    - no auth middleware
+    legacy  - the previous BaseHTTPMiddleware implementation
+    asgi    - app.middleware.AuthMiddleware
+
+    python benchmarks/middleware_bench.py --requests 2000 --chunks 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from jose import jwt
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, RedirectResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+
+from app.middleware import AuthMiddleware
+
+SECRET_KEY = "benchmark-secret"
+ALGORITHM = "HS256"
+PUBLIC_PATHS = ['/', '/login', '/register', '/token', '/static', '/health']
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "..", "app", "static")
+
+
+class LegacyAuthMiddleware(BaseHTTPMiddleware):
+    """The BaseHTTPMiddleware implementation this benchmark compares against."""
+
+    async def dispatch(self, request: Request, call_next):
+        public_paths = ['/', '/login', '/register', '/token', '/static', '/health']
+        path = request.url.path
+        is_public = any(path == p or path.startswith(f"{p}/") for p in public_paths)
+        if is_public:
+            return await call_next(request)
+        token = request.cookies.get("access_token")
+        if not token:
+            if request.headers.get("accept") == "application/json":
+                return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+            return RedirectResponse(url=f"/login?redirect={quote(str(request.url.path))}", status_code=302)
+        return await call_next(request)
+
+
+def build_app(variant: str, chunks: int):
+    async def stream(request):
+        async def body():
+            for _ in range(chunks):
+                yield "token "
+        return StreamingResponse(body(), media_type="text/plain")
+
+    app = Starlette(routes=[
+        Route("/chat", stream, methods=["POST"]),
+        Mount("/static", StaticFiles(directory=STATIC_DIR), name="static"),
+    ])
+    if variant == "legacy":
+        app.add_middleware(LegacyAuthMiddleware)
+    elif variant == "asgi":
+        app.add_middleware(
+            AuthMiddleware,
+            public_paths=PUBLIC_PATHS,
+            decode_token=lambda token: jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]),
+            anonymous_paths=['/static'],
+        )
+    return app
+
+
+async def call(app, method: str, path: str, cookie: bytes) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"cookie", cookie)],
+        "client": ("127.0.0.1", 1234),
+        "server": ("bench", 80),
+    }
+    sent = False
+    body_parts = 0
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        nonlocal body_parts
+        if message["type"] == "http.response.body":
+            body_parts += 1
+
+    await app(scope, receive, send)
+    return body_parts
+
+
+async def measure(app, method, path, cookie, requests):
+    for _ in range(min(50, requests)):
+        await call(app, method, path, cookie)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await call(app, method, path, cookie)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def run(args):
+    token = jwt.encode({"sub": "bench", "exp": int(time.time()) + 3600}, SECRET_KEY, algorithm=ALGORITHM)
+    cookie = f'access_token="Bearer {token}"'.encode()
+    routes = {
+        "static": ("GET", "/static/js/chat.js"),
+        "stream": ("POST", "/chat"),
+    }
+    results = {}
+    for variant in ("none", "legacy", "asgi"):
+        app = build_app(variant, args.chunks)
+        results[variant] = {
+            name: round(await measure(app, method, path, cookie, args.requests), 1)
+            for name, (method, path) in routes.items()
+        }
+    overhead = {
+        variant: {name: round(results[variant][name] - results["none"][name], 1) for name in routes}
+        for variant in ("legacy", "asgi")
+    }
+    return {
+        "requests": args.requests,
+        "stream_chunks": args.chunks,
+        "mean_us_per_request": results,
+        "overhead_us_vs_none": overhead,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--chunks", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Helpers shared by the benchmark scripts."""
+import asyncio
+import time
+
+
+def percentiles(samples, scale: float = 1000):
+    """p50/p95/p99/max of `samples` (seconds), scaled to milliseconds by default."""
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(samples)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * scale, 2)
+
+    return {"p50": pick(50), "p95": pick(95), "p99": pick(99), "max": round(ordered[-1] * scale, 2)}
+
+
+class LoopLagProbe:
+    """
+    Samples this process's event-loop lag while a benchmark runs, so a
+    saturated load generator is not mistaken for a slow server.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,37 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Settings read at import time by app.db and app.main; a throwaway SQLite file keeps tests off PostgreSQL
+_tmp = tempfile.mkdtemp(prefix="chatbot-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/test.db")
+os.environ.setdefault("SECRET_KEY", "test-secret-key-" + "x" * 32)
+os.environ.setdefault("ADMIN_USERNAME", "admin")
+os.environ.setdefault("ADMIN_PASSWORD", "admin-password")
+os.environ.setdefault("RESPONSE_CACHE_DIR", f"{_tmp}/responses")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def install_model(monkeypatch):
+    """Routes a model id to stub provider handlers for the duration of a test."""
+    from app.llm_service import router
+    from app.llm_service.catalog import model_catalog, ModelSpec
+
+    def install(model_id, handler=None, async_handler=None, provider="stub", streaming=True,
+                context_window=131072, max_output=8192):
+        spec = ModelSpec(model_id, provider, model_id, context_window, max_output, 0, 0, None, streaming, ())
+        monkeypatch.setitem(model_catalog.models, model_id, spec)
+        monkeypatch.setitem(router.ROUTES, model_id, router.Route(provider, handler, async_handler, streaming))
+        return spec
+
+    return install
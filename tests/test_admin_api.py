@@ -0,0 +1,18 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as client:
+        response = client.post("/login", data={"username": "admin", "password": "admin-password"}, follow_redirects=False)
+        assert response.status_code == 303
+        yield client
+
+
+@pytest.mark.parametrize("target", [{}, {"status": None, "q": None}, {"q": "   "}])
+def test_bulk_action_rejects_a_filter_that_matches_everyone(client, target):
+    response = client.post("/users/bulk", json={"action": "promote", "filter": target})
+    assert response.status_code == 422
@@ -0,0 +1,72 @@
+import time
+import uuid
+
+import pytest
+
+from app import auth_cache
+
+
+class FakeUser:
+    def __init__(self, username):
+        self.id = uuid.uuid4()
+        self.username = username
+        self.is_admin = False
+        self.is_active = True
+        self.is_approved = True
+
+
+@pytest.fixture
+def small_cache(monkeypatch):
+    cache = auth_cache.TTLCache(max_entries=3, on_evict=auth_cache._forget_user_id)
+    monkeypatch.setattr(auth_cache, "_user_cache", cache)
+    monkeypatch.setattr(auth_cache, "_user_ids", {})
+    return cache
+
+
+def test_id_index_is_evicted_with_the_lru_entries(small_cache):
+    users = [FakeUser(f"user{i}") for i in range(50)]
+    for user in users:
+        auth_cache.put_user(user)
+
+    assert len(small_cache) == 3
+    assert set(auth_cache._user_ids) == {user.id for user in users[-3:]}
+
+
+def test_id_index_is_evicted_when_an_entry_expires(small_cache, monkeypatch):
+    user = FakeUser("alice")
+    auth_cache.put_user(user)
+    monkeypatch.setattr(time, "monotonic", lambda: 1e12)
+    assert auth_cache.get_user("alice") is None
+    assert auth_cache._user_ids == {}
+
+
+def test_invalidate_user_drops_snapshot_and_index(small_cache):
+    user = FakeUser("bob")
+    auth_cache.put_user(user)
+    assert auth_cache.get_user("bob").id == user.id
+
+    auth_cache.invalidate_user(user.id)
+    assert auth_cache.get_user("bob") is None
+    assert auth_cache._user_ids == {}
+    # Unknown ids are ignored
+    auth_cache.invalidate_user(uuid.uuid4())
+
+
+def test_refreshing_a_user_keeps_its_index_entry(small_cache):
+    user = FakeUser("carol")
+    auth_cache.put_user(user)
+    auth_cache.put_user(user)
+    assert auth_cache._user_ids == {user.id: "carol"}
+
+
+def test_token_payloads_are_decoded_once_until_they_expire(monkeypatch):
+    monkeypatch.setattr(auth_cache, "_token_cache", auth_cache.TTLCache())
+    calls = []
+
+    def decode(token):
+        calls.append(token)
+        return {"sub": "alice", "exp": time.time() + 3600}
+
+    for _ in range(5):
+        assert auth_cache.decode_token("t1", decode)["sub"] == "alice"
+    assert calls == ["t1"]
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+
+from app import batch
+from app.batch import BatchRunner
+from app.quota import QuotaExceeded
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(batch, "CHAT_BATCH_BACKOFF_BASE", 0.001)
+    monkeypatch.setattr(batch, "CHAT_BATCH_BACKOFF_MAX", 0.01)
+
+
+async def collect(runner, jobs, run, concurrency=None):
+    return [json.loads(line) async for line in runner.stream(jobs, run, concurrency)]
+
+
+async def test_lines_come_in_finish_order_tagged_with_the_index():
+    async def run(delay):
+        await asyncio.sleep(delay)
+        return {"response": str(delay)}
+
+    lines = await collect(BatchRunner(concurrency=3), [0.06, 0.0, 0.03], run)
+    assert [line["index"] for line in lines[:-1]] == [1, 2, 0]
+    assert all(line["status"] == "ok" and line["attempts"] == 1 for line in lines[:-1])
+    assert lines[-1]["summary"]["succeeded"] == 3
+
+
+async def test_batch_and_global_concurrency_caps():
+    running = peak = 0
+
+    async def run(job):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return {}
+
+    await collect(BatchRunner(concurrency=8), list(range(10)), run, concurrency=2)
+    assert peak == 2
+
+    # Two batches of 4 at once share a global limit of 3
+    peak = 0
+    runner = BatchRunner(concurrency=4, global_concurrency=3)
+    await asyncio.gather(collect(runner, list(range(6)), run), collect(runner, list(range(6)), run))
+    assert peak == 3
+
+
+async def test_failures_are_retried_but_invalid_input_is_not():
+    calls = {}
+
+    async def run(job):
+        calls[job] = calls.get(job, 0) + 1
+        if job == "flaky" and calls[job] < 3:
+            raise ConnectionError("reset")
+        if job == "invalid":
+            raise ValueError("bad messages")
+        if job == "down":
+            raise ConnectionError("still down")
+        return {}
+
+    runner = BatchRunner(max_attempts=3)
+    lines = {line.get("index"): line for line in await collect(runner, ["flaky", "invalid", "down"], run)}
+    assert lines[0]["status"] == "ok" and lines[0]["attempts"] == 3
+    assert lines[1]["status"] == "error" and lines[1]["attempts"] == 1
+    assert lines[2]["status"] == "error" and lines[2]["attempts"] == 3
+    assert lines[2]["error"] == "still down"
+    assert calls == {"flaky": 3, "invalid": 1, "down": 3}
+
+
+async def test_quota_rejections_are_waited_out_without_using_attempts():
+    rejections = 0
+
+    async def run(job):
+        nonlocal rejections
+        if rejections < 5:
+            rejections += 1
+            raise QuotaExceeded("requests_per_minute", 0.01)
+        return {"response": "ok"}
+
+    runner = BatchRunner(max_attempts=2)
+    lines = await collect(runner, ["job"], run)
+    assert lines[0]["status"] == "ok"
+    assert lines[0]["attempts"] == 1
+    assert runner.stats()["paced"] == 5
+    assert runner.stats()["retries"] == 0
+
+
+async def test_quota_waits_are_bounded(monkeypatch):
+    monkeypatch.setattr(batch, "CHAT_BATCH_MAX_PACING_WAIT", 0.05)
+
+    async def always_limited(job):
+        raise QuotaExceeded("requests_per_minute", 0.02)
+
+    async def far_off(job):
+        raise QuotaExceeded("tokens_per_minute", batch.CHAT_BATCH_MAX_RETRY_WAIT + 1)
+
+    for run in (always_limited, far_off):
+        lines = await asyncio.wait_for(collect(BatchRunner(), ["job"], run), 1)
+        assert lines[0]["status"] == "error"
+        assert lines[0]["attempts"] == 0
+        assert lines[0]["error"].startswith("Quota exceeded")
+
+
+async def test_closing_the_stream_cancels_jobs_still_running():
+    cancelled = []
+
+    async def run(job):
+        try:
+            await asyncio.sleep(0 if job == 0 else 10)
+        except asyncio.CancelledError:
+            cancelled.append(job)
+            raise
+        return {}
+
+    runner = BatchRunner(concurrency=3)
+    stream = runner.stream([0, 1, 2], run)
+    assert json.loads(await stream.__anext__())["index"] == 0
+    await stream.aclose()
+    assert sorted(cancelled) == [1, 2]
+    assert runner.stats()["jobs_running"] == 0
+    assert runner.stats()["active_batches"] == 0
+
+
+async def test_batch_job_forwards_temperature_to_the_provider(install_model, monkeypatch):
+    import app.main as main
+    from app.llm_service.coalesce import coalescer
+    from app.schemas import ChatBatchJob
+
+    monkeypatch.setattr(coalescer, "enabled", False)
+    seen = []
+
+    async def handler(messages, max_tokens, model_id, stream=True, temperature=None):
+        seen.append(temperature)
+
+        async def chunks():
+            yield "warm"
+        return chunks()
+
+    install_model("batch-model", async_handler=handler)
+
+    class User:
+        id = uuid.uuid4()
+
+    for temperature in (0.2, None):
+        job = ChatBatchJob(model="batch-model", messages=[{"role": "user", "content": "hi"}], temperature=temperature, cache=False)
+        result = await main.run_batch_job(User(), job)
+        assert result["response"] == "warm"
+    assert seen == [0.2, None]
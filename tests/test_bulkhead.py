@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from app.llm_service.bulkhead import Bulkhead, BulkheadFull, PermitStream, with_defaults
+from app.llm_service.catalog import Concurrency
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_limit_then_fifo_queue_then_rejection():
+    bulkhead = Bulkhead("test", Concurrency(2, 2, 5))
+    await bulkhead.acquire()
+    await bulkhead.acquire()
+
+    order = []
+
+    async def wait(name):
+        await bulkhead.acquire()
+        order.append(name)
+
+    first = asyncio.ensure_future(wait("first"))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(wait("second"))
+    await asyncio.sleep(0)
+    assert bulkhead.stats()["queued"] == 2
+
+    with pytest.raises(BulkheadFull) as info:
+        await bulkhead.acquire()
+    assert info.value.reason == "queue_full"
+    assert info.value.retry_after >= 1
+
+    bulkhead.release()
+    await first
+    bulkhead.release()
+    await second
+    assert order == ["first", "second"]
+    assert bulkhead.active == 2
+
+
+async def test_queue_timeout_rejects_and_leaves_no_waiter_behind():
+    bulkhead = Bulkhead("test", Concurrency(1, 5, 0.05))
+    await bulkhead.acquire()
+    with pytest.raises(BulkheadFull) as info:
+        await bulkhead.acquire()
+    assert info.value.reason == "queue_timeout"
+    assert bulkhead.stats()["queued"] == 0
+    bulkhead.release()
+    assert bulkhead.active == 0
+
+
+async def test_cancelled_waiter_does_not_swallow_the_next_slot():
+    bulkhead = Bulkhead("test", Concurrency(1, 5, 5))
+    await bulkhead.acquire()
+    cancelled = asyncio.ensure_future(bulkhead.acquire())
+    await asyncio.sleep(0)
+    after = asyncio.ensure_future(bulkhead.acquire())
+    await asyncio.sleep(0)
+
+    cancelled.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+    assert bulkhead.stats()["queued"] == 1
+
+    bulkhead.release()
+    await asyncio.wait_for(after, 1)
+    assert bulkhead.active == 1
+    bulkhead.release()
+    assert bulkhead.active == 0
+
+
+async def test_permit_stream_releases_on_exhaustion_and_on_close():
+    bulkhead = Bulkhead("test", Concurrency(2, 0, 1))
+
+    async def chunks():
+        yield "a"
+        yield "b"
+
+    await bulkhead.acquire()
+    assert [c async for c in PermitStream(chunks(), bulkhead)] == ["a", "b"]
+    assert bulkhead.active == 0
+
+    class Upstream:
+        closed = False
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            return "x"
+
+        async def aclose(self):
+            self.closed = True
+
+    upstream = Upstream()
+    await bulkhead.acquire()
+    stream = PermitStream(chunks(), bulkhead, upstream=upstream)
+    # Closed before any read: the slot comes back and the provider stream is closed
+    await stream.aclose()
+    await stream.aclose()
+    assert bulkhead.active == 0
+    assert upstream.closed
+
+
+def test_missing_fields_take_the_defaults():
+    limit, queue, timeout = with_defaults(Concurrency(4, None, None))
+    assert limit == 4
+    assert queue is not None and timeout is not None
+
+
+def test_bulkhead_full_can_be_copied():
+    import copy
+    error = BulkheadFull("groq", "queue_full", 3.0)
+    clone = copy.copy(error)
+    assert (clone.name, clone.reason, clone.retry_after, str(clone)) == ("groq", "queue_full", 3.0, str(error))
@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.llm_service.cache import DiskBackend, MemoryBackend, ResponseCache
+
+
+def disk_bytes(backend: DiskBackend) -> int:
+    return sum(p.stat().st_size for p in backend.directory.glob("*.json"))
+
+
+def test_disk_cap_counts_encoded_bytes(tmp_path):
+    # 300 characters, but 900 bytes once encoded
+    chunks = ["€" * 300]
+    backend = DiskBackend(ttl=60, max_bytes=600, directory=str(tmp_path))
+    backend.set("wide", chunks)
+    assert backend.get("wide") is None
+    assert backend.size == 0
+
+    roomy = DiskBackend(ttl=60, max_bytes=2000, directory=str(tmp_path / "roomy"))
+    roomy.set("wide", chunks)
+    assert roomy.get("wide") == chunks
+    assert roomy.size == disk_bytes(roomy)
+
+
+def test_disk_size_stays_exact_under_concurrent_writes(tmp_path):
+    backend = DiskBackend(ttl=60, max_bytes=20_000, directory=str(tmp_path))
+
+    def write(i):
+        # Overlapping keys, so writers replace each other's files
+        backend.set(f"key-{i % 25}", [f"reply {i} " * (i % 7 + 1)])
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(write, range(400)))
+
+    assert backend.size == disk_bytes(backend)
+    assert backend.size <= backend.max_bytes
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_disk_eviction_keeps_size_under_the_cap(tmp_path):
+    backend = DiskBackend(ttl=60, max_bytes=500, directory=str(tmp_path))
+    for i in range(20):
+        backend.set(f"key-{i}", ["x" * 100])
+    assert backend.size == disk_bytes(backend) <= 500
+    assert backend.evictions > 0
+    assert backend.get("key-19") == ["x" * 100]
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(ttl=60, max_bytes=30)
+    backend.set("a", ["a" * 10])
+    backend.set("b", ["b" * 10])
+    backend.get("a")
+    backend.set("c", ["c" * 15])
+    assert backend.get("b") is None
+    assert backend.get("a") == ["a" * 10]
+    assert backend.size == 25
+
+
+@pytest.mark.anyio
+async def test_record_stores_complete_replies_only():
+    cache = ResponseCache(enabled=True, backend="memory")
+
+    async def upstream():
+        yield "Hello"
+        yield " world"
+
+    assert [c async for c in cache.record("full", upstream())] == ["Hello", " world"]
+    assert await cache.get("full") == ["Hello", " world"]
+
+    partial = cache.record("partial", upstream())
+    assert await partial.__anext__() == "Hello"
+    await partial.aclose()
+    assert await cache.get("partial") is None
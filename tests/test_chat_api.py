@@ -0,0 +1,80 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.llm_service.bulkhead import Bulkhead, bulkheads
+from app.llm_service.catalog import Concurrency
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as client:
+        response = client.post("/login", data={"username": "admin", "password": "admin-password"}, follow_redirects=False)
+        assert response.status_code == 303
+        yield client
+
+
+@pytest.fixture
+def full_model(install_model, monkeypatch):
+    opened = []
+
+    async def handler(messages, max_tokens, model_id, stream=True, temperature=None):
+        opened.append(model_id)
+
+        async def chunks():
+            yield "never"
+        return chunks()
+
+    install_model("full-model", async_handler=handler, provider="groq")
+    # One slot, no queue, and the slot is taken
+    bulkhead = Bulkhead("full-model", Concurrency(1, 0, 4))
+    bulkhead._admit(0.0)
+    monkeypatch.setitem(bulkheads._by_model, "full-model", bulkhead)
+    return opened
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/chat", {"stream": True}),
+    ("/chat/stream", {}),
+])
+def test_full_bulkhead_is_a_503_before_the_stream_starts(client, full_model, path, body):
+    payload = {"messages": [{"role": "user", "content": "hi"}], "model": "full-model", "cache": False, **body}
+    response = client.post(path, json=payload)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "4"
+    assert "full-model" in response.json()["detail"]
+    assert full_model == []
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/chat", {"stream": True}),
+    ("/chat/stream", {}),
+])
+def test_turn_that_never_reaches_a_provider_is_not_saved(client, full_model, path, body):
+    conversation_id = client.post("/api/conversations", json={"title": "retry"}).json()["id"]
+    payload = {"message": "hi", "conversation_id": conversation_id, "model": "full-model", "cache": False, **body}
+    assert client.post(path, json=payload).status_code == 503
+    assert client.get(f"/api/conversations/{conversation_id}").json()["messages"] == []
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/chat", {"stream": True}),
+    ("/chat/stream", {}),
+])
+def test_new_conversation_is_not_created_when_the_provider_never_answers(client, full_model, path, body):
+    def newest():
+        return [c["id"] for c in client.get("/api/conversations").json()["conversations"]]
+
+    before = newest()
+    payload = {"message": "start something", "model": "full-model", "cache": False, **body}
+    assert client.post(path, json=payload).status_code == 503
+    assert newest() == before
+
+
+@pytest.mark.parametrize("max_tokens", ["8192", 0, -5, 1.5, True])
+def test_invalid_max_tokens_is_a_400(client, full_model, max_tokens):
+    payload = {"messages": [{"role": "user", "content": "hi"}], "model": "full-model", "max_tokens": max_tokens}
+    response = client.post("/chat", json=payload)
+    assert response.status_code == 400
+    assert "max_tokens" in response.json()["detail"]
+    assert full_model == []
@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+
+from app.llm_service.coalesce import StreamCoalescer
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeUpstream:
+    """Provider stream that records how far it was read and whether it was closed."""
+
+    def __init__(self, chunks, delay=0.01, error=None):
+        self.chunks = list(chunks)
+        self.delay = delay
+        self.error = error
+        self.pulled = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await asyncio.sleep(self.delay)
+        if self.pulled == len(self.chunks):
+            if self.error is not None:
+                raise self.error
+            raise StopAsyncIteration
+        self.pulled += 1
+        return self.chunks[self.pulled - 1]
+
+    async def aclose(self):
+        self.closed = True
+
+
+def opener(upstream):
+    calls = []
+
+    async def open_stream():
+        calls.append(1)
+        return upstream
+    return open_stream, calls
+
+
+async def test_follower_leaving_before_reading_does_not_cancel_the_leader():
+    coalescer = StreamCoalescer(enabled=True)
+    upstream = FakeUpstream(["a", "b", "c"])
+    open_stream, calls = opener(upstream)
+
+    leader = await coalescer.stream("k", open_stream)
+    follower = await coalescer.stream("k", open_stream)
+    # The follower starts waiting and is cancelled before the leader has read anything
+    waiting = asyncio.ensure_future(follower.__anext__())
+    await asyncio.sleep(0)
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    await follower.aclose()
+
+    assert [chunk async for chunk in leader] == ["a", "b", "c"]
+    assert len(calls) == 1
+    assert coalescer.stats()["followers"] == 1
+
+
+async def test_two_subscribers_share_one_upstream_and_one_leaves_early():
+    coalescer = StreamCoalescer(enabled=True)
+    upstream = FakeUpstream(["a", "b", "c", "d"])
+    open_stream, calls = opener(upstream)
+
+    first = await coalescer.stream("k", open_stream)
+    second = await coalescer.stream("k", open_stream)
+    assert await second.__anext__() == "a"
+    await second.aclose()
+
+    assert [chunk async for chunk in first] == ["a", "b", "c", "d"]
+    assert len(calls) == 1
+    assert upstream.closed
+
+
+async def test_upstream_is_closed_and_reads_stop_once_every_subscriber_leaves():
+    coalescer = StreamCoalescer(enabled=True)
+    upstream = FakeUpstream([str(i) for i in range(100)], delay=0.01)
+    open_stream, _ = opener(upstream)
+
+    first = await coalescer.stream("k", open_stream)
+    second = await coalescer.stream("k", open_stream)
+    assert await first.__anext__() == "0"
+    await first.aclose()
+    await second.aclose()
+    await asyncio.sleep(0.05)
+
+    assert upstream.closed
+    pulled = upstream.pulled
+    await asyncio.sleep(0.05)
+    assert upstream.pulled == pulled < 100
+    assert coalescer.stats()["in_flight"] == 0
+
+
+async def test_each_subscriber_gets_its_own_error_instance():
+    coalescer = StreamCoalescer(enabled=True)
+    original = RuntimeError("upstream failed")
+    open_stream, _ = opener(FakeUpstream(["a"], error=original))
+
+    readers = [await coalescer.stream("k", open_stream) for _ in range(2)]
+    errors = []
+    for reader in readers:
+        with pytest.raises(RuntimeError) as info:
+            async for _ in reader:
+                pass
+        errors.append(info.value)
+
+    assert errors[0] is not errors[1]
+    assert all(error.__cause__ is original for error in errors)
+    assert all(str(error) == "upstream failed" for error in errors)
+
+
+async def test_finished_key_starts_a_new_flight():
+    coalescer = StreamCoalescer(enabled=True)
+    open_stream, calls = opener(FakeUpstream(["a"]))
+    assert [c async for c in await coalescer.stream("k", open_stream)] == ["a"]
+
+    open_again, calls_again = opener(FakeUpstream(["b"]))
+    assert [c async for c in await coalescer.stream("k", open_again)] == ["b"]
+    assert len(calls) == len(calls_again) == 1
+
+
+async def test_open_error_is_raised_from_stream_for_leader_and_follower():
+    from app.llm_service.bulkhead import BulkheadFull
+    coalescer = StreamCoalescer(enabled=True)
+    gate = asyncio.Event()
+
+    async def open_stream():
+        await gate.wait()
+        raise BulkheadFull("groq", "queue_full", 2.0)
+
+    leader = asyncio.ensure_future(coalescer.stream("k", open_stream))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(coalescer.stream("k", open_stream))
+    await asyncio.sleep(0)
+    gate.set()
+
+    errors = []
+    for waiting in (leader, follower):
+        with pytest.raises(BulkheadFull) as info:
+            await waiting
+        errors.append(info.value)
+    assert errors[0] is not errors[1]
+    assert all(error.retry_after == 2.0 for error in errors)
+    assert coalescer.stats()["in_flight"] == 0
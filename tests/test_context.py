@@ -0,0 +1,70 @@
+from app.llm_service.context import ContextManager, CONTEXT_SAFETY_MARGIN, count_message_tokens
+from app.llm_service.context import count_completion_tokens, count_text_tokens
+
+
+def chat(turns, words=15):
+    messages = [{"role": "system", "content": "You are a helpful assistant."}]
+    for i in range(turns):
+        role = "user" if i % 2 == 0 else "assistant"
+        messages.append({"role": role, "content": f"message {i} " + "word " * words})
+    return messages
+
+
+def usable(window):
+    return int(window * (1 - CONTEXT_SAFETY_MARGIN))
+
+
+def test_output_limit_equal_to_the_window_keeps_a_short_chat_whole(install_model):
+    install_model("equal-window", context_window=8192, max_output=8192)
+    manager = ContextManager()
+    messages = chat(6)
+
+    kept, max_tokens = manager.prepare("equal-window", messages, 12800)
+
+    assert kept == messages
+    prompt = count_message_tokens("equal-window", kept)
+    assert prompt + max_tokens <= usable(8192)
+    assert max_tokens == usable(8192) - prompt
+    assert manager.stats()["messages_dropped"] == 0
+
+
+def test_long_history_is_trimmed_to_leave_room_for_the_reply(install_model):
+    install_model("equal-window", context_window=8192, max_output=8192)
+    manager = ContextManager(min_output_tokens=1024)
+    messages = chat(200, words=40)
+
+    kept, max_tokens = manager.prepare("equal-window", messages, None)
+
+    assert kept[0] == messages[0]
+    assert kept[-1] == messages[-1]
+    assert len(kept) < len(messages)
+    prompt = count_message_tokens("equal-window", kept)
+    assert prompt <= usable(8192) - 1024
+    assert 1024 <= max_tokens <= usable(8192) - prompt
+
+
+def test_requested_max_tokens_is_kept_when_it_fits(install_model):
+    install_model("roomy", context_window=131072, max_output=8192)
+    messages = chat(4)
+    assert ContextManager().prepare("roomy", messages, 500) == (messages, 500)
+    assert ContextManager().prepare("roomy", messages, 50_000)[1] == 8192
+
+
+def test_prompt_cap_applies_before_the_window(install_model):
+    install_model("roomy", context_window=131072, max_output=8192)
+    manager = ContextManager(max_prompt_tokens=200)
+    kept, _ = manager.prepare("roomy", chat(40), 1000)
+    assert count_message_tokens("roomy", kept) <= 200 or len(kept) == 2
+
+
+def test_unknown_model_is_passed_through():
+    messages = chat(2)
+    assert ContextManager().prepare("not-in-catalog", messages, 123) == (messages, 123)
+
+
+def test_completions_are_counted_without_filling_the_message_cache():
+    before = count_text_tokens.cache_info().currsize
+    reply = "a generated reply " * 200
+    assert count_completion_tokens("llama-3.3-70b-versatile", reply) == count_text_tokens("llama", reply) > 0
+    assert count_text_tokens.cache_info().currsize == before + 1
+    assert count_completion_tokens("llama-3.3-70b-versatile", "") == 0
@@ -0,0 +1,97 @@
+import pytest
+
+from app.llm_service import clients, gemini
+
+
+class StubStream:
+    def __init__(self, texts):
+        self._chunks = [type("Chunk", (), {"text": text})() for text in texts]
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def close(self):
+        self.closed = True
+
+    def __aiter__(self):
+        return self._aiter()
+
+    async def _aiter(self):
+        for chunk in self._chunks:
+            yield chunk
+
+    async def aclose(self):
+        self.closed = True
+
+
+class StubModels:
+    def __init__(self, client):
+        self._client = client
+
+    def generate_content_stream(self, **kwargs):
+        self._client.upstream_calls += 1
+        return StubStream(["Hello", " world"])
+
+
+class StubAsyncModels:
+    def __init__(self, client):
+        self._client = client
+
+    async def generate_content_stream(self, **kwargs):
+        self._client.upstream_calls += 1
+        return StubStream(["Hello", " async"])
+
+
+class StubClient:
+    built = 0
+
+    def __init__(self, api_key=None, http_options=None):
+        StubClient.built += 1
+        self.upstream_calls = 0
+        self.models = StubModels(self)
+        self.aio = type("Aio", (), {})()
+        self.aio.models = StubAsyncModels(self)
+
+
+@pytest.fixture
+def stub_registry(monkeypatch):
+    StubClient.built = 0
+    monkeypatch.setattr(clients.genai, "Client", StubClient)
+    monkeypatch.setenv(clients.PROVIDER_ENDPOINTS["gemini"][1], "test-key")
+    registry = clients.ClientRegistry()
+    monkeypatch.setattr(gemini, "registry", registry)
+    return registry
+
+
+def test_sync_stream_makes_one_upstream_call_per_request_and_reuses_the_client(stub_registry):
+    messages = [{"role": "user", "content": "hi"}]
+    for _ in range(3):
+        assert "".join(gemini.call_gemini(messages, 64, "gemini-test", stream=True)) == "Hello world"
+
+    client = stub_registry.get_gemini()
+    assert StubClient.built == 1
+    assert client.upstream_calls == 3
+
+
+@pytest.mark.anyio
+async def test_async_stream_makes_one_upstream_call_per_request_and_reuses_the_client(stub_registry):
+    messages = [{"role": "system", "content": "be brief"}, {"role": "user", "content": "hi"}]
+    for _ in range(3):
+        stream = await gemini.call_gemini_async(messages, 64, "gemini-test", stream=True)
+        assert [chunk async for chunk in stream] == ["Hello", " async"]
+
+    client = stub_registry.get_gemini()
+    assert StubClient.built == 1
+    assert client.upstream_calls == 3
+
+
+def test_default_temperature_comes_from_the_model_catalog(monkeypatch):
+    from app.llm_service.catalog import model_catalog
+
+    provider = model_catalog.providers["gemini"]
+    monkeypatch.setitem(model_catalog.providers, "gemini", provider._replace(temperature=0.33))
+    _, config = gemini.build_request([{"role": "user", "content": "hi"}], 16)
+    assert config.temperature == 0.33
+    _, config = gemini.build_request([{"role": "user", "content": "hi"}], 16, temperature=0.0)
+    assert config.temperature == 0.0
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from app.llm_service import hedging
+from app.llm_service.hedging import HedgingPolicy
+from app.llm_service.latency import first_token_latency
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_each_candidate_gets_the_request_fitted_to_its_own_limits(install_model):
+    calls = {}
+
+    async def failing(messages, max_tokens, model_id, stream=True, temperature=None):
+        calls[model_id] = (len(messages), max_tokens)
+        raise RuntimeError("primary is down")
+
+    async def answering(messages, max_tokens, model_id, stream=True, temperature=None):
+        calls[model_id] = (len(messages), max_tokens)
+
+        async def chunks():
+            yield "from the fallback"
+        return chunks()
+
+    install_model("big-primary", async_handler=failing, provider="stub-a", context_window=1_000_000, max_output=65536)
+    install_model("small-fallback", async_handler=answering, provider="stub-b", context_window=8192, max_output=1024)
+    policy = HedgingPolicy(enabled=True, fallbacks={"big-primary": ["small-fallback"]})
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": "word " * 500} for i in range(40)]
+
+    llm_stream = await policy.call(history, 12800, "big-primary")
+    chunks = [chunk async for chunk in llm_stream]
+
+    assert chunks == ["from the fallback"]
+    assert calls["big-primary"] == (40, 12800)
+    sent_messages, sent_max_tokens = calls["small-fallback"]
+    assert sent_messages < 40
+    assert sent_max_tokens <= 1024
+    assert llm_stream.served.model == "small-fallback"
+    assert len(llm_stream.served.messages) == sent_messages
+    assert policy.failovers == 1
+
+
+class FakeStream:
+    """Provider stream that waits `delay` before each chunk; `shielded` finishes a read even when cancelled."""
+
+    def __init__(self, text, delay=0.0, shielded=False):
+        self.text = text
+        self.delay = delay
+        self.shielded = shielded
+        self.sent = False
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.sent or self.closed:
+            raise StopAsyncIteration
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            if not self.shielded:
+                raise
+            # The read had already completed when the cancellation arrived
+        self.sent = True
+        return self.text
+
+    async def aclose(self):
+        self.closed = True
+
+
+@pytest.fixture
+def racing_models(install_model, monkeypatch):
+    monkeypatch.setattr(hedging, "HEDGE_DEFAULT_DEADLINE", 0.05)
+    streams = {}
+
+    def install(model_id, provider, stream):
+        async def handler(messages, max_tokens, model_id, stream_=True, temperature=None):
+            return stream
+        streams[model_id] = stream
+        install_model(model_id, async_handler=handler, provider=provider)
+
+    return install, streams
+
+
+async def test_slow_primary_is_hedged_and_the_first_chunk_wins(racing_models):
+    install, streams = racing_models
+    install("slow-primary", "stub-slow", FakeStream("primary", delay=5))
+    install("fast-fallback", "stub-fast", FakeStream("fallback", delay=0.01))
+    policy = HedgingPolicy(enabled=True, fallbacks={"slow-primary": ["fast-fallback"]})
+    samples = first_token_latency.count("stub-slow")
+
+    llm_stream = await policy.call([{"role": "user", "content": "hi"}], 64, "slow-primary")
+    chunks = [chunk async for chunk in llm_stream]
+
+    assert chunks == ["fallback"]
+    assert llm_stream.served.model == "fast-fallback"
+    assert policy.hedges_started == 1
+    assert policy.wins == {"fast-fallback": 1}
+    # The cancelled primary is closed and still counts towards its provider's latency
+    assert streams["slow-primary"].closed
+    assert first_token_latency.count("stub-slow") == samples + 1
+    assert first_token_latency.percentile("stub-slow", 100) >= 0.05
+
+
+async def test_loser_that_opened_just_before_being_cancelled_is_closed(racing_models):
+    install, streams = racing_models
+    install("late-primary", "stub-late", FakeStream("primary", delay=5, shielded=True))
+    install("quick-fallback", "stub-quick", FakeStream("fallback", delay=0.01))
+    policy = HedgingPolicy(enabled=True, fallbacks={"late-primary": ["quick-fallback"]})
+
+    llm_stream = await policy.call([{"role": "user", "content": "hi"}], 64, "late-primary")
+    assert [chunk async for chunk in llm_stream] == ["fallback"]
+    assert streams["late-primary"].sent
+    assert streams["late-primary"].closed
+    assert streams["quick-fallback"].closed
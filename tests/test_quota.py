@@ -0,0 +1,62 @@
+import pytest
+
+from app.quota import InMemoryQuotaStore, QuotaExceeded, QuotaManager
+
+pytestmark = pytest.mark.anyio
+
+
+def manager(rpm=3, tpm=1000):
+    quota = QuotaManager(store=InMemoryQuotaStore(), enabled=True)
+    quota.default_limits = {"requests_per_minute": rpm, "tokens_per_minute": tpm}
+    return quota
+
+
+async def test_requests_per_minute_bucket_rejects_with_retry_after():
+    quota = manager(rpm=3)
+    for _ in range(3):
+        await quota.check("u1")
+    with pytest.raises(QuotaExceeded) as info:
+        await quota.check("u1")
+    assert info.value.limit == "requests_per_minute"
+    # One request refills in 60 / rpm seconds
+    assert 0 < info.value.retry_after <= 20
+    # Buckets are per user
+    await quota.check("u2")
+    assert quota.stats()["rejected"] == 1
+
+
+async def test_generated_tokens_put_the_bucket_in_debt_until_it_refills():
+    quota = manager(rpm=0, tpm=600)
+    await quota.check("u1")
+    await quota.record_tokens("u1", 900)
+    with pytest.raises(QuotaExceeded) as info:
+        await quota.check("u1")
+    assert info.value.limit == "tokens_per_minute"
+    # 300 tokens of debt at 10 tokens/second
+    assert 29 < info.value.retry_after <= 31
+
+
+async def test_user_override_and_zero_disable_a_limit():
+    quota = manager(rpm=1)
+    await quota.set_user_limits("vip", {"requests_per_minute": 0})
+    for _ in range(10):
+        await quota.check("vip")
+    await quota.set_user_limits("vip", None)
+    assert (await quota.limits_for("vip"))["requests_per_minute"] == 1
+
+
+async def test_disabled_manager_never_rejects():
+    quota = manager(rpm=1)
+    quota.enabled = False
+    for _ in range(5):
+        await quota.check("u1")
+
+
+def test_quota_limits_reject_negative_rates():
+    from pydantic import ValidationError
+    from app.schemas import QuotaLimits
+
+    assert QuotaLimits(requests_per_minute=0).requests_per_minute == 0
+    for field in ("requests_per_minute", "tokens_per_minute"):
+        with pytest.raises(ValidationError):
+            QuotaLimits(**{field: -1})
@@ -0,0 +1,53 @@
+import pytest
+
+from app.llm_service.router import call_llm
+from app.llm_service.cache import make_key
+from app.llm_service import openai_compat
+from app.llm_service.catalog import model_catalog
+
+pytestmark = pytest.mark.anyio
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+async def test_temperature_reaches_the_async_handler(install_model):
+    seen = []
+
+    async def handler(messages, max_tokens, model_id, stream=True, temperature=None):
+        seen.append(temperature)
+
+        async def gen():
+            yield "ok"
+        return gen()
+
+    install_model("stub-async", async_handler=handler)
+    for temperature in (None, 0.0, 1.2):
+        stream = await call_llm(MESSAGES, 16, "stub-async", temperature)
+        assert [chunk async for chunk in stream] == ["ok"]
+    assert seen == [None, 0.0, 1.2]
+
+
+async def test_temperature_reaches_the_sync_handler(install_model):
+    seen = []
+
+    def handler(messages, max_tokens, model_id, stream=True, temperature=None):
+        seen.append(temperature)
+        return iter(["ok"])
+
+    install_model("stub-sync", handler=handler)
+    stream = await call_llm(MESSAGES, 16, "stub-sync", 0.3)
+    assert [chunk async for chunk in stream] == ["ok"]
+    assert seen == [0.3]
+
+
+def test_openai_compatible_request_uses_the_catalog_temperature_by_default():
+    provider = next(name for name, spec in model_catalog.providers.items() if spec.protocol == "openai")
+    model_id = next(spec.id for spec in model_catalog.models.values() if spec.provider == provider)
+    default = openai_compat._request_kwargs(provider, MESSAGES, 16, model_id, True, None)
+    assert default["temperature"] == model_catalog.providers[provider].temperature
+    assert openai_compat._request_kwargs(provider, MESSAGES, 16, model_id, True, 0.0)["temperature"] == 0.0
+
+
+def test_cache_key_depends_on_temperature():
+    assert make_key("m", MESSAGES, 16, 0.2) != make_key("m", MESSAGES, 16, 0.9)
+    assert make_key("m", MESSAGES, 16, None) == make_key("m", [{"role": "user", "content": " hi "}], 16, None)
@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+import pytest
+
+from app.sse import HEARTBEAT, SSEStreamer
+
+pytestmark = pytest.mark.anyio
+
+
+def parse(event: str) -> dict:
+    fields = {}
+    for line in event.strip().splitlines():
+        name, _, value = line.partition(": ")
+        fields[name] = value
+    fields["data"] = json.loads(fields["data"])
+    return fields
+
+
+async def deltas(chunks, delay=0.0, error=None):
+    for chunk in chunks:
+        await asyncio.sleep(delay)
+        yield chunk
+    if error is not None:
+        raise error
+
+
+async def collect(stream):
+    return [event async for event in stream]
+
+
+async def test_first_delta_is_sent_alone_and_the_rest_coalesced():
+    streamer = SSEStreamer(flush_interval_ms=50, flush_bytes=10_000, heartbeat_seconds=10)
+    events = await collect(streamer.stream(deltas([f"w{i} " for i in range(20)]), lambda: {"model": "m"}))
+
+    parsed = [parse(e) for e in events]
+    assert parsed[0]["event"] == "delta" and parsed[0]["data"] == {"text": "w0 "}
+    body = [p for p in parsed if p["event"] == "delta"]
+    assert "".join(p["data"]["text"] for p in body) == "".join(f"w{i} " for i in range(20))
+    assert len(body) < 20
+    assert [int(p["id"]) for p in parsed] == list(range(len(parsed)))
+    done = parsed[-1]
+    assert done["event"] == "done"
+    assert done["data"]["model"] == "m"
+    assert done["data"]["timing"]["deltas"] == 20
+
+
+async def test_byte_threshold_flushes_without_waiting_for_the_window():
+    streamer = SSEStreamer(flush_interval_ms=10_000, flush_bytes=8, heartbeat_seconds=10)
+    events = await collect(streamer.stream(deltas(["a", "bbbb", "cccc", "d"])))
+    texts = [parse(e)["data"]["text"] for e in events if parse(e)["event"] == "delta"]
+    assert texts == ["a", "bbbbcccc", "d"]
+
+
+async def test_heartbeat_is_sent_while_the_provider_is_silent():
+    streamer = SSEStreamer(flush_interval_ms=10, flush_bytes=512, heartbeat_seconds=0.02)
+    events = await collect(streamer.stream(deltas(["late"], delay=0.1)))
+    assert HEARTBEAT in events
+    assert events.index(HEARTBEAT) < next(i for i, e in enumerate(events) if e != HEARTBEAT)
+    assert streamer.stats()["heartbeats"] >= 1
+
+
+async def test_upstream_error_becomes_an_error_event_after_buffered_text():
+    streamer = SSEStreamer(flush_interval_ms=10_000, flush_bytes=10_000, heartbeat_seconds=10)
+    events = await collect(streamer.stream(deltas(["a", "b"], error=RuntimeError("boom"))))
+    parsed = [parse(e) for e in events]
+    assert [p["event"] for p in parsed] == ["delta", "delta", "error"]
+    assert parsed[1]["data"] == {"text": "b"}
+    assert parsed[-1]["data"] == {"detail": "boom"}
+
+
+async def test_closing_the_event_stream_closes_the_upstream():
+    closed = []
+
+    async def upstream():
+        try:
+            for i in range(1000):
+                await asyncio.sleep(0.001)
+                yield str(i)
+        finally:
+            closed.append(True)
+
+    stream = SSEStreamer(heartbeat_seconds=10).stream(upstream())
+    await stream.__anext__()
+    await stream.aclose()
+    assert closed == [True]
@@ -0,0 +1,139 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+
+import app.main as main
+from app.llm_service.bulkhead import bulkheads
+from app.llm_service.coalesce import coalescer
+from app.streaming import CancellableStreamingResponse, stream_cancellations
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeProvider:
+    """Async-iterator provider stream that records how far it was read and whether it was closed."""
+
+    def __init__(self, total=1000, delay=0.005):
+        self.total = total
+        self.delay = delay
+        self.pulled = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed or self.pulled == self.total:
+            raise StopAsyncIteration
+        await asyncio.sleep(self.delay)
+        self.pulled += 1
+        return f"t{self.pulled} "
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeUser:
+    id = uuid.uuid4()
+
+
+async def serve_until(response, chunks_before_disconnect: int):
+    """Runs a response as an ASGI app whose client disconnects after some body chunks."""
+    gone = asyncio.Event()
+    bodies = []
+
+    async def receive():
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            bodies.append(message["body"])
+            if len(bodies) >= chunks_before_disconnect:
+                gone.set()
+                # A dead socket: the write never completes, so the body is parked at a yield, not reading upstream
+                await asyncio.Event().wait()
+
+    scope = {"type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "method": "POST", "path": "/chat"}
+    await asyncio.wait_for(response(scope, receive, send), 5)
+    return bodies
+
+
+@pytest.fixture
+def fake_provider(install_model):
+    provider = FakeProvider()
+
+    async def handler(messages, max_tokens, model_id, stream=True, temperature=None):
+        return provider
+
+    install_model("fake-stream", async_handler=handler, provider="groq")
+    return provider
+
+
+@pytest.mark.parametrize("coalesce", [True, False])
+async def test_disconnect_stops_upstream_reads_and_closes_the_provider(fake_provider, monkeypatch, coalesce):
+    monkeypatch.setattr(coalescer, "enabled", coalesce)
+    cancelled = stream_cancellations.cancelled
+    messages = [{"role": "user", "content": f"hi {uuid.uuid4()}"}]
+
+    llm_stream = await main.open_llm_stream(messages, 64, "fake-stream")
+    reply = main.stream_reply(FakeUser(), llm_stream, time.perf_counter(), messages, 64, "fake-stream", None)
+    bodies = await serve_until(CancellableStreamingResponse(reply, media_type="text/plain", upstream=llm_stream), 5)
+    await asyncio.sleep(0.05)
+
+    assert len(bodies) >= 5
+    assert fake_provider.closed
+    pulled = fake_provider.pulled
+    await asyncio.sleep(0.05)
+    # No reads after the close, and far fewer than the full reply
+    assert fake_provider.pulled == pulled < 50
+    assert stream_cancellations.cancelled == cancelled + 1
+    assert bulkheads.bulkheads["groq"].active == 0
+
+
+async def test_completed_stream_is_not_counted_as_cancelled():
+    async def body():
+        for i in range(3):
+            yield f"{i}"
+
+    cancelled = stream_cancellations.cancelled
+    sent = []
+
+    async def receive():
+        await asyncio.sleep(10)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "method": "GET", "path": "/"}
+    await CancellableStreamingResponse(body(), media_type="text/plain")(scope, receive, send)
+    assert b"".join(m.get("body", b"") for m in sent) == b"012"
+    assert stream_cancellations.cancelled == cancelled
+
+
+@pytest.mark.parametrize("coalesce", [True, False])
+async def test_client_gone_before_the_body_starts_still_closes_the_provider(fake_provider, monkeypatch, coalesce):
+    monkeypatch.setattr(coalescer, "enabled", coalesce)
+    messages = [{"role": "user", "content": f"hi {uuid.uuid4()}"}]
+    llm_stream = await main.open_llm_stream(messages, 64, "fake-stream")
+    assert bulkheads.bulkheads["groq"].active == 1
+    reply = main.stream_reply(FakeUser(), llm_stream, time.perf_counter(), messages, 64, "fake-stream", None)
+    response = CancellableStreamingResponse(reply, media_type="text/plain", upstream=llm_stream)
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        # The response start never gets out, so the body generator is never started
+        await asyncio.Event().wait()
+
+    scope = {"type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "method": "POST", "path": "/chat"}
+    await asyncio.wait_for(response(scope, receive, send), 5)
+    await asyncio.sleep(0.05)
+
+    assert fake_provider.closed
+    assert fake_provider.pulled == 0
+    assert bulkheads.bulkheads["groq"].active == 0
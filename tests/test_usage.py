@@ -0,0 +1,96 @@
+import asyncio
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import usage
+from app.db import async_crud, models
+from app.usage import UsageRecorder
+
+pytestmark = pytest.mark.anyio
+
+
+def event(user_id, model="m1", prompt=10, completion=20, ttft=100.0):
+    return {
+        "user_id": user_id, "model": model, "endpoint": "/chat",
+        "prompt_tokens": prompt, "completion_tokens": completion,
+        "ttft_ms": ttft, "duration_ms": 500.0, "created_at": datetime.utcnow(),
+    }
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/usage.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all, tables=[
+            models.UsageEvent.__table__, models.UsageDaily.__table__,
+        ])
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def test_batches_insert_events_and_merge_into_the_daily_rollup(session_factory):
+    alice, bob = uuid.uuid4(), uuid.uuid4()
+    async with session_factory() as db:
+        await async_crud.write_usage_events(db, [event(alice), event(alice, ttft=None), event(bob, model="m2")])
+    async with session_factory() as db:
+        await async_crud.write_usage_events(db, [event(alice, prompt=5, completion=5)])
+
+    async with session_factory() as db:
+        events = (await db.execute(select(models.UsageEvent))).scalars().all()
+        rollups = {(r.user_id, r.model): r for r in (await db.execute(select(models.UsageDaily))).scalars()}
+
+    assert len(events) == 4
+    assert set(rollups) == {(alice, "m1"), (bob, "m2")}
+    mine = rollups[(alice, "m1")]
+    assert (mine.requests, mine.prompt_tokens, mine.completion_tokens) == (3, 25, 45)
+    assert (mine.ttft_count, mine.ttft_ms_total) == (2, 200.0)
+
+
+async def test_recorder_writes_full_batches_and_flushes_the_rest_on_stop(monkeypatch):
+    batches = []
+
+    async def write(batch):
+        batches.append(len(batch))
+
+    recorder = UsageRecorder(enabled=True, batch_size=10, flush_seconds=60, queue_size=100)
+    monkeypatch.setattr(recorder, "_write", write)
+    recorder.start()
+    for _ in range(25):
+        recorder.record(uuid.uuid4(), "m1", "/chat", 1, 2, 0.1, 0.5)
+    await asyncio.sleep(0.05)
+    assert batches == [10, 10]
+
+    await recorder.stop()
+    assert batches == [10, 10, 5]
+    assert recorder.stats()["recorded"] == 25
+
+
+async def test_recorder_drops_events_instead_of_blocking_when_full(monkeypatch):
+    recorder = UsageRecorder(enabled=True, batch_size=10, flush_seconds=60, queue_size=3)
+    # Not started: the queue is never drained
+    recorder._queue = asyncio.Queue(maxsize=3)
+    for _ in range(5):
+        recorder.record(uuid.uuid4(), "m1", "/chat", 1, 2, None, 0.5)
+    assert recorder.stats()["recorded"] == 3
+    assert recorder.stats()["dropped"] == 2
+
+
+async def test_report_totals_come_from_the_rollups(session_factory, monkeypatch):
+    user = uuid.uuid4()
+    async with session_factory() as db:
+        await async_crud.write_usage_events(db, [event(user), event(user)])
+
+    async def no_users(db, since, limit=20, user_id=None):
+        return []
+
+    # The per-user section joins users, which this test database does not create
+    monkeypatch.setattr(async_crud, "usage_by_user_and_model", no_users)
+    async with session_factory() as db:
+        report = await usage.usage_report(db, days=1)
+    assert report["totals"]["requests"] == 2
+    assert report["totals"]["total_tokens"] == 60
+    assert report["models"][0]["model"] == "m1"